@@ -0,0 +1,241 @@
+"""
+Benchmarks of InstrumentMap against synthetic universes of instruments, see SyntheticUniverse.
+
+Run from the root of the repository:
+    python -m bench.InstrMap_bench --sizes 10000 1000000 10000000
+    python -m bench.InstrMap_bench --map sqlite --sizes 10000 1000000
+    python -m bench.InstrMap_bench --map concurrent --sizes 10000 1000000
+
+Every result is printed, and appended to the output file (bench_output.txt by default), as one JSON object per
+line so results can be compared across commits:
+    {"commit": "b1e6e3e", "python": "3.11.9", "benchmark": "translate_codes", "size": 1000000, "value": 612.3, "unit": "ns/code"}
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Optional, Union
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from src.CodeScheme import CodeScheme
+from src.ConcurrentInstrMap import ConcurrentInstrumentMap
+from src.InstrMap import InstrumentMap
+from src.SqliteInstrMap import SqliteInstrumentMap
+from src.SyntheticUniverse import SyntheticUniverse
+
+
+class InstrMapBench:
+    """
+    Benchmarks InstrumentMap, SqliteInstrumentMap or ConcurrentInstrumentMap, against a universe of a given size.
+
+    The benchmarks are
+        load: load_instrs of the whole universe, streamed from SyntheticUniverse.records so the time includes
+              generating the codes, in instruments per second.
+        memory: bytes traced by tracemalloc per instrument, over a separate load of the first memory_sample
+                instruments of the universe, as tracing slows a load several times over.
+        get_instr_codes: a single lookup of all of an instrument's codes, in ns.
+        get_instr_code_of_type: a single translation of a code to another scheme, in ns.
+        session_get_instr_code_of_type: as get_instr_code_of_type through a pre-authorised session, in ns, for
+                                        maps with sessions.
+        translate_codes: a batch translation, in ns per code.
+        create_instr: a single create_instr once the universe is loaded, in ns, as a write costs more as the map
+                      grows for some maps.
+    Lookups are of codes sampled at random from the universe, of all schemes. Memory is not measured for the
+    SQLite map, as tracemalloc does not see SQLite's page cache.
+
+    Methods:
+        run(size: int) -> List[dict]: Runs the benchmarks against a universe of the given size.
+    """
+
+    MAPS = ("memory", "sqlite", "concurrent")
+
+    def __init__(self,
+                 seed: int = 0,
+                 lookups: int = 100000,
+                 batch: int = 10000,
+                 writes: int = 1000,
+                 memory: bool = True,
+                 memory_sample: int = 100000,
+                 map_type: str = "memory"):
+        """
+        Args:
+            seed (int): The seed of the universes and lookup samples.
+            lookups (int): The number of lookups to time for each single lookup benchmark.
+            batch (int): The number of codes per translate_codes call.
+            writes (int): The number of create_instr calls to time.
+            memory (bool): Whether to measure memory, which loads part of the universe again under tracemalloc.
+            memory_sample (int): The number of instruments to load to measure memory, per instrument memory is
+                                 much the same for any map of more than a few thousand.
+            map_type (str): The map to benchmark, memory for InstrumentMap, sqlite for SqliteInstrumentMap or
+                            concurrent for ConcurrentInstrumentMap.
+        """
+        if map_type not in InstrMapBench.MAPS:
+            raise ValueError(f"map_type must be one of {InstrMapBench.MAPS}: {map_type}")
+
+        self.map_type = map_type
+        self.seed = seed
+        self.lookups = lookups
+        self.batch = batch
+        self.writes = writes
+        self.memory = memory
+        self.memory_sample = memory_sample
+        self.agent = Agent(agent_id=Agent.gen_agent_id(),
+                           agent_name="InstrMapBench",
+                           agent_role=AgentRole.MAINTAINER)
+        self.context = {"commit": InstrMapBench._commit(), "python": platform.python_version()}
+        if map_type != "memory":
+            self.context["map"] = map_type
+        return
+
+    @staticmethod
+    def _commit() -> Optional[str]:
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _result(self,
+                benchmark: str,
+                size: int,
+                value: float,
+                unit: str) -> dict:
+        return {**self.context, "benchmark": benchmark, "size": size, "value": round(value, 1), "unit": unit}
+
+    def _memory_map(self) -> Union[InstrumentMap, ConcurrentInstrumentMap]:
+        return ConcurrentInstrumentMap() if self.map_type == "concurrent" else InstrumentMap()
+
+    def run(self,
+            size: int) -> List[dict]:
+        """
+        Run the benchmarks against a universe of the given size.
+        Args:
+            size (int): The number of instruments in the universe.
+        Returns:
+            List[dict]: The result of each benchmark.
+        """
+        universe = SyntheticUniverse(size, seed=self.seed)
+        results = []
+
+        gc.collect()
+        tmp_dir = tempfile.TemporaryDirectory() if self.map_type == "sqlite" else None
+        if tmp_dir is not None:
+            instr_map = SqliteInstrumentMap(os.path.join(tmp_dir.name, "instr_map.db"))
+        else:
+            instr_map = self._memory_map()
+        start = time.perf_counter()
+        instr_map.load_instrs(universe.records(), self.agent)
+        elapsed = time.perf_counter() - start
+        results.append(self._result("load", size, size / elapsed if elapsed else 0.0, "instr/s"))
+
+        if tmp_dir is None and self.memory:
+            # Only what is allocated while tracing is counted, so the map already loaded is not.
+            sample_size = min(size, self.memory_sample)
+            gc.collect()
+            tracemalloc.start()
+            sample_map = self._memory_map()
+            sample_map.load_instrs(itertools.islice(universe.records(), sample_size), self.agent)
+            gc.collect()
+            traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del sample_map
+            results.append(self._result("memory", size, traced / sample_size if sample_size else 0.0,
+                                        "bytes/instr"))
+
+        # Instruments are regenerated from their index, so the sample is the only part of the universe held.
+        rng = random.Random(self.seed)
+        sample = [universe.record(rng.randrange(size)) for _ in range(self.lookups)] if size else []
+        codes = [rng.choice(record) for record in sample if record]
+        schemes = [rng.choice([CodeScheme.BASE, CodeScheme.SEDOL, CodeScheme.ISIN, CodeScheme.RIC])
+                   for _ in codes]
+
+        if codes:
+            start = time.perf_counter()
+            for code in codes:
+                instr_map.get_instr_codes(code, self.agent)
+            results.append(self._result("get_instr_codes", size,
+                                        (time.perf_counter() - start) * 1e9 / len(codes), "ns"))
+
+            start = time.perf_counter()
+            for code, scheme in zip(codes, schemes):
+                try:
+                    instr_map.get_instr_code_of_type(code, scheme, self.agent)
+                except LookupError:
+                    pass
+            results.append(self._result("get_instr_code_of_type", size,
+                                        (time.perf_counter() - start) * 1e9 / len(codes), "ns"))
+
+            if hasattr(instr_map, "session"):
+                session = instr_map.session(self.agent)
+                start = time.perf_counter()
+                for code, scheme in zip(codes, schemes):
+                    try:
+                        session.get_instr_code_of_type(code, scheme)
+                    except LookupError:
+                        pass
+                results.append(self._result("session_get_instr_code_of_type", size,
+                                            (time.perf_counter() - start) * 1e9 / len(codes), "ns"))
+
+            start = time.perf_counter()
+            for i in range(0, len(codes), self.batch):
+                instr_map.translate_codes(codes[i:i + self.batch], CodeScheme.ISIN, self.agent)
+            results.append(self._result("translate_codes", size,
+                                        (time.perf_counter() - start) * 1e9 / len(codes), "ns/code"))
+
+        if self.writes:
+            start = time.perf_counter()
+            for _ in range(self.writes):
+                instr_map.create_instr(self.agent)
+            results.append(self._result("create_instr", size,
+                                        (time.perf_counter() - start) * 1e9 / self.writes, "ns"))
+
+        if tmp_dir is not None:
+            instr_map.close()
+            tmp_dir.cleanup()
+        return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark InstrumentMap against synthetic universes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000],
+                        help="the universe sizes to benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lookups", type=int, default=100000,
+                        help="the number of lookups to time for each lookup benchmark")
+    parser.add_argument("--batch", type=int, default=10000,
+                        help="the number of codes per translate_codes call")
+    parser.add_argument("--writes", type=int, default=1000,
+                        help="the number of create_instr calls to time")
+    parser.add_argument("--map", choices=InstrMapBench.MAPS, default="memory",
+                        help="the map to benchmark, the in memory InstrumentMap, SqliteInstrumentMap or "
+                             "ConcurrentInstrumentMap")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the memory benchmark, which loads part of each universe again under tracemalloc")
+    parser.add_argument("--memory-sample", type=int, default=100000,
+                        help="the number of instruments to load to measure memory")
+    parser.add_argument("--output", default="bench_output.txt",
+                        help="the file to append results to, - for none")
+    args = parser.parse_args(argv)
+
+    bench = InstrMapBench(seed=args.seed, lookups=args.lookups, batch=args.batch, writes=args.writes,
+                          memory=not args.no_memory, memory_sample=args.memory_sample, map_type=args.map)
+    for size in args.sizes:
+        results = bench.run(size)
+        lines = [json.dumps(result) for result in results]
+        print("\n".join(lines))
+        sys.stdout.flush()
+        if args.output != "-":
+            with open(args.output, "a") as f:
+                f.write("".join(line + "\n" for line in lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+class ChangesNoLongerHeld(LookupError):
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return f'ChangesNoLongerHeld: {self.message}'
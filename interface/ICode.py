@@ -3,6 +3,8 @@ from src.CodeScheme import CodeScheme
 
 
 class ICode(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def scheme(self) -> CodeScheme:
         pass
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional, Sequence, Union
 from interface.ICode import ICode
 from interface.IAgent import IAgent
 from src.CodeScheme import CodeScheme
@@ -29,5 +29,13 @@ class IInstrumentMap(ABC):
     def get_instr_code_of_type(self,
                                code: ICode,
                                code_scheme: CodeScheme,
-                               agent: IAgent) -> List[ICode]:
+                               agent: IAgent) -> ICode:
+        raise NotImplementedError
+
+    @abstractmethod
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
         raise NotImplementedError
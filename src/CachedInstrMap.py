@@ -0,0 +1,343 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Sequence, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.CodeScheme import CodeScheme
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class CachedInstrumentMap(IInstrumentMap):
+    """
+    Wraps any instrument map with a bounded least recently used cache of get_instr_code_of_type results, so the
+    lookups of a skewed request mix are mostly served without going to the map.
+
+    Entries are keyed on (code scheme, code value, target scheme) and hold either the code found or, as a negative
+    entry, the CodeDoesNotExist or OnlyBaseCodeDefined it raised. Agents are still checked on every call.
+
+    Changes made through the wrapper invalidate exactly the entries of the instruments they change: every entry
+    from any code of a changed instrument, and any negative entry for a code added to the map. Changes made to the
+    wrapped map directly are not seen by the cache, use invalidate or clear after making them.
+
+    translate_codes is served from the cache where it can, and only the codes not cached are passed to the map
+    in one batch. As a miss in a translation does not say which error it is, only the codes found are cached.
+
+    The cache is safe to share between threads. Every invalidation moves the cache on a generation, and a result
+    looked up in the map is only cached if no invalidation has run since the lookup missed, so a result read from
+    the map before a change cannot be cached after the change's invalidation.
+
+    Attributes:
+        instr_map (IInstrumentMap): The wrapped map.
+        maxsize (int): The maximum number of entries cached.
+    Methods:
+        create_instr() -> Code: Creates a new base instrument code and adds it to the map.
+        add_instr_codes(code: Code, codes: List[Code]) -> None: Adds related codes to an existing base code.
+        load_instrs(records: Iterable[Iterable[Code]]) -> List[Code]: Creates many instruments, if the map can.
+        merge_instr(code: Code, retired_code: Code) -> Code: Merges two instruments, if the map can.
+        split_instr(code: Code, codes: List[Code]) -> Code: Moves some of an instrument's codes to a new instrument, if the map can.
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        invalidate(code: Code, agent: Agent) -> None: Invalidates the entries of the instrument of a code.
+        clear() -> None: Invalidates all entries.
+        stats() -> dict: The hits, misses, evictions, invalidations and size of the cache.
+    """
+    MAX_READERS = 1024
+
+    def __init__(self,
+                 instr_map: IInstrumentMap,
+                 maxsize: int = 100000):
+        """
+        Args:
+            instr_map (IInstrumentMap): The map to cache.
+            maxsize (int): The maximum number of entries to cache.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+        """
+        if instr_map is None or not isinstance(instr_map, IInstrumentMap):
+            raise ValueError(
+                f"instr_map must be an instance of IInstrumentMap and cannot be None: {instr_map}")
+
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError(f"maxsize must be a positive integer: {maxsize}")
+
+        super().__init__()
+        self.instr_map = instr_map
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._readers = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        return
+
+    def __getattr__(self, name: str):
+        # Only called for attributes not found on the wrapper, instr_map is guarded as it is not set until __init__.
+        if name == "instr_map":
+            raise AttributeError(name)
+        return getattr(self.instr_map, name)
+
+    @staticmethod
+    def _is_reader(agent: IAgent) -> bool:
+        return isinstance(agent, IAgent) and (agent.has_required_permissions(AgentRole.MAINTAINER) or
+                                              agent.has_required_permissions(AgentRole.READER))
+
+    def _check_reader(self,
+                      agent: IAgent) -> None:
+        # Agents are immutable, so the readers already checked are remembered by identity to keep hits cheap.
+        if agent is not None and self._readers.get(id(agent)) is agent:
+            return
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to read the map)")
+
+        if len(self._readers) >= CachedInstrumentMap.MAX_READERS:
+            self._readers = {}
+        self._readers[id(agent)] = agent
+
+    def _get(self,
+             key: tuple) -> tuple:
+        """
+        The entry cached for the key, or None, and the generation of the cache when it was looked up.
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._cache.move_to_end(key)
+            return entry, self._generation
+
+    def _put(self,
+             key: tuple,
+             entry,
+             generation: int) -> None:
+        """
+        Cache an entry looked up in the map after a miss at the given generation, unless an invalidation has run
+        since, as the entry may have been read before the change invalidated.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._cache[key] = entry
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+                self._evictions += 1
+
+    def _invalidate_codes(self,
+                          codes: Iterable[ICode]) -> None:
+        with self._lock:
+            self._generation += 1
+            for c in codes:
+                for scheme in CodeScheme:
+                    if self._cache.pop((c.scheme.num, c.value, scheme.num), None) is not None:
+                        self._invalidations += 1
+
+    def invalidate(self,
+                   code: ICode,
+                   agent: IAgent) -> None:
+        """
+        Invalidate the entries from every code of the instrument of the given code, including the base codes merges
+        retired in to it, and any negative entry for it.
+        Args:
+            code (Code): The code of the instrument to invalidate.
+            agent (Agent): The agent to read the instrument's codes with.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        self._invalidate_codes(self._instr_entry_codes(code, agent))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._invalidations += len(self._cache)
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: {"hits", "misses", "evictions", "invalidations", "size", "maxsize", "hit_ratio"}
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {"hits": self._hits,
+                    "misses": self._misses,
+                    "evictions": self._evictions,
+                    "invalidations": self._invalidations,
+                    "size": len(self._cache),
+                    "maxsize": self.maxsize,
+                    "hit_ratio": self._hits / lookups if lookups else 0.0}
+
+    def create_instr(self,
+                     agent: IAgent) -> ICode:
+        new_code = self.instr_map.create_instr(agent)
+        self._invalidate_codes([new_code])
+        return new_code
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode],
+                        agent: IAgent) -> None:
+        self.instr_map.add_instr_codes(code, codes, agent)
+        self._invalidate_codes(codes)
+        self.invalidate(code, agent)
+
+    def load_instrs(self,
+                    records: Iterable[Iterable[ICode]],
+                    agent: IAgent) -> List[ICode]:
+        # The records are iterated twice, to load and then to invalidate, invalid records are left for the map to reject.
+        if records is not None:
+            records = [record if record is None or isinstance(record, (str, ICode)) else list(record)
+                       for record in records]
+        base_codes = self.instr_map.load_instrs(records, agent)
+        self._invalidate_codes(base_codes)
+        self._invalidate_codes(c for record in records for c in record)
+        return base_codes
+
+    def _instr_entry_codes(self,
+                           code: ICode,
+                           agent: IAgent) -> List[ICode]:
+        # The codes entries of the instrument of a code may be keyed on, including its redirected base codes.
+        codes = [code]
+        try:
+            codes += self.instr_map.get_instr_codes(code, agent)
+            codes += self.instr_map.get_retired_codes(code, agent)
+        except CodeDoesNotExist:
+            pass
+        return codes
+
+    def merge_instr(self,
+                    code: ICode,
+                    retired_code: ICode,
+                    agent: IAgent) -> ICode:
+        # Every code of both instruments may now resolve differently, so their entries are found before the merge.
+        codes = []
+        if self._is_reader(agent):
+            for c in (code, retired_code):
+                if isinstance(c, ICode):
+                    codes += self._instr_entry_codes(c, agent)
+        base_code = self.instr_map.merge_instr(code, retired_code, agent)
+        self._invalidate_codes(codes)
+        return base_code
+
+    def split_instr(self,
+                    code: ICode,
+                    codes: List[ICode],
+                    agent: IAgent) -> ICode:
+        entry_codes = self._instr_entry_codes(code, agent) if self._is_reader(agent) and isinstance(code, ICode) else []
+        new_code = self.instr_map.split_instr(code, codes, agent)
+        self._invalidate_codes(entry_codes)
+        self._invalidate_codes([new_code])
+        return new_code
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent) -> List[ICode]:
+        return self.instr_map.get_instr_codes(code, agent)
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent) -> ICode:
+        """
+        As IInstrumentMap.get_instr_code_of_type, served from the cache if the result is cached.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                "code must be an instance of Code and cannot be None")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        key = (code.scheme.num, code.value, code_scheme.num)
+        entry, generation = self._get(key)
+        if entry is None:
+            try:
+                entry = self.instr_map.get_instr_code_of_type(code, code_scheme, agent)
+            except (CodeDoesNotExist, OnlyBaseCodeDefined) as e:
+                # Maps raise CodeDoesNotExist before checking the agent, so only cache negatives for a reader.
+                if self._is_reader(agent):
+                    self._put(key, (type(e), e.message), generation)
+                raise
+            self._put(key, entry, generation)
+            return entry
+
+        if isinstance(entry, tuple):
+            error, message = entry
+            if error is CodeDoesNotExist:
+                raise error(message)
+            self._check_reader(agent)
+            raise error(message)
+
+        self._check_reader(agent)
+        return entry
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        As IInstrumentMap.translate_codes, the codes cached are served from the cache and the rest translated by
+        the map in one batch.
+        """
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        if source_scheme is not None and not isinstance(source_scheme, CodeScheme):
+            raise ValueError(
+                "source code sheme must be an instance of CodeScheme")
+
+        self._check_reader(agent)
+
+        codes = list(codes)
+        if source_scheme is not None:
+            keys = [(source_scheme.num, value, code_scheme.num) for value in codes]
+        else:
+            if not all(isinstance(c, ICode) for c in codes):
+                raise ValueError("codes must all be instances of Code when no source scheme is given")
+            keys = [(c.scheme.num, c.value, code_scheme.num) for c in codes]
+
+        translated = []
+        missed = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._cache.get(key)
+                if entry is None:
+                    missed.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    entry = None if isinstance(entry, tuple) else entry
+                translated.append(entry)
+            self._hits += len(keys) - len(missed)
+            self._misses += len(missed)
+            generation = self._generation
+
+        if missed:
+            found = self.instr_map.translate_codes([codes[i] for i in missed], code_scheme, agent, source_scheme)
+            for i, code in zip(missed, found):
+                translated[i] = code
+                if code is not None:
+                    self._put(keys[i], code, generation)
+        return translated
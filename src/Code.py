@@ -1,25 +1,40 @@
 from interface.ICode import ICode
 from src.CodeScheme import CodeScheme
 from src.GloballyUniqueIdentifier import GloballyUniqueIdentifier
+from src.CodeValidator import CodeValidator
 from dataclasses import dataclass
+from typing import ClassVar, Iterable, List
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, slots=True)
 class Code(ICode):
     """
     Represents a code where a code has both a value and a scheme, where scheme is the type of code.
+
+    Codes are slotted, so carry no per instance __dict__, and hash on their value alone, whose hash is cached
+    by the string, so they are cheap to use as keys. Code.of returns the same instance for repeat values so
+    codes built by it compare by identity.
+
     Attributes:
         code_scheme (CodeScheme): The scheme associated with the code.
         code_value (str): The value of the code.
     Methods:
         scheme() -> CodeScheme: Returns the code scheme.
         value() -> str: Returns the code value.
+    Class Methods:
+        of(scheme: CodeScheme, value: str) -> Code: Returns the interned code of the given scheme and value.
+        validated(scheme: CodeScheme, value: str) -> Code: Returns a code whose value is valid for its scheme.
     Static Methods:
         gen_base_code_value() -> str: Generates a new globally unique base code.
+        gen_base_code_values(n: int) -> List[str]: Generates n new globally unique base codes in one call.
     """
     scheme: CodeScheme
     value: str
 
+    # The maximum number of codes interned per scheme, the scheme's interned codes are dropped when it is reached.
+    MAX_INTERNED: ClassVar[int] = 1 << 16
+    _interned: ClassVar[List[dict]] = [{} for _ in CodeScheme]
+
     def __post_init__(self):
         if not isinstance(self.scheme, CodeScheme):
             raise ValueError(
@@ -28,6 +43,82 @@ class Code(ICode):
             raise ValueError(
                 "Invalid code_value: must be a non-empty string")
 
+    @classmethod
+    def of(cls,
+           scheme: CodeScheme,
+           value: str) -> 'Code':
+        """
+        Return the code of the given scheme and value, the same instance as for any earlier call with the same
+        scheme and value unless the scheme's interned codes have since been dropped.
+        Raises:
+            ValueError: If the scheme or value are not valid, as for Code().
+        """
+        if not isinstance(scheme, CodeScheme):
+            raise ValueError(
+                "Invalid code_scheme: must be an instance of CodeScheme")
+        interned = cls._interned[scheme.num]
+        code = interned.get(value)
+        if code is None:
+            code = cls(scheme, value)
+            if len(interned) >= cls.MAX_INTERNED:
+                interned.clear()
+            interned[value] = code
+        return code
+
+    @classmethod
+    def validated(cls,
+                  scheme: CodeScheme,
+                  value: str) -> 'Code':
+        """
+        Return a code of the given scheme and value once the value is checked against the format of the scheme by
+        CodeValidator, the check digit of an ISIN or SEDOL, a code created directly only needs a non-empty value.
+        Raises:
+            ValueError: If the scheme or value are not valid, as for Code().
+            InvalidCode: If the value is not a valid code of the scheme.
+        """
+        code = cls(scheme, value)
+        CodeValidator.validate(scheme, value)
+        return code
+
+    @classmethod
+    def _trusted(cls,
+                 scheme: CodeScheme,
+                 value: str) -> 'Code':
+        """
+        Create a code without validating it, only for a scheme and value already validated such as those held by a map.
+        """
+        code = _new(cls)
+        _set_scheme(code, scheme)
+        _set_value(code, value)
+        return code
+
+    @classmethod
+    def _trusted_many(cls,
+                      scheme: CodeScheme,
+                      values: Iterable[str]) -> List['Code']:
+        """
+        Create the codes of many values of a scheme without validating them, as _trusted without a call per code.
+        """
+        new, set_scheme, set_value = _new, _set_scheme, _set_value
+        codes = []
+        append = codes.append
+        for value in values:
+            code = new(cls)
+            set_scheme(code, scheme)
+            set_value(code, value)
+            append(code)
+        return codes
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.value == other.value and self.scheme is other.scheme
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
     def scheme(self) -> CodeScheme:
         return self.scheme
 
@@ -38,5 +129,15 @@ class Code(ICode):
     def gen_base_code_value() -> str:
         return str(GloballyUniqueIdentifier())
 
+    @staticmethod
+    def gen_base_code_values(n: int) -> List[str]:
+        return GloballyUniqueIdentifier.block(n)
+
     def __str__(self) -> str:
         return f"scheme: {self.scheme} : value: {self.value}"
+
+
+# Bound once for Code._trusted, the slot setters bypass the frozen __setattr__.
+_new = object.__new__
+_set_scheme = Code.scheme.__set__
+_set_value = Code.value.__set__
@@ -0,0 +1,132 @@
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class CodeIndex:
+    """
+    A sorted index of the code values of one scheme, for prefix, range and pattern queries.
+
+    The values are held in two sorted runs, the main run and a small run of the values added since the main run
+    was last rebuilt. A value is added to the small run by a sorted insert, and the small run is folded in to the
+    main run once it holds more than FOLD_FRACTION of the main run's values, at least MIN_FOLD, so the linear
+    cost of a fold, a merge of two sorted runs, is amortised over the inserts since the last. A query bisects each run to the start of its
+    range and walks the two together, so its cost is proportional to the number of values in the range rather
+    than the number of codes in the scheme, with or without inserts since the last query.
+
+    Values are checked against the live code -> instrument dict as they are walked, so a code removed from the
+    map is never returned and need not be removed from the index.
+
+    The runs are replaced rather than changed in place, so a query already walking them is not disturbed.
+
+    Methods:
+        add(value: str) -> None: Adds a value.
+        extend(values: Iterable[str]) -> None: Adds many values.
+        rebind(live: Dict[str, object]) -> None: Checks values against a new live dict.
+        range(start: str, stop: str) -> Iterator[str]: The values from start up to but not including stop.
+        prefix(prefix: str) -> Iterator[str]: The values starting with prefix.
+        match(pattern: str) -> Iterator[str]: The values matching a glob pattern.
+    """
+    MIN_FOLD = 1024
+    FOLD_FRACTION = 1 / 256
+
+    def __init__(self,
+                 live: Dict[str, object]):
+        """
+        Args:
+            live (Dict[str, object]): The code value -> instrument dict of the scheme, whose keys are indexed.
+        """
+        self._live = live
+        self._sorted: List[str] = sorted(live)
+        self._run: List[str] = []
+        return
+
+    @staticmethod
+    def _contains(values: List[str],
+                  value: str) -> bool:
+        i = bisect_left(values, value)
+        return i < len(values) and values[i] == value
+
+    def _fold_size(self) -> int:
+        return max(CodeIndex.MIN_FOLD, int(len(self._sorted) * CodeIndex.FOLD_FRACTION))
+
+    def add(self,
+            value: str) -> None:
+        run = self._run
+        if self._contains(self._sorted, value) or self._contains(run, value):
+            return
+        i = bisect_left(run, value)
+        self._run = run[:i] + [value] + run[i:]
+        if len(self._run) > self._fold_size():
+            self._fold()
+
+    def rebind(self,
+               live: Dict[str, object]) -> None:
+        """
+        Check values against a new live dict, for a map that publishes a copy of the dict rather than changing it.
+        """
+        self._live = live
+
+    def extend(self,
+               values: Iterable[str]) -> None:
+        main, run = self._sorted, self._run
+        values = [value for value in dict.fromkeys(sorted(values))
+                  if not self._contains(main, value) and not self._contains(run, value)]
+        run = run + values
+        run.sort()
+        self._run = run
+        if len(run) > self._fold_size():
+            self._fold()
+
+    def _fold(self) -> None:
+        """
+        Rebuild the main run from the two runs, sorting runs already sorted is a linear merge.
+        """
+        merged = self._sorted + self._run
+        merged.sort()
+        self._sorted = merged
+        self._run = []
+
+    def range(self,
+              start: Optional[str] = None,
+              stop: Optional[str] = None) -> Iterator[str]:
+        """
+        The values v with start <= v < stop in order, from the first value if start is None and to the last if
+        stop is None.
+        """
+        values, run = self._sorted, self._run
+        live = self._live
+        i = bisect_left(values, start) if start is not None else 0
+        j = bisect_left(run, start) if start is not None else 0
+        n, m = len(values), len(run)
+        # Walk the two runs together, by index as islice would step over the values before the range.
+        while i < n or j < m:
+            if j == m or (i < n and values[i] < run[j]):
+                value = values[i]
+                i += 1
+            else:
+                value = run[j]
+                j += 1
+            if stop is not None and value >= stop:
+                return
+            if value in live:
+                yield value
+
+    def prefix(self,
+               prefix: str) -> Iterator[str]:
+        if not prefix:
+            return self.range()
+        return self.range(prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+    def match(self,
+              pattern: str) -> Iterator[str]:
+        """
+        The values matching a case sensitive glob pattern, of * ? and [] as fnmatch. Only the values starting
+        with the pattern's literal prefix, the part before the first wildcard, are walked.
+        """
+        literal = len(pattern)
+        for wildcard in "*?[":
+            i = pattern.find(wildcard)
+            if i != -1:
+                literal = min(literal, i)
+        return (value for value in self.prefix(pattern[:literal]) if fnmatchcase(value, pattern))
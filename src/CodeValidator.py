@@ -0,0 +1,213 @@
+import re
+from typing import Callable, Dict, List, Sequence
+from src.CodeScheme import CodeScheme
+from exception.InvalidCode import InvalidCode
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _luhn_sum(value: int,
+              double: bool) -> int:
+    """
+    The Luhn sum of the digits of value, 0 to 35, when its last digit is doubled or not.
+    """
+    total = 0
+    for digit in reversed(str(value)):
+        digit = int(digit) * 2 if double else int(digit)
+        total += digit // 10 + digit % 10
+        double = not double
+    return total
+
+
+_ALNUM = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_SEDOL_WEIGHTS = (1, 3, 1, 7, 3, 9)
+# The Luhn sum of each character when its last digit is, or is not, doubled. Letters count as two digits so
+# leave the doubling of the next character unchanged, digits flip it.
+_LUHN = ({c: _luhn_sum(i, False) for i, c in enumerate(_ALNUM)},
+         {c: _luhn_sum(i, True) for i, c in enumerate(_ALNUM)})
+
+_ISIN = re.compile(r"[A-Z]{2}[0-9A-Z]{9}[0-9]")
+# SEDOLs are digits and consonants, no vowels.
+_SEDOL = re.compile(r"[0-9BCDFGHJ-NP-TV-Z]{6}[0-9]")
+# A RIC is an optional prefix of . (index), = or ^, a root of letters, digits and symbols, share classes and
+# contract codes in lower case, then an optional exchange suffix of a dot and 1 to 4 letters.
+_RIC = re.compile(r"[.=^]?[A-Za-z0-9][A-Za-z0-9&#=_\-]{0,23}(?:\.[A-Za-z]{1,4})?")
+# Base codes are version 4 UUIDs in canonical form.
+_BASE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}")
+
+if np is not None:
+    # By byte, the value of each character allowed in an ISIN and a SEDOL, -1 for any other.
+    _ISIN_VALUES = np.full(256, -1, dtype=np.int16)
+    _ISIN_VALUES[np.frombuffer(_ALNUM.encode("ascii"), dtype=np.uint8)] = np.arange(36)
+    _SEDOL_VALUES = np.full(256, -1, dtype=np.int16)
+    _SEDOL_VALUES[np.frombuffer(b"0123456789BCDFGHJKLMNPQRSTVWXYZ", dtype=np.uint8)] = \
+        [int(c, 36) for c in "0123456789BCDFGHJKLMNPQRSTVWXYZ"]
+    _NP_LUHN = (np.array([_luhn_sum(i, False) for i in range(36)], dtype=np.int16),
+                np.array([_luhn_sum(i, True) for i in range(36)], dtype=np.int16))
+    _NP_SEDOL_WEIGHTS = np.array(_SEDOL_WEIGHTS, dtype=np.int32)
+
+
+class CodeValidator:
+    """
+    Validates code values against the format of their scheme, so bad identifiers from vendors are rejected before
+    they get in to a map rather than surfacing later as lookup misses. Code itself only requires a non-empty value.
+
+        BASE: a version 4 UUID in canonical lower case form, as generated by Code.gen_base_code_value.
+        ISIN: 2 letter country, 9 letters or digits, then the Luhn check digit of the first 11 characters.
+        SEDOL: 6 digits or consonants, then the weighted check digit of the first 6.
+        RIC: the syntax of a RIC, an optional prefix, a root and an optional exchange suffix, as RICs carry no
+             check digit.
+
+    is_valid validates one value, for use as codes are created, see Code.validated. valid_mask validates a
+    sequence of values of a scheme in one call, for use on files of vendor codes. With numpy installed the ISINs
+    and SEDOLs of a bulk call are checked as arrays, a column of characters at a time, and without it, or for the
+    other schemes, value by value.
+
+    Static Methods:
+        is_valid(scheme: CodeScheme, value: str) -> bool: If a value is a valid code of a scheme.
+        validate(scheme: CodeScheme, value: str) -> None: Raises InvalidCode if a value is not a valid code of a scheme.
+        valid_mask(scheme: CodeScheme, values: Sequence[str]) -> List[bool]: If each of many values is a valid code of a scheme.
+        isin_check_digit(body: str) -> str: The check digit of the first 11 characters of an ISIN.
+        sedol_check_digit(body: str) -> str: The check digit of the first 6 characters of a SEDOL.
+    """
+
+    @staticmethod
+    def isin_check_digit(body: str) -> str:
+        """
+        The Luhn check digit of an ISIN's first 11 characters, letters counting as the two digits 10 to 35.
+        """
+        total = 0
+        double = True
+        luhn = _LUHN
+        for c in reversed(body):
+            total += luhn[double][c]
+            if c <= "9":
+                double = not double
+        return str((10 - total % 10) % 10)
+
+    @staticmethod
+    def sedol_check_digit(body: str) -> str:
+        """
+        The check digit of a SEDOL's first 6 characters, the weighted sum of their values with letters as 10 to 35.
+        """
+        total = sum(int(c, 36) * w for c, w in zip(body, _SEDOL_WEIGHTS))
+        return str((10 - total % 10) % 10)
+
+    @staticmethod
+    def _is_valid_isin(value: str) -> bool:
+        return _ISIN.fullmatch(value) is not None and CodeValidator.isin_check_digit(value[:11]) == value[11]
+
+    @staticmethod
+    def _is_valid_sedol(value: str) -> bool:
+        return _SEDOL.fullmatch(value) is not None and CodeValidator.sedol_check_digit(value[:6]) == value[6]
+
+    @staticmethod
+    def _is_valid_ric(value: str) -> bool:
+        return _RIC.fullmatch(value) is not None
+
+    @staticmethod
+    def _is_valid_base(value: str) -> bool:
+        return _BASE.fullmatch(value) is not None
+
+    @staticmethod
+    def is_valid(scheme: CodeScheme,
+                 value: str) -> bool:
+        """
+        If the value is a valid code of the scheme.
+        Args:
+            scheme (CodeScheme): The scheme of the code.
+            value (str): The code value.
+        Returns:
+            bool: True if the value is valid, False if not or if it is not a string.
+        Raises:
+            ValueError: If the scheme is None or of the wrong type.
+        """
+        if not isinstance(scheme, CodeScheme):
+            raise ValueError(f"scheme must be an instance of CodeScheme and cannot be None: {scheme}")
+        return isinstance(value, str) and _IS_VALID[scheme](value)
+
+    @staticmethod
+    def validate(scheme: CodeScheme,
+                 value: str) -> None:
+        """
+        Check the value is a valid code of the scheme.
+        Args:
+            scheme (CodeScheme): The scheme of the code.
+            value (str): The code value.
+        Raises:
+            ValueError: If the scheme is None or of the wrong type.
+            InvalidCode: If the value is not a valid code of the scheme.
+        """
+        if not CodeValidator.is_valid(scheme, value):
+            raise InvalidCode(f"{value!r} is not a valid {scheme} code")
+
+    @staticmethod
+    def valid_mask(scheme: CodeScheme,
+                   values: Sequence[str]) -> List[bool]:
+        """
+        Check many values of a scheme in one call, vectorised for ISINs and SEDOLs if numpy is installed.
+        Args:
+            scheme (CodeScheme): The scheme of the codes.
+            values (Sequence[str]): The code values.
+        Returns:
+            List[bool]: Parallel to values, True for each valid code.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+        """
+        if not isinstance(scheme, CodeScheme):
+            raise ValueError(f"scheme must be an instance of CodeScheme and cannot be None: {scheme}")
+
+        if values is None or isinstance(values, str):
+            raise ValueError(f"values must be a sequence of code values and cannot be None: {values}")
+
+        if np is not None and scheme in (CodeScheme.ISIN, CodeScheme.SEDOL):
+            return CodeValidator._np_valid_mask(scheme, values)
+        is_valid = _IS_VALID[scheme]
+        return [isinstance(value, str) and is_valid(value) for value in values]
+
+    @staticmethod
+    def _np_valid_mask(scheme: CodeScheme,
+                       values: Sequence[str]) -> List[bool]:
+        """
+        The values of the right length are packed in to a 2d array of bytes, one row per value, so each check is
+        an array operation on a column of characters rather than a loop over the values.
+        """
+        width = 12 if scheme == CodeScheme.ISIN else 7
+        fits = [isinstance(value, str) and len(value) == width and value.isascii() for value in values]
+        mask = np.zeros(len(fits), dtype=bool)
+        rows = np.flatnonzero(fits)
+        if not len(rows):
+            return mask.tolist()
+
+        packed = "".join(value for value, fit in zip(values, fits) if fit).encode("ascii")
+        chars = np.frombuffer(packed, dtype=np.uint8).reshape(-1, width)
+        if scheme == CodeScheme.ISIN:
+            digits = _ISIN_VALUES[chars]
+            valid = (digits >= 0).all(axis=1) & (digits[:, :2] >= 10).all(axis=1) & (digits[:, 11] < 10)
+            digits = np.maximum(digits, 0)
+            # Luhn from the right of the body, letters are two digits so only digits flip the doubling.
+            total = np.zeros(len(rows), dtype=np.int32)
+            double = np.ones(len(rows), dtype=bool)
+            for col in range(10, -1, -1):
+                column = digits[:, col]
+                total += np.where(double, _NP_LUHN[1][column], _NP_LUHN[0][column])
+                double ^= column < 10
+        else:
+            digits = _SEDOL_VALUES[chars]
+            valid = (digits >= 0).all(axis=1) & (digits[:, 6] < 10)
+            digits = np.maximum(digits, 0)
+            total = digits[:, :6].astype(np.int32) @ _NP_SEDOL_WEIGHTS
+        valid &= (10 - total % 10) % 10 == digits[:, width - 1]
+        mask[rows] = valid
+        return mask.tolist()
+
+
+_IS_VALID: Dict[CodeScheme, Callable[[str], bool]] = {
+    CodeScheme.BASE: CodeValidator._is_valid_base,
+    CodeScheme.SEDOL: CodeValidator._is_valid_sedol,
+    CodeScheme.ISIN: CodeValidator._is_valid_isin,
+    CodeScheme.RIC: CodeValidator._is_valid_ric,
+}
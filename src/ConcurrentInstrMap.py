@@ -0,0 +1,274 @@
+import copy
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.CodeScheme import CodeScheme
+from src.AgentRole import AgentRole
+from src.InstrMap import InstrumentMap
+from src.PersistentDict import PersistentDict
+from src.PersistentList import PersistentList
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class _ChangeEvents(list):
+    """
+    Stands in for the change feed of the next version of the map, holding the changes it publishes until the
+    version is published to readers.
+    """
+
+    def publish(self,
+                *event) -> None:
+        self.append(event)
+
+
+class ConcurrentInstrumentMap(IInstrumentMap):
+    """
+    An instrument map that is safe to share between threads, where readers never block and writers are serialized.
+
+    The map is held as a published InstrumentMap that is never changed once published. A reader takes the
+    published map once per call, so every lookup of a call, and every chunk of an export, sees the same version.
+    A writer builds the next version under the write lock, a shallow copy of the published map with forks of its
+    code dicts and lists, and makes the change to it with the InstrumentMap methods, so a change is journaled as
+    it is by InstrumentMap. The new version is then published with a single reference assignment, so a reader
+    sees all of a change or none of it, and a change that raises is never published. Changes are published to
+    the change feed once their version is published, still holding the write lock so in order, so a subscriber
+    that reads the map sees the change.
+
+    The code dicts and lists are PersistentDicts and PersistentLists, so versions share all but the nodes a change
+    copies and a write costs about the same on a map of any size. A lookup walks a few levels of nodes rather than
+    a single dict or list, which makes reads somewhat slower than those of an InstrumentMap. A merge also copies
+    the map's record of earlier merges.
+
+    Attributes:
+        version (int): Incremented each time a change is published.
+    Methods:
+        create_instr() -> Code: Creates a new base instrument code and adds it to the map.
+        create_instrs(n: int) -> List[Code]: Creates n new base instrument codes in one call.
+        add_instr_codes(code: Code, codes: List[Code]) -> None: Adds related codes to an existing base code.
+        load_instrs(records: Iterable[Iterable[Code]]) -> List[Code]: Creates many instruments and their codes all or nothing.
+        merge_instr(code: Code, retired_code: Code) -> Code: Merges two instruments, redirecting the retired base code.
+        split_instr(code: Code, codes: List[Code]) -> Code: Moves some of an instrument's codes to a new instrument.
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        get_retired_codes(code: Code) -> List[Code]: The base codes retired by merges in to an instrument.
+        find_codes(code_scheme: CodeScheme, prefix: str, start: str, stop: str, pattern: str) -> Iterator[Tuple[Code, Code]]: Searches the codes of a scheme.
+        export_instrs(code_schemes: Sequence[CodeScheme], chunk_size: int) -> Iterator[List[Tuple[Code, Dict[CodeScheme, Code]]]]: Iterates over every instrument and its codes in chunks.
+        save_snapshot(path: str) -> None: Saves the map as a binary snapshot.
+        checkpoint(path: str) -> None: Saves the map as a binary snapshot and truncates the journal.
+    """
+
+    def __init__(self,
+                 instr_map: Optional[InstrumentMap] = None):
+        """
+        Args:
+            instr_map (InstrumentMap): Optional, the map to start from, such as one recovered from its journal. Its
+                                       codes are copied, but its journal and change feed are used, so it must not
+                                       be changed directly once given. A new empty map if not given.
+        Raises:
+            ValueError: If instr_map is not an InstrumentMap.
+        """
+        super().__init__()
+        if instr_map is None:
+            instr_map = InstrumentMap()
+        elif type(instr_map) is not InstrumentMap:
+            raise ValueError(f"instr_map must be an InstrumentMap: {type(instr_map)}")
+        self._write_lock = threading.Lock()
+        state = copy.copy(instr_map)
+        state.instr_map = {scheme: PersistentDict(scheme_map) for scheme, scheme_map in instr_map.instr_map.items()}
+        state.instr_codes = {scheme: PersistentList(values) for scheme, values in instr_map.instr_codes.items()}
+        state._redirects = {instr_id: list(values) for instr_id, values in instr_map._redirects.items()}
+        state._retired = set(instr_map._retired)
+        state._code_indexes = {}
+        self._state = state
+        self.version = 0
+        return
+
+    def _check_agent(self,
+                     agent: IAgent,
+                     maintainer: bool) -> None:
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if maintainer:
+            if not agent.has_required_permissions(AgentRole.MAINTAINER):
+                raise IncorrectPermissions(
+                    f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to change the map)")
+        elif not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to read the map)")
+
+    def _next_state(self,
+                    merge: bool = False) -> InstrumentMap:
+        """
+        A copy of the published map to make a change to, with forks of its code dicts and lists and a copy of
+        the redirects if it merges. Must be called holding the write lock.
+        """
+        state = self._state
+        next_state = copy.copy(state)
+        next_state.feed = None if state.feed is None else _ChangeEvents()
+        next_state.instr_map = {scheme: scheme_map.fork() for scheme, scheme_map in state.instr_map.items()}
+        next_state.instr_codes = {scheme: values.fork() for scheme, values in state.instr_codes.items()}
+        if merge:
+            next_state._redirects = {instr_id: list(values) for instr_id, values in state._redirects.items()}
+            next_state._retired = set(state._retired)
+        return next_state
+
+    def _publish(self,
+                 next_state: InstrumentMap) -> None:
+        """
+        Publish the next version of the map, then the changes made to it to the change feed, must be called
+        holding the write lock.
+        """
+        # The code indexes are shared by every version and only ever gain values, so they check values against the
+        # newest dicts, the dicts of the version searched then drop values it does not have.
+        for scheme, code_index in next_state._code_indexes.items():
+            code_index.rebind(next_state.instr_map[scheme])
+        events = next_state.feed
+        next_state.feed = self._state.feed
+        self._state = next_state
+        self.version += 1
+        if events:
+            for event in events:
+                next_state.feed.publish(*event)
+
+    def create_instr(self,
+                     agent: IAgent) -> ICode:
+        self._check_agent(agent, maintainer=True)
+        with self._write_lock:
+            next_state = self._next_state()
+            new_code = next_state.create_instr(agent)
+            self._publish(next_state)
+        return new_code
+
+    def create_instrs(self,
+                      agent: IAgent,
+                      n: int) -> List[ICode]:
+        self._check_agent(agent, maintainer=True)
+        with self._write_lock:
+            next_state = self._next_state()
+            new_codes = next_state.create_instrs(agent, n)
+            self._publish(next_state)
+        return new_codes
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode],
+                        agent: IAgent) -> None:
+        """
+        As InstrumentMap.add_instr_codes, the codes are published to readers all together once they have all been
+        validated. Adding codes the instrument already has publishes nothing.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        if codes is None or not isinstance(codes, List) or not all(isinstance(c, ICode) for c in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
+
+        self._check_agent(agent, maintainer=True)
+
+        # The check of the codes against the map and the publish must be one step, else two writers could both
+        # find a code absent and map it to different instruments.
+        with self._write_lock:
+            state = self._state
+            instr_id = state._find_instr(code)
+            if all(state.instr_map[str(c.scheme)].get(c.value) == instr_id for c in codes):
+                return
+            next_state = self._next_state()
+            next_state.add_instr_codes(code, codes, agent)
+            self._publish(next_state)
+
+    def load_instrs(self,
+                    records: Iterable[Iterable[ICode]],
+                    agent: IAgent) -> List[ICode]:
+        self._check_agent(agent, maintainer=True)
+        with self._write_lock:
+            next_state = self._next_state()
+            base_codes = next_state.load_instrs(records, agent)
+            self._publish(next_state)
+        return base_codes
+
+    def merge_instr(self,
+                    code: ICode,
+                    retired_code: ICode,
+                    agent: IAgent) -> ICode:
+        self._check_agent(agent, maintainer=True)
+        with self._write_lock:
+            next_state = self._next_state(merge=True)
+            base_code = next_state.merge_instr(code, retired_code, agent)
+            self._publish(next_state)
+        return base_code
+
+    def split_instr(self,
+                    code: ICode,
+                    codes: List[ICode],
+                    agent: IAgent) -> ICode:
+        self._check_agent(agent, maintainer=True)
+        with self._write_lock:
+            next_state = self._next_state()
+            new_code = next_state.split_instr(code, codes, agent)
+            self._publish(next_state)
+        return new_code
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent) -> List[ICode]:
+        return self._state.get_instr_codes(code, agent)
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent) -> ICode:
+        return self._state.get_instr_code_of_type(code, code_scheme, agent)
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        return self._state.translate_codes(codes, code_scheme, agent, source_scheme)
+
+    def get_retired_codes(self,
+                          code: ICode,
+                          agent: IAgent) -> List[ICode]:
+        return self._state.get_retired_codes(code, agent)
+
+    def find_codes(self,
+                   code_scheme: CodeScheme,
+                   agent: IAgent,
+                   prefix: Optional[str] = None,
+                   start: Optional[str] = None,
+                   stop: Optional[str] = None,
+                   pattern: Optional[str] = None) -> Iterator[Tuple[ICode, ICode]]:
+        """
+        As InstrumentMap.find_codes, searching the version published when called. The first search of a scheme
+        builds its index holding the write lock, so no change is made while it is built and missed by it.
+        """
+        state = self._state
+        if str(code_scheme) not in state._code_indexes:
+            with self._write_lock:
+                return self._state.find_codes(code_scheme, agent, prefix, start, stop, pattern)
+        return state.find_codes(code_scheme, agent, prefix, start, stop, pattern)
+
+    def export_instrs(self,
+                      agent: IAgent,
+                      code_schemes: Optional[Sequence[CodeScheme]] = None,
+                      chunk_size: int = 10000) -> Iterator[List[Tuple[ICode, Dict[CodeScheme, ICode]]]]:
+        return self._state.export_instrs(agent, code_schemes, chunk_size)
+
+    def save_snapshot(self,
+                      path: str,
+                      agent: IAgent) -> None:
+        self._state.save_snapshot(path, agent)
+
+    def checkpoint(self,
+                   path: str,
+                   agent: IAgent) -> None:
+        # Holding the write lock so no change is journaled between the snapshot and the journal truncate.
+        with self._write_lock:
+            self._state.checkpoint(path, agent)
@@ -1,7 +1,19 @@
+import secrets
 import uuid
+from typing import Iterator, List
 
 
 class GloballyUniqueIdentifier:
+    """
+    A random, version 4, UUID.
+
+    Static Methods:
+        block(n: int) -> List[str]: Generates the strings of n unique UUIDs far faster than n uuid4 calls.
+        blocks(max_block_size: int) -> Iterator[str]: Yields unique UUID strings generated a block at a time.
+    """
+    # The low 48 bits, the last group, of the UUIDs of a block count up from a random start.
+    BLOCK_BITS = 48
+
     def __init__(self):
         self.value = uuid.uuid4()
 
@@ -13,3 +25,37 @@ class GloballyUniqueIdentifier:
         return False
 
     def __hash__(self): return hash(self.value)
+
+    @staticmethod
+    def block(n: int) -> List[str]:
+        """
+        The strings of n unique version 4 UUIDs, generated from one uuid4 whose last 48 bits are replaced by a
+        counter from a random start, so each costs a string format rather than reading and formatting 16 random
+        bytes. The 74 random bits of the uuid4 shared by a block make a collision with another block less likely
+        than one between two uuid4s, whose 122 random bits are each drawn per UUID.
+        Args:
+            n (int): The number of UUIDs to generate, at most 2^32.
+        Returns:
+            List[str]: The UUIDs in canonical string form.
+        Raises:
+            ValueError: If n is not an integer between 0 and 2^32.
+        """
+        if not isinstance(n, int) or isinstance(n, bool) or not 0 <= n <= 1 << 32:
+            raise ValueError(f"n must be an integer between 0 and 2^32: {n}")
+
+        if n == 0:
+            return []
+        prefix = str(uuid.uuid4())[:-12]
+        start = secrets.randbelow((1 << GloballyUniqueIdentifier.BLOCK_BITS) - n)
+        return list(map((prefix + "%012x").__mod__, range(start, start + n)))
+
+    @staticmethod
+    def blocks(max_block_size: int = 4096) -> Iterator[str]:
+        """
+        Yield unique UUID strings without end, generated with block in blocks that double in size up to
+        max_block_size, so taking only a few does not pay for a large block.
+        """
+        block_size = 16
+        while True:
+            yield from GloballyUniqueIdentifier.block(block_size)
+            block_size = min(2 * block_size, max_block_size)
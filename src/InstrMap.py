@@ -1,12 +1,21 @@
-from typing import List
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from interface.ICode import ICode
 from interface.IAgent import IAgent
+from src.Code import Code
 from src.CodeScheme import CodeScheme
 from src.AgentRole import AgentRole
 from exception.CodeDoesNotExist import CodeDoesNotExist
 from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
 from exception.IncorrectPermissions import IncorrectPermissions
 from interface.IInstrMap import IInstrumentMap
+from src.InstrMapSnapshot import InstrMapSnapshot, SnapshotInstrumentMap
+from src.InstrMapJournal import InstrMapJournal
+from src.InstrMapChangeFeed import InstrMapChangeFeed
+from src.InstrMapSession import InstrMapReaderSession, InstrMapMaintainerSession
+from src.CodeIndex import CodeIndex
+from src.GloballyUniqueIdentifier import GloballyUniqueIdentifier
+from src.InstrMapExport import InstrMapExport
 
 
 class InstrumentMap(IInstrumentMap):
@@ -15,20 +24,100 @@ class InstrumentMap(IInstrumentMap):
 
     In the map every case has a globally unquie base code and a list of related codes.
 
+    Internally each instrument is known by a dense integer id, its position in the instr_codes lists, and
+    two indexes are kept in step with each other:
+        instr_map: scheme -> {code value: instrument id}, resolves any code to its instrument.
+        instr_codes: scheme -> [code value or None], indexed by instrument id, the code value of each scheme.
+    The base code values are just the BASE column of instr_codes. Only the code value strings are held, one
+    string object shared by both indexes, and Code objects are created when returned, so an instrument costs
+    a few list slots and dict entries rather than a Code object and dict entries per code.
+
+    If given a journal every change is encoded before it is applied, so a change that cannot be journaled leaves
+    the map unchanged, and recorded in the journal once applied, so the map can be recovered from its last
+    checkpoint snapshot and the journal. If given a change feed every change is published to it once
+    applied, so consumers keeping a copy of some of the map are sent the changes rather than re-reading it.
+
+    The code values of a scheme are indexed in sorted order for find_codes by a CodeIndex, built the first
+    time the scheme is searched and kept up to date from then on.
+
+    merge_instr and split_instr relink codes between instruments for corporate actions, touching only the entries
+    of the codes moved. A merge redirects the retired base code to the surviving instrument, in instr_map, so the
+    retired base code resolves to the survivor by every lookup.
+
     Methods:
         create_instr() -> Code: Creates a new base instrument code and adds it to the map.
+        create_instrs(n: int) -> List[Code]: Creates n new base instrument codes in one call.
         add_instr_codes(code: Code, codes: List[Code]) -> None: Adds related codes to an existing base code.
         get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
         get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        find_codes(code_scheme: CodeScheme, prefix: str, start: str, stop: str, pattern: str) -> Iterator[Tuple[Code, Code]]: Searches the codes of a scheme.
+        export_instrs(code_schemes: Sequence[CodeScheme], chunk_size: int) -> Iterator[List[Tuple[Code, Dict[CodeScheme, Code]]]]: Iterates over every instrument and its codes in chunks.
+        save_export(path: str, code_schemes: Sequence[CodeScheme], chunk_size: int) -> int: Writes every instrument and its codes as CSV or JSONL.
+        load_instrs(records: Iterable[Iterable[Code]]) -> List[Code]: Creates many instruments and their codes all or nothing.
+        merge_instr(code: Code, retired_code: Code) -> Code: Merges two instruments, redirecting the retired base code.
+        split_instr(code: Code, codes: List[Code]) -> Code: Moves some of an instrument's codes to a new instrument.
+        get_retired_codes(code: Code) -> List[Code]: The base codes retired by merges in to an instrument.
+        session(agent: Agent) -> InstrMapReaderSession: Checks the agent once for a view of the map without per call checks.
+        save_snapshot(path: str) -> None: Saves the map as a binary snapshot.
+        checkpoint(path: str) -> None: Saves the map as a binary snapshot and truncates the journal.
+    Class Methods:
+        load_snapshot(path: str) -> InstrumentMap: Creates a map from a binary snapshot.
+        recover(snapshot_path: str, journal_path: str) -> InstrumentMap: Creates a map from a snapshot and a journal.
     """
 
-    def __init__(self):
+    def __init__(self,
+                 journal: Optional[InstrMapJournal] = None,
+                 feed: Optional[InstrMapChangeFeed] = None):
+        """
+        Args:
+            journal (InstrMapJournal): Optional, the journal to record changes to the map in.
+            feed (InstrMapChangeFeed): Optional, the change feed to publish changes to the map to.
+        """
         super().__init__()
         self.instr_map = {}
+        self.instr_codes = {}
         for scheme in CodeScheme:
             self.instr_map[str(scheme)] = {}
+            self.instr_codes[str(scheme)] = []
+        self.journal = journal
+        self.feed = feed
+        self._code_indexes = {}
+        # Merges leave the retired instrument's id holding only its base code, which is redirected to the survivor.
+        self._redirects: Dict[int, List[str]] = {}
+        self._retired = set()
         return
 
+    def _index_codes(self,
+                     scheme: str,
+                     values: Iterable[str]) -> None:
+        code_index = self._code_indexes.get(scheme)
+        if code_index is not None:
+            code_index.extend(values)
+
+    def _new_instr(self,
+                   base_value: str) -> int:
+        """
+        Add an instrument with the given base code value, returning its id, or the id it already has.
+        """
+        instr_id = self.instr_map[str(CodeScheme.BASE)].get(base_value)
+        if instr_id is None:
+            instr_id = len(self.instr_codes[str(CodeScheme.BASE)])
+            for scheme_codes in self.instr_codes.values():
+                scheme_codes.append(None)
+            self.instr_codes[str(CodeScheme.BASE)][instr_id] = base_value
+            self.instr_map[str(CodeScheme.BASE)][base_value] = instr_id
+            self._index_codes(str(CodeScheme.BASE), (base_value,))
+        return instr_id
+
+    def _put_codes(self,
+                   instr_id: int,
+                   codes: Iterable[ICode]) -> None:
+        for c in codes:
+            self.instr_map[str(c.scheme)][c.value] = instr_id
+            self.instr_codes[str(c.scheme)][instr_id] = c.value
+            self._index_codes(str(c.scheme), (c.value,))
+
     def create_instr(self,
                      agent: IAgent) -> ICode:
         """
@@ -52,10 +141,164 @@ class InstrumentMap(IInstrumentMap):
             raise IncorrectPermissions(
                 f"Agent {agent} does not have the required permissions to create an instrument)")
 
-        new_code = ICode(CodeScheme.BASE, ICode.gen_base_code_value())
-        self.instr_map[str(new_code.scheme)][new_code] = new_code
+        return self._create_instr(agent.id())
+
+    def _create_instr(self,
+                      agent_id: str) -> ICode:
+        new_code = Code._trusted(CodeScheme.BASE, Code.gen_base_code_value())
+        record = None if self.journal is None else InstrMapJournal.encode_create(agent_id, new_code.value)
+        self._new_instr(new_code.value)
+        if record is not None:
+            self.journal.append(record)
+        if self.feed is not None:
+            self.feed.publish(InstrMapChangeFeed.CREATE, agent_id, new_code.value)
         return new_code
 
+    def create_instrs(self,
+                      agent: IAgent,
+                      n: int) -> List[ICode]:
+        """
+        Creates n instrument records in one call, allocating their globally unique identifiers as a block, see
+        GloballyUniqueIdentifier.block, rather than one uuid4 each.
+        Args:
+            agent (Agent): The agent requesting the creation of the instruments.
+            n (int): The number of instruments to create.
+        Returns:
+            List[Code]: The base codes of the created instruments.
+        Raises:
+            ValueError: If given arguments are null or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not isinstance(n, int) or isinstance(n, bool) or n < 0:
+            raise ValueError(f"n must be a non negative integer: {n}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to create an instrument)")
+
+        return self._create_instrs(n, agent.id())
+
+    def _create_instrs(self,
+                       n: int,
+                       agent_id: str) -> List[ICode]:
+        base_values = Code.gen_base_code_values(n)
+        records = None
+        if self.journal is not None:
+            records = b"".join(InstrMapJournal.encode_create(agent_id, base_value) for base_value in base_values)
+        first_id = len(self.instr_codes[str(CodeScheme.BASE)])
+        self.instr_map[str(CodeScheme.BASE)].update(zip(base_values, range(first_id, first_id + n)))
+        for scheme, scheme_codes in self.instr_codes.items():
+            scheme_codes.extend(base_values if scheme == str(CodeScheme.BASE) else [None] * n)
+        self._index_codes(str(CodeScheme.BASE), base_values)
+        if records is not None:
+            self.journal.append(records, n)
+        if self.feed is not None:
+            for base_value in base_values:
+                self.feed.publish(InstrMapChangeFeed.CREATE, agent_id, base_value)
+        return Code._trusted_many(CodeScheme.BASE, base_values)
+
+    def load_instrs(self,
+                    records: Iterable[Iterable[ICode]],
+                    agent: IAgent) -> List[ICode]:
+        """
+        Bulk load many new instruments, creating a base code for each record and adding the record's codes to it.
+
+        All records are validated and staged in a single pass and only merged into the map once every record
+        has been accepted, so if any record is rejected the map is left unchanged.
+        Args:
+            records (Iterable[Iterable[Code]]): The codes of each instrument to create, one record per instrument.
+            agent (Agent): The agent requesting the load.
+        Returns:
+            List[Code]: The base codes created, parallel to records.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type.
+            ValueError: If a record contains a base code or more than one code of the same scheme.
+            ValueError: If a code already exists in the map or is given in more than one record.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        if records is None:
+            raise ValueError("records cannot be None")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to create an instrument)")
+
+        return self._load_instrs(records, agent.id())
+
+    def _load_instrs(self,
+                     records: Iterable[Iterable[ICode]],
+                     agent_id: str) -> List[ICode]:
+        # Per scheme (current codes, staged codes, staged code values by instrument id), keyed by scheme number as
+        # that is far cheaper to hash than the scheme enum on a per code basis. New instruments take the ids
+        # following the current ones.
+        staged = {}
+        for scheme in CodeScheme:
+            staged[scheme.num] = (self.instr_map[str(scheme)], {}, {})
+        staged_base_map, staged_base_values = staged[CodeScheme.BASE.num][1:]
+        first_id = len(self.instr_codes[str(CodeScheme.BASE)])
+
+        base_codes = []
+        # The number of records is not known up front, so base code values are generated a block at a time.
+        base_values = GloballyUniqueIdentifier.blocks()
+        for i, record in enumerate(records):
+            if record is None or isinstance(record, (str, ICode)):
+                raise ValueError(
+                    f"record {i} must be an iterable of Code instances, but got {type(record)}")
+            base_code = Code._trusted(CodeScheme.BASE, next(base_values))
+            instr_id = first_id + i
+            staged_base_map[base_code.value] = instr_id
+            staged_base_values[instr_id] = base_code.value
+            for c in record:
+                if not isinstance(c, ICode):
+                    raise ValueError(
+                        f"record {i} must only contain Code instances, but got {type(c)}")
+                curr_map, staged_map, staged_values = staged[c.scheme.num]
+                if staged_map is staged_base_map:
+                    raise ValueError(
+                        f"record {i} cannot contain base code {c} as base codes are allocated by the load")
+                if c.value in curr_map or c.value in staged_map:
+                    raise ValueError(
+                        f"Cannot load code {c} of record {i} as it already exists in the map with a different base code")
+                if instr_id in staged_values:
+                    raise ValueError(
+                        f"Cannot load code {c} of record {i} as it already has code {staged_values[instr_id]} of the same scheme")
+                staged_map[c.value] = instr_id
+                staged_values[instr_id] = c.value
+            base_codes.append(base_code)
+
+        new_ids = range(first_id, first_id + len(base_codes))
+        created = []
+        if self.journal is not None or self.feed is not None:
+            alt_codes = [(scheme, staged[scheme.num][2]) for scheme in CodeScheme if scheme != CodeScheme.BASE]
+            created = [(base_code, [Code._trusted(scheme, values[instr_id]) for scheme, values in alt_codes
+                                    if instr_id in values])
+                       for instr_id, base_code in zip(new_ids, base_codes)]
+        records = None
+        if self.journal is not None:
+            records = b"".join(InstrMapJournal.encode_create(agent_id, base_code.value, codes)
+                               for base_code, codes in created)
+
+        for scheme in CodeScheme:
+            _, staged_map, staged_values = staged[scheme.num]
+            self.instr_map[str(scheme)].update(staged_map)
+            self.instr_codes[str(scheme)].extend(map(staged_values.get, new_ids))
+            self._index_codes(str(scheme), staged_map)
+
+        if records is not None:
+            self.journal.append(records, len(created))
+        if self.feed is not None:
+            for base_code, codes in created:
+                self.feed.publish(InstrMapChangeFeed.CREATE, agent_id, base_code.value, codes)
+        return base_codes
+
     def add_instr_codes(self,
                         code: ICode,
                         codes: List[ICode],
@@ -69,6 +312,7 @@ class InstrumentMap(IInstrumentMap):
         Raises:
             ValueError: If any paramater is none or of the wrong type.
             ValueError: If an instrument code in `codes` already exists in the map with a different base code.
+            ValueError: If the base code already has a different code of the same scheme as one in `codes`.
             CodeDoesNotExist: If the base `code` does not exist in the instrument map.
             IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
         """
@@ -76,17 +320,16 @@ class InstrumentMap(IInstrumentMap):
             raise ValueError(
                 f"code must be an instance of Code and cannot be None: {code}")
 
-        if code not in self.instr_map[str(code.scheme)]:
+        if code.value not in self.instr_map[str(code.scheme)]:
             raise CodeDoesNotExist(
                 f"Cannot add codes for a Code that does not exist in the map: {code}")
 
         if codes is None:
             raise ValueError("codes cannot be None")
 
-        if codes is not None:
-            if not isinstance(codes, List) or not all(isinstance(code, ICode) for code in codes):
-                raise ValueError(
-                    f"codes must be a list of Code instances, but got {type(codes)}")
+        if not isinstance(codes, List) or not all(isinstance(code, ICode) for code in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
 
         if agent is None or not isinstance(agent, IAgent):
             raise ValueError(
@@ -96,15 +339,265 @@ class InstrumentMap(IInstrumentMap):
             raise IncorrectPermissions(
                 f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to create an instrument)")
 
-        base_code = self.instr_map[str(code.scheme)][code]
+        self._add_instr_codes(self.instr_map[str(code.scheme)][code.value], codes, agent.id())
+
+    def _add_instr_codes(self,
+                         instr_id: int,
+                         codes: List[ICode],
+                         agent_id: str) -> None:
+        base_value = self.instr_codes[str(CodeScheme.BASE)][instr_id]
+
+        # Validate every code before changing anything so a rejected call leaves both indexes untouched.
+        new_codes = {}
         for c in codes:
-            if c not in self.instr_map[str(c.scheme)]:
-                self.instr_map[str(c.scheme)][c] = base_code
-            else:
-                curr_base = self.instr_map[str(c.scheme)][c]
-                if curr_base != base_code:
+            curr_id = self.instr_map[str(c.scheme)].get(c.value)
+            if curr_id is not None:
+                if curr_id != instr_id:
                     raise ValueError(
                         f"Cannot add code for a Code that already exists in the map with a different base code: {c}")
+                continue
+            curr_value = self.instr_codes[str(c.scheme)][instr_id]
+            if c.scheme in new_codes:
+                curr_value = new_codes[c.scheme].value
+            if curr_value is not None and curr_value != c.value:
+                raise ValueError(
+                    f"Cannot add code {c} as base code {base_value} already has code {Code(c.scheme, curr_value)} of the same scheme")
+            new_codes[c.scheme] = c
+
+        record = None
+        if self.journal is not None and new_codes:
+            record = InstrMapJournal.encode_add(agent_id, base_value, new_codes.values())
+        self._put_codes(instr_id, new_codes.values())
+        if record is not None:
+            self.journal.append(record)
+        if self.feed is not None and new_codes:
+            self.feed.publish(InstrMapChangeFeed.ADD, agent_id, base_value, new_codes.values())
+
+    def merge_instr(self,
+                    code: ICode,
+                    retired_code: ICode,
+                    agent: IAgent) -> ICode:
+        """
+        Merge two instruments found to be the same security. The codes of the retired instrument are moved to the
+        surviving one, which keeps its base code, and the retired base code is redirected to the survivor so it
+        still resolves, as do any base codes earlier redirected to the retired instrument.
+
+        Only the entries of the codes of the two instruments are changed, so a merge costs the number of their codes
+        and redirects whatever the size of the map. The merge is all or nothing.
+        Args:
+            code (Code): A code of the surviving instrument.
+            retired_code (Code): A code of the instrument to retire.
+            agent (Agent): The agent requesting the merge.
+        Returns:
+            Code: The base code of the surviving instrument.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            ValueError: If the codes are of the same instrument, or the instruments have different codes of a scheme.
+            CodeDoesNotExist: If either code does not exist in the map.
+            IncorrectPermissions: If the agent does not have the required permissions to maintain the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        if retired_code is None or not isinstance(retired_code, ICode):
+            raise ValueError(
+                f"retired_code must be an instance of Code and cannot be None: {retired_code}")
+
+        instr_id = self._find_instr(code)
+        retired_id = self._find_instr(retired_code)
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to merge instruments)")
+
+        return self._merge_codes(code, retired_code, instr_id, retired_id, agent.id())
+
+    def _merge_codes(self,
+                     code: ICode,
+                     retired_code: ICode,
+                     instr_id: int,
+                     retired_id: int,
+                     agent_id: str) -> ICode:
+        if instr_id == retired_id:
+            raise ValueError(f"Cannot merge codes {code} and {retired_code} as they are of the same instrument")
+
+        # Validate before changing anything so a rejected merge leaves the map untouched.
+        for scheme in CodeScheme:
+            if scheme == CodeScheme.BASE:
+                continue
+            value = self.instr_codes[str(scheme)][instr_id]
+            retired_value = self.instr_codes[str(scheme)][retired_id]
+            if value is not None and retired_value is not None and value != retired_value:
+                raise ValueError(
+                    f"Cannot merge as the instruments have different codes {Code(scheme, value)} and "
+                    f"{Code(scheme, retired_value)} of the same scheme")
+
+        self._merge_instr(instr_id, retired_id, agent_id)
+        return Code._trusted(CodeScheme.BASE, self.instr_codes[str(CodeScheme.BASE)][instr_id])
+
+    def _merge_instr(self,
+                     instr_id: int,
+                     retired_id: int,
+                     agent_id: str) -> None:
+        """
+        Move the codes of the retired instrument to the surviving one and redirect the retired base codes. The
+        retired instrument's id is left holding only its base code, so ids stay dense and snapshots save it as an
+        instrument with no other codes and a redirect to the surviving one.
+        """
+        base_values = self.instr_codes[str(CodeScheme.BASE)]
+        retired_value = base_values[retired_id]
+        record = None
+        if self.journal is not None:
+            record = InstrMapJournal.encode_merge(agent_id, base_values[instr_id], retired_value)
+        moved = []
+        for scheme in CodeScheme:
+            if scheme == CodeScheme.BASE:
+                continue
+            scheme_codes = self.instr_codes[str(scheme)]
+            value = scheme_codes[retired_id]
+            if value is not None:
+                self.instr_map[str(scheme)][value] = instr_id
+                scheme_codes[instr_id] = value
+                scheme_codes[retired_id] = None
+                moved.append(Code._trusted(scheme, value))
+
+        redirected = self._redirects.pop(retired_id, []) + [retired_value]
+        base_map = self.instr_map[str(CodeScheme.BASE)]
+        for value in redirected:
+            base_map[value] = instr_id
+        self._redirects.setdefault(instr_id, []).extend(redirected)
+        self._retired.add(retired_id)
+
+        if record is not None:
+            self.journal.append(record)
+        if self.feed is not None:
+            self.feed.publish(InstrMapChangeFeed.MERGE, agent_id, base_values[instr_id],
+                              [Code._trusted(CodeScheme.BASE, retired_value)] + moved)
+
+    def split_instr(self,
+                    code: ICode,
+                    codes: List[ICode],
+                    agent: IAgent) -> ICode:
+        """
+        Split an instrument in two by moving some of its codes to a new instrument, which is allocated a new base
+        code. The instrument split keeps its base code and any redirects to it.
+
+        Only the entries of the codes moved are changed, so a split costs the number of codes moved whatever the
+        size of the map. The split is all or nothing.
+        Args:
+            code (Code): A code of the instrument to split.
+            codes (List[Code]): The codes of the instrument to move to the new instrument, not its base code.
+            agent (Agent): The agent requesting the split.
+        Returns:
+            Code: The base code of the new instrument.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            ValueError: If codes is empty, holds a base code or holds a code not of the instrument.
+            CodeDoesNotExist: If the code does not exist in the map.
+            IncorrectPermissions: If the agent does not have the required permissions to maintain the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        instr_id = self._find_instr(code)
+
+        if codes is None or not isinstance(codes, List) or not all(isinstance(c, ICode) for c in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to split an instrument)")
+
+        return self._split_codes(code, instr_id, codes, agent.id())
+
+    def _split_codes(self,
+                     code: ICode,
+                     instr_id: int,
+                     codes: List[ICode],
+                     agent_id: str) -> ICode:
+        if not codes:
+            raise ValueError("Cannot split an instrument without codes to move")
+
+        moved = {}
+        for c in codes:
+            if c.scheme == CodeScheme.BASE:
+                raise ValueError(f"Cannot move base code {c} to a new instrument")
+            if self.instr_codes[str(c.scheme)][instr_id] != c.value:
+                raise ValueError(f"Cannot move code {c} as it is not a code of the instrument of {code}")
+            moved[c.scheme] = c
+
+        return self._split_instr(instr_id, list(moved.values()), Code.gen_base_code_values(1)[0], agent_id)
+
+    def _split_instr(self,
+                     instr_id: int,
+                     codes: List[ICode],
+                     new_base_value: str,
+                     agent_id: str) -> ICode:
+        # Idempotent, so a split journaled after the snapshot it is already in can be replayed.
+        base_value = self.instr_codes[str(CodeScheme.BASE)][instr_id]
+        record = None
+        if self.journal is not None:
+            record = InstrMapJournal.encode_split(agent_id, base_value, new_base_value, codes)
+        new_id = self._new_instr(new_base_value)
+        for c in codes:
+            scheme_codes = self.instr_codes[str(c.scheme)]
+            self.instr_map[str(c.scheme)][c.value] = new_id
+            scheme_codes[new_id] = c.value
+            if scheme_codes[instr_id] == c.value:
+                scheme_codes[instr_id] = None
+
+        new_code = Code._trusted(CodeScheme.BASE, new_base_value)
+        if record is not None:
+            self.journal.append(record)
+        if self.feed is not None:
+            self.feed.publish(InstrMapChangeFeed.SPLIT, agent_id, base_value, [new_code] + codes)
+        return new_code
+
+    def get_retired_codes(self,
+                          code: ICode,
+                          agent: IAgent) -> List[ICode]:
+        """
+        The base codes retired by merges in to the instrument of the given code, which now resolve to it.
+        Args:
+            code (Code): A code of the instrument.
+            agent (Agent): The agent requesting the codes.
+        Returns:
+            List[Code]: The retired base codes redirected to the instrument, in the order they were retired.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            CodeDoesNotExist: If the code does not exist in the map.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        instr_id = self._find_instr(code)
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to read the map)")
+
+        return self._retired_codes_of(instr_id)
+
+    def _retired_codes_of(self,
+                          instr_id: int) -> List[ICode]:
+        return Code._trusted_many(CodeScheme.BASE, self._redirects.get(instr_id, []))
 
     def get_instr_codes(self,
                         code: ICode,
@@ -126,10 +619,9 @@ class InstrumentMap(IInstrumentMap):
             raise ValueError(
                 f"code must be an instance of Code and cannot be None but got type {type(code)}")
 
-        if code not in self.instr_map[str(code.scheme)]:
-            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+        instr_id = self._find_instr(code)
 
-        if agent is None or not isinstance(agent, Agent):
+        if agent is None or not isinstance(agent, IAgent):
             raise ValueError(
                 f"agent must be an instance of Agent and cannot be None: {agent}")
 
@@ -137,14 +629,22 @@ class InstrumentMap(IInstrumentMap):
             raise IncorrectPermissions(
                 f"Agent {agent} does not have the required permissions {AgentRole.READER} to create an instrument)")
 
-        base_code = self.instr_map[str(code.scheme)][code]
+        return self._instr_codes_of(instr_id)
+
+    def _find_instr(self,
+                    code: ICode) -> int:
+        instr_id = self.instr_map[str(code.scheme)].get(code.value)
+        if instr_id is None:
+            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+        return instr_id
 
+    def _instr_codes_of(self,
+                        instr_id: int) -> List[ICode]:
         all_codes = []
         for scheme in CodeScheme:
-            codes = [key for key, value in self.instr_map[str(
-                scheme)].items() if value == base_code]
-            all_codes.extend(codes)
-
+            value = self.instr_codes[str(scheme)][instr_id]
+            if value is not None:
+                all_codes.append(Code._trusted(scheme, value))
         return all_codes
 
     def get_instr_code_of_type(self,
@@ -173,8 +673,7 @@ class InstrumentMap(IInstrumentMap):
             raise ValueError(
                 "code sheme must be an instance of CodeScheme and cannot be None")
 
-        if code not in self.instr_map[str(code.scheme)]:
-            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+        instr_id = self._find_instr(code)
 
         if agent is None or not isinstance(agent, IAgent):
             raise ValueError(
@@ -184,11 +683,488 @@ class InstrumentMap(IInstrumentMap):
             raise IncorrectPermissions(
                 f"Agent {agent} does not have the required permissions {AgentRole.READER} to create an instrument)")
 
-        codes = self.get_instr_codes(code, agent=agent)
+        return self._instr_code_of_type(code, instr_id, code_scheme)
 
-        for c in codes:
-            if c.scheme == code_scheme:
-                return c
+    def _instr_code_of_type(self,
+                            code: ICode,
+                            instr_id: int,
+                            code_scheme: CodeScheme) -> ICode:
+        # code -> instrument id -> code of the requested scheme, one hash lookup and one list index whatever the
+        # size of the map.
+        matching_value = self.instr_codes[str(code_scheme)][instr_id]
+        if matching_value is not None:
+            return Code._trusted(code_scheme, matching_value)
 
         raise OnlyBaseCodeDefined(
             f"Code {code} has no matching codes for code scheme {code_scheme}")
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        Translate a batch of codes to their code of the given scheme in a single call.
+
+        The arguments and the agent are validated once for the whole batch, codes that cannot be
+        translated are reported as None in the result rather than raising per item.
+        Args:
+            codes (Sequence[Code | str]): The codes to translate, or raw code values if source_scheme is given.
+            code_scheme (CodeScheme): The code scheme to translate to.
+            agent (Agent): The agent requesting the translation.
+            source_scheme (CodeScheme): Optional, the code scheme of the raw code values given in codes.
+        Returns:
+            List[Code]: Parallel to codes, the matching code of the given scheme or None if the code does not
+                        exist in the map or the instrument has no code of the given scheme.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        if source_scheme is not None and not isinstance(source_scheme, CodeScheme):
+            raise ValueError(
+                "source code sheme must be an instance of CodeScheme")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to translate codes)")
+
+        return self._translate_codes(codes, code_scheme, source_scheme)
+
+    def _translate_codes(self,
+                         codes: Sequence[Union[ICode, str]],
+                         code_scheme: CodeScheme,
+                         source_scheme: Optional[CodeScheme]) -> List[Optional[ICode]]:
+        target_values = self.instr_codes[str(code_scheme)]
+        trusted_code = Code._trusted
+
+        def target_code(instr_id: Optional[int]) -> Optional[ICode]:
+            if instr_id is None:
+                return None
+            value = target_values[instr_id]
+            return trusted_code(code_scheme, value) if value is not None else None
+
+        if source_scheme is not None:
+            source_codes = self.instr_map[str(source_scheme)].get
+            return [target_code(instr_id) for instr_id in map(source_codes, codes)]
+
+        # Batches are usually all of one scheme, so only look up the source index when the scheme changes.
+        last_scheme = None
+        translated = []
+        for c in codes:
+            if not isinstance(c, ICode):
+                raise ValueError(
+                    f"codes must all be instances of Code when no source scheme is given, but got {type(c)}")
+            if c.scheme is not last_scheme:
+                last_scheme = c.scheme
+                source_codes = self.instr_map[str(last_scheme)].get
+            translated.append(target_code(source_codes(c.value)))
+        return translated
+
+    def find_codes(self,
+                   code_scheme: CodeScheme,
+                   agent: IAgent,
+                   prefix: Optional[str] = None,
+                   start: Optional[str] = None,
+                   stop: Optional[str] = None,
+                   pattern: Optional[str] = None) -> Iterator[Tuple[ICode, ICode]]:
+        """
+        Search the codes of a scheme by prefix, by range or by glob pattern, e.g. all RICs starting with AAPL or
+        all ISINs matching GB*. Codes are returned lazily in code value order, and a search costs in proportion to
+        the codes in its range, or starting with the literal prefix of its pattern, not to the codes in the scheme.
+        Args:
+            code_scheme (CodeScheme): The scheme of the codes to search.
+            agent (Agent): The agent requesting the search.
+            prefix (str): Optional, the prefix of the code values to find.
+            start (str): Optional, the first code value of the range to find, from the first code if not given.
+            stop (str): Optional, the code value the range to find stops before, to the last code if not given.
+            pattern (str): Optional, a case sensitive glob pattern of * ? and [] the code values must match.
+        Returns:
+            Iterator[Tuple[Code, Code]]: The (code, base code) of each code found, all the codes of the scheme if
+                                         no prefix, range or pattern is given.
+        Raises:
+            ValueError: If parameters are None or of the wrong type, or more than one kind of search is given.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        self._check_find_args(code_scheme, prefix, start, stop, pattern)
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to search the map)")
+
+        return self._find_codes(code_scheme, prefix, start, stop, pattern)
+
+    @staticmethod
+    def _check_find_args(code_scheme: CodeScheme,
+                         prefix: Optional[str],
+                         start: Optional[str],
+                         stop: Optional[str],
+                         pattern: Optional[str]) -> None:
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        for arg in (prefix, start, stop, pattern):
+            if arg is not None and not isinstance(arg, str):
+                raise ValueError(f"prefix, start, stop and pattern must be strings: {arg}")
+
+        if sum((prefix is not None, start is not None or stop is not None, pattern is not None)) > 1:
+            raise ValueError("Only one of prefix, start and stop or pattern can be given")
+
+    def _find_codes(self,
+                    code_scheme: CodeScheme,
+                    prefix: Optional[str],
+                    start: Optional[str],
+                    stop: Optional[str],
+                    pattern: Optional[str]) -> Iterator[Tuple[ICode, ICode]]:
+        scheme = str(code_scheme)
+        code_index = self._code_indexes.get(scheme)
+        if code_index is None:
+            code_index = self._code_indexes[scheme] = CodeIndex(self.instr_map[scheme])
+
+        if prefix is not None:
+            values = code_index.prefix(prefix)
+        elif pattern is not None:
+            values = code_index.match(pattern)
+        else:
+            values = code_index.range(start, stop)
+        return self._found_codes(code_scheme, values)
+
+    def _found_codes(self,
+                     code_scheme: CodeScheme,
+                     values: Iterator[str]) -> Iterator[Tuple[ICode, ICode]]:
+        scheme_map = self.instr_map[str(code_scheme)]
+        base_values = self.instr_codes[str(CodeScheme.BASE)]
+        for value in values:
+            instr_id = scheme_map.get(value)
+            if instr_id is not None:
+                yield Code._trusted(code_scheme, value), Code._trusted(CodeScheme.BASE, base_values[instr_id])
+
+    def export_instrs(self,
+                      agent: IAgent,
+                      code_schemes: Optional[Sequence[CodeScheme]] = None,
+                      chunk_size: int = 10000) -> Iterator[List[Tuple[ICode, Dict[CodeScheme, ICode]]]]:
+        """
+        Iterate over every instrument and its codes, a chunk of instruments at a time. The instruments are walked
+        in id order straight off the per scheme code columns, so a full export is linear in the size of the map
+        and only a chunk of records is held at a time.
+
+        The export is not a point in time copy, instruments created once it has started are not exported and
+        codes added to an instrument are exported if it is yet to be reached.
+        Args:
+            agent (Agent): The agent requesting the export.
+            code_schemes (Sequence[CodeScheme]): Optional, the schemes to export, if given only the instruments
+                                                 with a code of at least one of them are exported.
+            chunk_size (int): The number of instruments in each chunk.
+        Returns:
+            Iterator[List[Tuple[Code, Dict[CodeScheme, Code]]]]: Chunks of the (base code, {scheme: code}) of
+                                                                 each instrument, the codes not including the base.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        code_schemes = self._export_schemes(code_schemes, chunk_size)
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to export the map)")
+
+        return self._export_instrs(code_schemes, chunk_size, filtered=len(code_schemes) < len(CodeScheme) - 1)
+
+    @staticmethod
+    def _export_schemes(code_schemes: Optional[Sequence[CodeScheme]],
+                        chunk_size: int) -> List[CodeScheme]:
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError(f"chunk_size must be an integer of at least 1: {chunk_size}")
+
+        if code_schemes is None:
+            return [scheme for scheme in CodeScheme if scheme != CodeScheme.BASE]
+
+        if isinstance(code_schemes, (str, CodeScheme)) or not all(isinstance(s, CodeScheme) for s in code_schemes):
+            raise ValueError(
+                f"code_schemes must be a sequence of CodeScheme instances: {code_schemes}")
+        # The base code is always exported, as the key of each instrument.
+        return list(dict.fromkeys(scheme for scheme in code_schemes if scheme != CodeScheme.BASE))
+
+    def _export_instrs(self,
+                       code_schemes: List[CodeScheme],
+                       chunk_size: int,
+                       filtered: bool) -> Iterator[List[Tuple[ICode, Dict[CodeScheme, ICode]]]]:
+        base_values = self.instr_codes[str(CodeScheme.BASE)]
+        columns = [(scheme, self.instr_codes[str(scheme)]) for scheme in code_schemes]
+        trusted = Code._trusted
+        retired = self._retired
+        num_instrs = len(base_values)
+        for first_id in range(0, num_instrs, chunk_size):
+            chunk = []
+            for instr_id in range(first_id, min(first_id + chunk_size, num_instrs)):
+                if instr_id in retired:
+                    continue
+                codes = {}
+                for scheme, values in columns:
+                    value = values[instr_id]
+                    if value is not None:
+                        codes[scheme] = trusted(scheme, value)
+                if codes or not filtered:
+                    chunk.append((trusted(CodeScheme.BASE, base_values[instr_id]), codes))
+            if chunk:
+                yield chunk
+
+    def save_export(self,
+                    path: str,
+                    agent: IAgent,
+                    code_schemes: Optional[Sequence[CodeScheme]] = None,
+                    chunk_size: int = 10000,
+                    file_format: Optional[str] = None) -> int:
+        """
+        Write every instrument and its codes as CSV or JSONL, streamed a chunk at a time, see export_instrs and
+        InstrMapExport for the instruments exported and the file formats.
+        Args:
+            path (str): The file to write, gzipped if its name ends .gz.
+            agent (Agent): The agent requesting the export.
+            code_schemes (Sequence[CodeScheme]): Optional, the schemes to export, every scheme if not given.
+            chunk_size (int): The number of instruments to write at a time.
+            file_format (str): Optional, csv or jsonl, from the file name if not given.
+        Returns:
+            int: The number of instruments written.
+        Raises:
+            ValueError: If parameters are None or of the wrong type, or the format is not known.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if path is None or not isinstance(path, str):
+            raise ValueError(f"path must be a string and cannot be None: {path}")
+
+        code_schemes = self._export_schemes(code_schemes, chunk_size)
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to export the map)")
+
+        filtered = len(code_schemes) < len(CodeScheme) - 1
+        return InstrMapExport.write(path, self._export_rows(code_schemes, chunk_size, filtered), code_schemes,
+                                    file_format)
+
+    def _export_rows(self,
+                     code_schemes: List[CodeScheme],
+                     chunk_size: int,
+                     filtered: bool) -> Iterator[List[Tuple[Optional[str], ...]]]:
+        """
+        The chunks of export_instrs as rows of the base code value then the code value of each scheme or None,
+        for writing to files without creating a Code per code.
+        """
+        base_values = self.instr_codes[str(CodeScheme.BASE)]
+        columns = [self.instr_codes[str(scheme)] for scheme in code_schemes]
+        num_instrs = len(base_values)
+        for first_id in range(0, num_instrs, chunk_size):
+            last_id = min(first_id + chunk_size, num_instrs)
+            rows = list(zip(*(values[first_id:last_id] for values in [base_values] + columns)))
+            if self._retired:
+                rows = [row for instr_id, row in enumerate(rows, first_id) if instr_id not in self._retired]
+            if filtered:
+                rows = [row for row in rows if any(value is not None for value in row[1:])]
+            if rows:
+                yield rows
+
+    def session(self,
+                agent: IAgent) -> InstrMapReaderSession:
+        """
+        Check the agent's permissions once and return a view of the map whose methods act as the agent without
+        checking it on every call, a maintainer session for maintainers and a reader session for readers.
+        Args:
+            agent (Agent): The agent to create the session for.
+        Returns:
+            InstrMapReaderSession: The session, an InstrMapMaintainerSession if the agent is a maintainer.
+        Raises:
+            ValueError: If the agent is None or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if agent.has_required_permissions(AgentRole.MAINTAINER):
+            return InstrMapMaintainerSession(self, agent)
+
+        if agent.has_required_permissions(AgentRole.READER):
+            return InstrMapReaderSession(self, agent)
+
+        raise IncorrectPermissions(
+            f"Agent {agent} does not have the required permissions {AgentRole.READER} to open a session)")
+
+    def save_snapshot(self,
+                      path: str,
+                      agent: IAgent) -> None:
+        """
+        Save the map as a compact binary snapshot, which can be opened read only with SnapshotInstrumentMap
+        or loaded back in to an InstrumentMap with load_snapshot.
+        Args:
+            path (str): The file to save the snapshot to.
+            agent (Agent): The agent requesting the snapshot.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if path is None or not isinstance(path, str):
+            raise ValueError(f"path must be a string and cannot be None: {path}")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to snapshot the map)")
+
+        InstrMapSnapshot.write(path, self.instr_codes, self._retired_ids())
+
+    def _retired_ids(self) -> Dict[int, int]:
+        """
+        The id of the instrument each retired instrument was merged in to, by the id of the retired instrument.
+        """
+        base_values = self.instr_codes[str(CodeScheme.BASE)]
+        base_map = self.instr_map[str(CodeScheme.BASE)]
+        return {retired_id: base_map[base_values[retired_id]] for retired_id in self._retired}
+
+    def checkpoint(self,
+                   path: str,
+                   agent: IAgent) -> None:
+        """
+        Save the map as a snapshot and then truncate the journal, as all the changes it records are in the snapshot.
+        Args:
+            path (str): The file to save the snapshot to.
+            agent (Agent): The agent requesting the checkpoint.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to maintain the map.
+        """
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to checkpoint the map)")
+
+        self.save_snapshot(path, agent)
+        if self.journal is not None:
+            self.journal.truncate()
+
+    @classmethod
+    def load_snapshot(cls,
+                      path: str,
+                      agent: IAgent) -> 'InstrumentMap':
+        """
+        Create a map holding the instruments of a snapshot saved by save_snapshot, including the redirects of the
+        base codes retired by a merge.
+        Args:
+            path (str): The snapshot file to load.
+            agent (Agent): The agent requesting the load.
+        Returns:
+            InstrumentMap: A new map holding the instruments of the snapshot.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type, or the file is not a valid snapshot.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        if path is None or not isinstance(path, str):
+            raise ValueError(f"path must be a string and cannot be None: {path}")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to create an instrument)")
+
+        # Instruments keep the instrument numbers of the snapshot as their ids.
+        instr_map = cls()
+        schemes = [(instr_map.instr_map[str(scheme)], instr_map.instr_codes[str(scheme)]) for scheme in CodeScheme]
+        with SnapshotInstrumentMap(path) as snapshot:
+            for instr_id, values in enumerate(snapshot.instruments()):
+                for (scheme_map, scheme_codes), value in zip(schemes, values):
+                    scheme_codes.append(value)
+                    if value is not None:
+                        scheme_map[value] = instr_id
+            base_map, base_values = schemes[0]
+            for retired_id, instr_id in snapshot.redirects():
+                base_map[base_values[retired_id]] = instr_id
+                instr_map._redirects.setdefault(instr_id, []).append(base_values[retired_id])
+                instr_map._retired.add(retired_id)
+        return instr_map
+
+    @classmethod
+    def recover(cls,
+                snapshot_path: str,
+                journal_path: str,
+                agent: IAgent,
+                batch_size: int = 1,
+                max_delay: Optional[float] = None) -> 'InstrumentMap':
+        """
+        Recover a map from its last checkpoint snapshot, if there is one, and replay the journal of the changes made
+        since. The journal is then re-opened so further changes to the recovered map are recorded in it.
+        Args:
+            snapshot_path (str): The snapshot file of the last checkpoint.
+            journal_path (str): The journal file.
+            agent (Agent): The agent requesting the recovery.
+            batch_size (int): The number of journal records to group in to each fsync.
+            max_delay (float): Optional, the seconds after which a group of journal records is synced by the next
+                               change even if it holds fewer than batch_size records.
+        Returns:
+            InstrumentMap: The recovered map.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type, or the files are not a valid snapshot or journal.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            instr_map = cls.load_snapshot(snapshot_path, agent)
+        else:
+            if agent is None or not isinstance(agent, IAgent):
+                raise ValueError(
+                    f"agent must be an instance of Agent and cannot be None: {agent}")
+            if not agent.has_required_permissions(AgentRole.MAINTAINER):
+                raise IncorrectPermissions(
+                    f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to create an instrument)")
+            instr_map = cls()
+
+        if journal_path is None or not isinstance(journal_path, str):
+            raise ValueError(f"journal_path must be a string and cannot be None: {journal_path}")
+
+        # Replay is idempotent, a crash between a checkpoint's snapshot and its journal truncate replays changes
+        # that are already in the snapshot.
+        if os.path.exists(journal_path) and os.path.getsize(journal_path) > 0:
+            for op, agent_id, base_value, codes in InstrMapJournal.records(journal_path):
+                if op == InstrMapJournal.MERGE:
+                    instr_id = instr_map._new_instr(base_value)
+                    retired_id = instr_map._new_instr(codes[0].value)
+                    if retired_id != instr_id:
+                        instr_map._merge_instr(instr_id, retired_id, agent_id)
+                elif op == InstrMapJournal.SPLIT:
+                    instr_map._split_instr(instr_map._new_instr(base_value), codes[1:], codes[0].value, agent_id)
+                else:
+                    instr_map._put_codes(instr_map._new_instr(base_value), codes)
+
+        instr_map.journal = InstrMapJournal(journal_path, batch_size=batch_size, max_delay=max_delay)
+        return instr_map
@@ -0,0 +1,235 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from interface.ICode import ICode
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from exception.ChangesNoLongerHeld import ChangesNoLongerHeld
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """
+    A change made to an instrument map.
+
+    Attributes:
+        seq (int): The sequence number of the change, the first change is 1 and each change is one more.
+        op (str): InstrMapChangeFeed.CREATE, an instrument was created with the codes, InstrMapChangeFeed.ADD,
+                  the codes were added to an instrument, InstrMapChangeFeed.MERGE, the instrument of the first code,
+                  a retired base code, was merged in to the instrument with the rest of the codes moved to it, or
+                  InstrMapChangeFeed.SPLIT, the rest of the codes were moved to a new instrument, the first code.
+        agent_id (str): The id of the agent that made the change.
+        base_code (Code): The base code of the instrument changed.
+        codes (Tuple[Code, ...]): The codes of the change, not including the base code of the instrument changed.
+    """
+    seq: int
+    op: str
+    agent_id: str
+    base_code: ICode
+    codes: Tuple[ICode, ...]
+
+
+class InstrMapChangeFeed:
+    """
+    An ordered, sequence numbered feed of the changes made to an InstrumentMap, so consumers keeping a copy of
+    some of the map apply the changes rather than re-reading the map to find them.
+
+    The last max_events changes are held, so a consumer can resume from the sequence number of the last change
+    it saw, and one that has fallen further behind than that gets ChangesNoLongerHeld and must re-read the map.
+
+    Changes are passed to callbacks as they are made, on the thread making them, and to async iterators through
+    their event loops, so a slow consumer of an iterator never holds up changes to the map. A callback that
+    raises is unsubscribed, with the error kept in callback_errors, so a faulty consumer cannot fail changes to
+    the map.
+
+    Attributes:
+        max_events (int): The number of the latest changes held.
+        callback_errors (Dict[int, Exception]): The error of each callback unsubscribed for raising, by token.
+    Methods:
+        publish(op: str, agent_id: str, base_value: str, codes: Iterable[Code]) -> ChangeEvent: Records a change, called by the map.
+        since(after_seq: int) -> List[ChangeEvent]: The changes after a sequence number.
+        subscribe(callback: Callable[[ChangeEvent], None], after_seq: int) -> int: Calls callback with every change.
+        unsubscribe(token: int) -> None: Stops calling a callback.
+        changes(after_seq: int) -> AsyncIterator[ChangeEvent]: Iterates over the changes as they are made.
+    """
+    CREATE = "create"
+    ADD = "add"
+    MERGE = "merge"
+    SPLIT = "split"
+
+    def __init__(self,
+                 max_events: int = 100000):
+        """
+        Args:
+            max_events (int): The number of the latest changes to hold for consumers to resume from.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+        """
+        if not isinstance(max_events, int) or max_events < 1:
+            raise ValueError(f"max_events must be a positive integer: {max_events}")
+
+        self.max_events = max_events
+        self.callback_errors = {}
+        # Changes are held in a list, trimmed to max_events once it holds twice that, so a change is found by
+        # indexing from the sequence number of the first held.
+        self._events: List[ChangeEvent] = []
+        self._first_seq = 1
+        self._callbacks: Dict[int, Callable[[ChangeEvent], None]] = {}
+        self._next_token = 1
+        self._waiters = set()
+        self._lock = threading.Lock()
+        return
+
+    @property
+    def last_seq(self) -> int:
+        """
+        The sequence number of the last change, 0 if there have been none.
+        """
+        return self._first_seq + len(self._events) - 1
+
+    def publish(self,
+                op: str,
+                agent_id: str,
+                base_value: str,
+                codes: Iterable[ICode] = ()) -> ChangeEvent:
+        """
+        Record a change to the map and pass it to the subscribers, called by the map once the change is made.
+        Args:
+            op (str): CREATE, ADD, MERGE or SPLIT.
+            agent_id (str): The id of the agent that made the change.
+            base_value (str): The base code value of the instrument changed.
+            codes (Iterable[Code]): The codes of the change, see ChangeEvent.
+        Returns:
+            ChangeEvent: The change recorded.
+        """
+        with self._lock:
+            event = ChangeEvent(self.last_seq + 1, op, agent_id, Code._trusted(CodeScheme.BASE, base_value),
+                                tuple(codes))
+            self._events.append(event)
+            if len(self._events) >= 2 * self.max_events:
+                trim = len(self._events) - self.max_events
+                del self._events[:trim]
+                self._first_seq += trim
+            callbacks = list(self._callbacks.items())
+            waiters = list(self._waiters)
+
+        for token, callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                self.unsubscribe(token)
+                self.callback_errors[token] = e
+        for loop, wakeup in waiters:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # The iterator's loop is closed, it is removed when the iterator is.
+                pass
+        return event
+
+    def since(self,
+              after_seq: int) -> List[ChangeEvent]:
+        """
+        The changes held after the given sequence number, in order.
+        Args:
+            after_seq (int): The sequence number of the last change seen, 0 for all changes.
+        Returns:
+            List[ChangeEvent]: The changes after after_seq.
+        Raises:
+            ValueError: If after_seq is not an integer or is after the last change.
+            ChangesNoLongerHeld: If changes after after_seq are no longer held.
+        """
+        if not isinstance(after_seq, int) or isinstance(after_seq, bool):
+            raise ValueError(f"after_seq must be an integer: {after_seq}")
+
+        with self._lock:
+            return self._held_since(after_seq)
+
+    def _held_since(self,
+                    after_seq: int) -> List[ChangeEvent]:
+        # Called holding the lock.
+        if after_seq > self.last_seq:
+            raise ValueError(f"after_seq {after_seq} is after the last change {self.last_seq}")
+        if after_seq < self._first_seq - 1:
+            raise ChangesNoLongerHeld(
+                f"Changes from {after_seq + 1} are no longer held, the first held is {self._first_seq}")
+        return self._events[max(after_seq - self._first_seq + 1, 0):]
+
+    def subscribe(self,
+                  callback: Callable[[ChangeEvent], None],
+                  after_seq: Optional[int] = None) -> int:
+        """
+        Call callback with every change made to the map from now on, and first with the changes held after
+        after_seq if it is given.
+        Args:
+            callback (Callable[[ChangeEvent], None]): The function to call with each change.
+            after_seq (int): Optional, the sequence number of the last change the subscriber saw.
+        Returns:
+            int: The token to unsubscribe with.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            ChangesNoLongerHeld: If changes after after_seq are no longer held.
+        """
+        if callback is None or not callable(callback):
+            raise ValueError(f"callback must be callable and cannot be None: {callback}")
+
+        if after_seq is not None and (not isinstance(after_seq, int) or isinstance(after_seq, bool)):
+            raise ValueError(f"after_seq must be an integer: {after_seq}")
+
+        # Replay outside the lock, so the callback may use the feed, until no change has been made since the
+        # last replayed, then subscribe under the lock so no change falls between the replay and the subscription.
+        while True:
+            if after_seq is not None:
+                for event in self.since(after_seq):
+                    callback(event)
+                    after_seq = event.seq
+            with self._lock:
+                if after_seq is None or after_seq == self.last_seq:
+                    token = self._next_token
+                    self._next_token += 1
+                    self._callbacks[token] = callback
+                    return token
+
+    def unsubscribe(self,
+                    token: int) -> None:
+        with self._lock:
+            self._callbacks.pop(token, None)
+
+    def changes(self,
+                after_seq: Optional[int] = None) -> AsyncIterator[ChangeEvent]:
+        """
+        Iterate over the changes made to the map, waiting for each change once all those made have been seen.
+        Args:
+            after_seq (int): Optional, the sequence number of the last change seen, to resume from, the changes
+                             made from now on if not given.
+        Returns:
+            AsyncIterator[ChangeEvent]: The changes after after_seq, raising ChangesNoLongerHeld if the iterator
+                                        falls more than max_events behind.
+        Raises:
+            ValueError: If after_seq is not an integer or is after the last change.
+            ChangesNoLongerHeld: If changes after after_seq are no longer held.
+        """
+        if after_seq is None:
+            after_seq = self.last_seq
+        self.since(after_seq)
+        return self._changes(after_seq)
+
+    async def _changes(self,
+                       after_seq: int) -> AsyncIterator[ChangeEvent]:
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            while True:
+                # Cleared before looking for changes so a change made after the look wakes the wait.
+                waiter[1].clear()
+                events = self.since(after_seq)
+                for event in events:
+                    yield event
+                    after_seq = event.seq
+                if not events:
+                    await waiter[1].wait()
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
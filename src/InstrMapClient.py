@@ -0,0 +1,269 @@
+import asyncio
+from collections import deque
+from typing import Callable, List, Optional, Sequence, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from src.CodeScheme import CodeScheme
+from src.InstrMapProtocol import InstrMapProtocol
+
+
+class _Connection:
+    """
+    One pooled connection to the server, with the futures of its in flight request frames in send order.
+
+    Once its reader stops, whether the connection was lost or closed, the connection is dead, its in flight and
+    any later requests fail with ConnectionError, and on_lost is called so the pool stops using it.
+    """
+
+    def __init__(self,
+                 reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter,
+                 on_lost: Optional[Callable[['_Connection'], None]] = None):
+        self.reader = reader
+        self.writer = writer
+        self.on_lost = on_lost
+        self.alive = True
+        self.in_flight = deque()
+        self.reader_task = asyncio.ensure_future(self._read())
+
+    def send(self,
+             requests: List[dict],
+             futures: List[asyncio.Future]) -> None:
+        self.in_flight.append(futures)
+        if not self.alive:
+            self._fail(ConnectionError("Connection to instrument map server lost"))
+            return
+        InstrMapProtocol.write_frame(self.writer, requests)
+
+    async def _read(self) -> None:
+        error = ConnectionError("Connection to instrument map server closed")
+        try:
+            while True:
+                responses = await InstrMapProtocol.read_frame(self.reader)
+                futures = self.in_flight.popleft()
+                for future, response in zip(futures, responses):
+                    if not future.done():
+                        future.set_result(response)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, IndexError) as e:
+            error = ConnectionError(f"Connection to instrument map server lost: {e}")
+        finally:
+            self.alive = False
+            self._fail(error)
+            if self.on_lost is not None:
+                self.on_lost(self)
+
+    def _fail(self,
+              e: Exception) -> None:
+        while self.in_flight:
+            for future in self.in_flight.popleft():
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self) -> None:
+        self.reader_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._fail(ConnectionError("Connection to instrument map server closed"))
+
+
+class InstrMapClient:
+    """
+    An asyncio client for InstrMapServer with a pool of connections.
+
+    Calls made concurrently, e.g. from many tasks, are queued and sent together as one request frame on the
+    next turn of the event loop (or as soon as max_batch calls are queued), so many small lookups share a
+    round trip. Frames are spread round robin over the pooled connections and each connection pipelines
+    its frames. A lost connection is dropped from the pool, and once none are left calls fail with
+    ConnectionError until connect is called again.
+
+    Methods:
+        connect() -> None: Opens the pooled connections.
+        close() -> None: Closes the pooled connections.
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 pool_size: int = 4,
+                 max_batch: int = 1024):
+        """
+        Args:
+            host (str): The host of the server.
+            port (int): The port of the server.
+            pool_size (int): The number of connections to open.
+            max_batch (int): The maximum number of calls to coalesce in to one request frame.
+        Raises:
+            ValueError: If parameters are of the wrong type.
+        """
+        if not isinstance(pool_size, int) or pool_size < 1:
+            raise ValueError(f"pool_size must be a positive integer: {pool_size}")
+
+        if not isinstance(max_batch, int) or max_batch < 1:
+            raise ValueError(f"max_batch must be a positive integer: {max_batch}")
+
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.max_batch = max_batch
+        self._connections: List[_Connection] = []
+        self._next_connection = 0
+        self._requests = []
+        self._futures = []
+        self._flush_scheduled = False
+        return
+
+    async def connect(self) -> None:
+        for _ in range(self.pool_size):
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self._connections.append(_Connection(reader, writer, self._connection_lost))
+
+    async def close(self) -> None:
+        self._flush()
+        connections, self._connections = self._connections, []
+        for connection in connections:
+            await connection.close()
+
+    def _connection_lost(self,
+                         connection: _Connection) -> None:
+        if connection in self._connections:
+            self._connections.remove(connection)
+            self._next_connection = 0
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        if not self._requests:
+            return
+        requests, futures = self._requests, self._futures
+        self._requests, self._futures = [], []
+        if not self._connections:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(ConnectionError("Client has no live connection to an instrument map server"))
+            return
+        connection = self._connections[self._next_connection]
+        self._next_connection = (self._next_connection + 1) % len(self._connections)
+        connection.send(requests, futures)
+
+    async def _call(self,
+                    request: dict,
+                    agent: IAgent) -> object:
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+        request["agent"] = agent.id()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._requests.append(request)
+        self._futures.append(future)
+        if len(self._requests) >= self.max_batch:
+            self._flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+
+        response = await future
+        if "error" in response:
+            raise InstrMapProtocol.decode_error(response)
+        return response["result"]
+
+    async def get_instr_codes(self,
+                              code: ICode,
+                              agent: IAgent) -> List[ICode]:
+        """
+        Retrieve all code schemes values that map to the given code.
+        Args:
+            code (Code): The code for which to find all equivalent codes.
+            agent (Agent): The agent requesting the get of the alternate codes.
+        Returns:
+            List[Code]: A list of codes that map to the same base code as the given code.
+        Raises:
+            As for IInstrumentMap.get_instr_codes, ConnectionError if the connection to the server fails.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None but got type {type(code)}")
+
+        result = await self._call({"op": "get_instr_codes",
+                                   "code": InstrMapProtocol.encode_code(code)}, agent)
+        return InstrMapProtocol.decode_codes(result)
+
+    async def get_instr_code_of_type(self,
+                                     code: ICode,
+                                     code_scheme: CodeScheme,
+                                     agent: IAgent) -> ICode:
+        """
+        Retrieve the instrument code of a specific type.
+        Args:
+            code (Code): The code to search for.
+            code_scheme (CodeScheme): The code scheme to match.
+            agent (Agent): The agent requesting the get of the alternate codes.
+        Returns:
+            Code: The matching instrument code of the specified type.
+        Raises:
+            As for IInstrumentMap.get_instr_code_of_type, ConnectionError if the connection to the server fails.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                "code must be an instance of Code and cannot be None")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        result = await self._call({"op": "get_instr_code_of_type",
+                                   "code": InstrMapProtocol.encode_code(code),
+                                   "scheme": str(code_scheme)}, agent)
+        return InstrMapProtocol.decode_code(result)
+
+    async def translate_codes(self,
+                              codes: Sequence[Union[ICode, str]],
+                              code_scheme: CodeScheme,
+                              agent: IAgent,
+                              source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        Translate a batch of codes to their code of the given scheme.
+        Args:
+            codes (Sequence[Code | str]): The codes to translate, or raw code values if source_scheme is given.
+            code_scheme (CodeScheme): The code scheme to translate to.
+            agent (Agent): The agent requesting the translation.
+            source_scheme (CodeScheme): Optional, the code scheme of the raw code values given in codes.
+        Returns:
+            List[Code]: Parallel to codes, the matching code of the given scheme or None if there is none.
+        Raises:
+            As for IInstrumentMap.translate_codes, ConnectionError if the connection to the server fails.
+        """
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        request = {"op": "translate_codes", "scheme": str(code_scheme)}
+        if source_scheme is None:
+            if not all(isinstance(c, ICode) for c in codes):
+                raise ValueError("codes must all be instances of Code when no source scheme is given")
+            request["codes"] = InstrMapProtocol.encode_codes(codes)
+        else:
+            if not isinstance(source_scheme, CodeScheme):
+                raise ValueError("source code sheme must be an instance of CodeScheme")
+            request["codes"] = list(codes)
+            request["source_scheme"] = str(source_scheme)
+
+        result = await self._call(request, agent)
+        return InstrMapProtocol.decode_codes(result)
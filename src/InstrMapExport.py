@@ -0,0 +1,99 @@
+import csv
+import gzip
+import json
+import os
+from typing import Iterable, List, Optional, Sequence, TextIO, Tuple
+from src.CodeScheme import CodeScheme
+
+# A chunk of exported instruments, the row of each, its base code value then its code value of each exported
+# scheme or None.
+ExportChunk = List[Tuple[Optional[str], ...]]
+
+
+class InstrMapExport:
+    """
+    Writes chunks of exported instruments as CSV or JSONL, one line per instrument, a chunk at a time so memory
+    is bounded by the chunk size whatever the size of the map. The chunks are rows of code values rather than
+    the Code records of InstrumentMap.export_instrs, as a file needs only the values.
+
+    CSV has a header line of BASE and the exported schemes, and an empty field where an instrument has no code
+    of a scheme. JSONL has an object per instrument of BASE and the schemes it has codes of. Both are formats
+    InstrMapIngest reads, the BASE column naming the instrument the other codes are added to.
+
+    Static Methods:
+        file_format_of(path: str) -> str: The format of a file from its name.
+        write(path: str, chunks: Iterable[ExportChunk], code_schemes: Sequence[CodeScheme], file_format: str) -> int: Writes the chunks to a file.
+        dump(f: TextIO, chunks: Iterable[ExportChunk], code_schemes: Sequence[CodeScheme], file_format: str) -> int: Writes the chunks to a text stream.
+    """
+    FORMATS = ("csv", "jsonl")
+
+    @staticmethod
+    def file_format_of(path: str) -> str:
+        """
+        The format of a file from its name, csv or jsonl, ignoring a .gz suffix.
+        """
+        name = path[:-3] if path.endswith(".gz") else path
+        file_format = name.rsplit(".", 1)[-1].lower()
+        return "jsonl" if file_format == "json" else file_format
+
+    @staticmethod
+    def write(path: str,
+              chunks: Iterable[ExportChunk],
+              code_schemes: Sequence[CodeScheme],
+              file_format: Optional[str] = None) -> int:
+        """
+        Write the exported instruments to a file, gzipped if its name ends .gz.
+        Args:
+            path (str): The file to write, it is replaced atomically if it exists so readers never see a part export.
+            chunks (Iterable[ExportChunk]): The chunks of instruments to write.
+            code_schemes (Sequence[CodeScheme]): The schemes of the code values of the rows after the base.
+            file_format (str): Optional, csv or jsonl, from the file name if not given.
+        Returns:
+            int: The number of instruments written.
+        Raises:
+            ValueError: If the format is not known.
+        """
+        file_format = file_format or InstrMapExport.file_format_of(path)
+        if file_format not in InstrMapExport.FORMATS:
+            raise ValueError(f"file_format must be one of {InstrMapExport.FORMATS}: {file_format}")
+
+        tmp_path = f"{path}.tmp"
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(tmp_path, "wt", encoding="utf-8", newline="") as f:
+                written = InstrMapExport.dump(f, chunks, code_schemes, file_format)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        return written
+
+    @staticmethod
+    def dump(f: TextIO,
+             chunks: Iterable[ExportChunk],
+             code_schemes: Sequence[CodeScheme],
+             file_format: str) -> int:
+        """
+        Write the exported instruments to a text stream, see write.
+        """
+        if file_format not in InstrMapExport.FORMATS:
+            raise ValueError(f"file_format must be one of {InstrMapExport.FORMATS}: {file_format}")
+
+        written = 0
+        if file_format == "csv":
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow([str(CodeScheme.BASE)] + [str(scheme) for scheme in code_schemes])
+            for chunk in chunks:
+                # csv writes None as an empty field.
+                writer.writerows(chunk)
+                written += len(chunk)
+        else:
+            names = [str(CodeScheme.BASE)] + [str(scheme) for scheme in code_schemes]
+            for chunk in chunks:
+                lines = [json.dumps({name: value for name, value in zip(names, row) if value is not None})
+                         for row in chunk]
+                lines.append("")
+                f.write("\n".join(lines))
+                written += len(chunk)
+        return written
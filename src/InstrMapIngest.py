@@ -0,0 +1,454 @@
+import csv
+import gzip
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.CodeValidator import CodeValidator
+from src.AgentRole import AgentRole
+from exception.IncorrectPermissions import IncorrectPermissions
+
+_SCHEMES = {str(scheme).upper(): str(scheme) for scheme in CodeScheme}
+_SCHEME_BY_NAME = {str(scheme): scheme for scheme in CodeScheme}
+
+# A parsed row: (line number, instrument key or None, [(scheme, code value)], reject reason or None)
+Row = Tuple[int, Optional[str], List[Tuple[str, str]], Optional[str]]
+
+
+def _parse_fields(line_no: int,
+                  fields: Dict[str, object],
+                  key_column: str) -> Row:
+    """
+    Parse the fields of one row, either wide, a column per scheme, or long, a scheme column and a code column.
+    """
+    key = fields.get(key_column)
+    key = str(key) if key not in (None, "") else None
+    if "scheme" in fields and "code" in fields:
+        scheme = _SCHEMES.get(str(fields["scheme"]).upper())
+        if scheme is None:
+            return line_no, key, [], "unknown code scheme"
+        value = fields["code"]
+        if not isinstance(value, str) or not value:
+            return line_no, key, [], "code must be a non-empty string"
+        return line_no, key, [(scheme, value)], None
+
+    codes = []
+    for name, value in fields.items():
+        if name == key_column or value in (None, ""):
+            continue
+        scheme = _SCHEMES.get(name.upper())
+        if scheme is None:
+            continue
+        if not isinstance(value, str):
+            return line_no, key, [], "code must be a non-empty string"
+        codes.append((scheme, value))
+    return line_no, key, codes, None
+
+
+def _validate_rows(rows: List[Row]) -> List[Row]:
+    """
+    Reject the rows with a code that is not valid for its scheme, the values of each scheme checked in one bulk
+    CodeValidator call.
+    """
+    values = {}
+    for _, _, codes, _ in rows:
+        for scheme, value in codes:
+            values.setdefault(scheme, []).append(value)
+    invalid = {}
+    for scheme, scheme_values in values.items():
+        valid = CodeValidator.valid_mask(_SCHEME_BY_NAME[scheme], scheme_values)
+        invalid[scheme] = {value for value, ok in zip(scheme_values, valid) if not ok}
+    if not any(invalid.values()):
+        return rows
+    return [(line_no, key, codes, "invalid code")
+            if reject is None and any(value in invalid[scheme] for scheme, value in codes)
+            else (line_no, key, codes, reject)
+            for line_no, key, codes, reject in rows]
+
+
+def _parse_chunk(file_format: str,
+                 header: Optional[List[str]],
+                 key_column: str,
+                 validate: bool,
+                 first_line_no: int,
+                 lines: List[str]) -> List[Row]:
+    """
+    Parse a chunk of lines of a CSV or JSONL file, run in the ingest process or in a pool process.
+    """
+    rows = []
+    if file_format == "csv":
+        for line_no, values in enumerate(csv.reader(lines), first_line_no):
+            if not values:
+                continue
+            if len(values) != len(header):
+                rows.append((line_no, None, [], "wrong number of fields"))
+                continue
+            rows.append(_parse_fields(line_no, dict(zip(header, values)), key_column))
+    else:
+        for line_no, line in enumerate(lines, first_line_no):
+            if not line.strip():
+                continue
+            try:
+                fields = json.loads(line)
+            except ValueError:
+                rows.append((line_no, None, [], "invalid JSON"))
+                continue
+            if not isinstance(fields, dict):
+                rows.append((line_no, None, [], "line is not a JSON object"))
+                continue
+            rows.append(_parse_fields(line_no, fields, key_column))
+    return _validate_rows(rows) if validate else rows
+
+
+@dataclass
+class IngestReport:
+    """
+    What an ingest did, with the rejected records counted by reason and the first max_rejects of them kept.
+
+    Attributes:
+        rows (int): The rows read.
+        records (int): The instrument records the rows were grouped in to.
+        created (int): The instruments created.
+        updated (int): The existing instruments codes were added to.
+        unchanged (int): The records whose codes were all already in the map.
+        rejected (int): The records rejected.
+        reject_reasons (Dict[str, int]): The number of records rejected for each reason.
+        rejects (List[dict]): The first rejected records, {"line", "reason", "codes"}.
+    """
+    rows: int = 0
+    records: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    reject_reasons: Dict[str, int] = field(default_factory=dict)
+    rejects: List[dict] = field(default_factory=list)
+
+
+class InstrMapIngest:
+    """
+    Streams vendor mapping files in to an instrument map with memory bounded by the chunk and batch sizes,
+    whatever the size of the file.
+
+    Files are CSV with a header line, or JSONL of one object per line, optionally gzipped. Rows are either wide,
+    a column per code scheme (named as the scheme, e.g. SEDOL, ISIN, RIC), or long, a scheme column and a code
+    column. Adjacent rows with the same key column value are grouped in to one instrument record, rows without a
+    key are records of their own. A BASE column, as written by an export, names the instrument a record is of.
+
+    The file is read a chunk of lines at a time, chunks are parsed inline or, given processes, in a process pool
+    with a bounded number of chunks in flight, and the records applied to the map a batch at a time. A record
+    whose codes are all new creates an instrument, the new records of a batch in one load_instrs call. A record
+    with codes already in the map, or in an earlier record, adds its new codes to their instrument. Records are
+    rejected, and the rest of the batch still applied, if their codes belong to different instruments or conflict
+    with a code of the same scheme their instrument already has. Given validate, records with a code that is not
+    valid for its scheme, see CodeValidator, are rejected as their chunk is parsed, before they reach the map.
+
+    Methods:
+        ingest(path: str, file_format: str) -> IngestReport: Ingests a file.
+        ingest_lines(lines: Iterable[str], file_format: str) -> IngestReport: Ingests the lines of a file.
+    """
+    FORMATS = ("csv", "jsonl")
+
+    def __init__(self,
+                 instr_map: IInstrumentMap,
+                 agent: IAgent,
+                 batch_size: int = 10000,
+                 chunk_size: int = 10000,
+                 processes: int = 0,
+                 key_column: str = "key",
+                 max_rejects: int = 1000,
+                 validate: bool = False):
+        """
+        Args:
+            instr_map (IInstrumentMap): The map to ingest in to.
+            agent (Agent): The agent to make the changes as, which must be a maintainer.
+            batch_size (int): The number of records to apply to the map at a time.
+            chunk_size (int): The number of lines to read and parse at a time.
+            processes (int): The number of processes to parse chunks in, 0 to parse in this process.
+            key_column (str): The column of the vendor's instrument key rows are grouped by.
+            max_rejects (int): The number of rejected records to keep in the report.
+            validate (bool): If records with a code that is not valid for its scheme are rejected.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to maintain the map.
+        """
+        if instr_map is None or not isinstance(instr_map, IInstrumentMap):
+            raise ValueError(
+                f"instr_map must be an instance of IInstrumentMap and cannot be None: {instr_map}")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to ingest in to the map)")
+
+        for name, value, minimum in (("batch_size", batch_size, 1), ("chunk_size", chunk_size, 1),
+                                     ("processes", processes, 0), ("max_rejects", max_rejects, 0)):
+            if not isinstance(value, int) or value < minimum:
+                raise ValueError(f"{name} must be an integer of at least {minimum}: {value}")
+
+        self.instr_map = instr_map
+        self.agent = agent
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.key_column = key_column
+        self.max_rejects = max_rejects
+        self.validate = validate
+        return
+
+    def ingest(self,
+               path: str,
+               file_format: Optional[str] = None) -> IngestReport:
+        """
+        Ingest a CSV or JSONL file, gzipped if its name ends .gz.
+        Args:
+            path (str): The file to ingest.
+            file_format (str): Optional, csv or jsonl, from the file name if not given.
+        Returns:
+            IngestReport: What the ingest did.
+        Raises:
+            ValueError: If parameters are None or of the wrong type, or the format is not known.
+        """
+        if path is None or not isinstance(path, str):
+            raise ValueError(f"path must be a string and cannot be None: {path}")
+
+        name = path[:-3] if path.endswith(".gz") else path
+        if file_format is None:
+            file_format = name.rsplit(".", 1)[-1].lower()
+            file_format = "jsonl" if file_format == "json" else file_format
+
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", newline="") as f:
+            return self.ingest_lines(f, file_format)
+
+    def ingest_lines(self,
+                     lines: Iterable[str],
+                     file_format: str) -> IngestReport:
+        """
+        Ingest the lines of a CSV or JSONL file, read lazily.
+        Args:
+            lines (Iterable[str]): The lines, the header line first for CSV.
+            file_format (str): csv or jsonl.
+        Returns:
+            IngestReport: What the ingest did.
+        Raises:
+            ValueError: If parameters are None or of the wrong type, or the format is not known.
+        """
+        if file_format not in InstrMapIngest.FORMATS:
+            raise ValueError(f"file_format must be one of {InstrMapIngest.FORMATS}: {file_format}")
+
+        if lines is None or isinstance(lines, str):
+            raise ValueError(f"lines must be an iterable of lines and cannot be None: {lines}")
+
+        lines = iter(lines)
+        header = None
+        first_line_no = 1
+        if file_format == "csv":
+            header = next(csv.reader([next(lines, "")]), [])
+            first_line_no = 2
+
+        report = IngestReport()
+        batch = []
+        for record in self._records(self._rows(lines, file_format, header, first_line_no), report):
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._apply(batch, report)
+                batch = []
+        if batch:
+            self._apply(batch, report)
+        return report
+
+    def _chunks(self,
+                lines: Iterator[str],
+                first_line_no: int) -> Iterator[Tuple[int, List[str]]]:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= self.chunk_size:
+                yield first_line_no, chunk
+                first_line_no += len(chunk)
+                chunk = []
+        if chunk:
+            yield first_line_no, chunk
+
+    def _rows(self,
+              lines: Iterator[str],
+              file_format: str,
+              header: Optional[List[str]],
+              first_line_no: int) -> Iterator[Row]:
+        chunks = self._chunks(lines, first_line_no)
+        if not self.processes:
+            for chunk_line_no, chunk in chunks:
+                yield from _parse_chunk(file_format, header, self.key_column, self.validate, chunk_line_no, chunk)
+            return
+
+        # Keep a bounded number of chunks in flight, Executor.map would read the whole file ahead of the pool.
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            in_flight = deque()
+            for chunk_line_no, chunk in chunks:
+                in_flight.append(pool.submit(_parse_chunk, file_format, header, self.key_column, self.validate,
+                                             chunk_line_no, chunk))
+                if len(in_flight) >= 2 * self.processes:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _records(self,
+                 rows: Iterator[Row],
+                 report: IngestReport) -> Iterator[Tuple[int, List[ICode]]]:
+        """
+        Group adjacent rows of the same key in to the (first line number, codes) of each instrument record.
+        """
+        group_line_no, group_key, group_codes, group_reject = None, None, [], None
+        for line_no, key, codes, reject in rows:
+            report.rows += 1
+            if group_line_no is not None and (key is None or key != group_key):
+                yield from self._record(group_line_no, group_codes, group_reject, report)
+                group_line_no = None
+            if group_line_no is None:
+                group_line_no, group_key, group_codes, group_reject = line_no, key, [], None
+            group_codes.extend(codes)
+            group_reject = group_reject or reject
+        if group_line_no is not None:
+            yield from self._record(group_line_no, group_codes, group_reject, report)
+
+    def _record(self,
+                line_no: int,
+                codes: List[Tuple[str, str]],
+                reject: Optional[str],
+                report: IngestReport) -> Iterator[Tuple[int, List[ICode]]]:
+        report.records += 1
+        if reject is None:
+            schemes = {}
+            for scheme, value in codes:
+                if schemes.setdefault(scheme, value) != value:
+                    reject = "more than one code of a scheme"
+                    break
+            if not schemes:
+                reject = "no codes"
+        if reject is not None:
+            self._reject(report, line_no, reject, codes)
+            return
+        yield line_no, [Code._trusted(_SCHEME_BY_NAME[scheme], value) for scheme, value in schemes.items()]
+
+    def _reject(self,
+                report: IngestReport,
+                line_no: int,
+                reason: str,
+                codes: Iterable,
+                detail: Optional[str] = None) -> None:
+        # Reasons are a fixed few so the counts stay small whatever the file, the specifics are in the detail.
+        report.rejected += 1
+        report.reject_reasons[reason] = report.reject_reasons.get(reason, 0) + 1
+        if len(report.rejects) < self.max_rejects:
+            report.rejects.append({"line": line_no,
+                                   "reason": reason,
+                                   "detail": detail,
+                                   "codes": [c if isinstance(c, tuple) else (str(c.scheme), c.value) for c in codes]})
+
+    def _apply(self,
+               batch: List[Tuple[int, List[ICode]]],
+               report: IngestReport) -> None:
+        """
+        Apply the records of a batch as if they were applied in turn. Every code of the batch is resolved to its
+        instrument in one call, and the codes each record claims are staged, so a later record with a code of an
+        earlier one is resolved against the earlier record, whether that added codes to an instrument or is a new
+        instrument still to be created, without going back to the map.
+        """
+        bases = iter(self.instr_map.translate_codes([c for _, codes in batch for c in codes],
+                                                    CodeScheme.BASE, self.agent))
+        # (scheme, code value) -> the base code of its instrument, or the index of the new record it is in.
+        staged = {}
+        new_records = []
+        for line_no, codes in batch:
+            owners = []
+            for c in codes:
+                owner = staged.get((c.scheme, c.value))
+                if owner is None:
+                    owner = next(bases)
+                else:
+                    next(bases)
+                owners.append(owner)
+            record_owners = {owner for owner in owners if owner is not None}
+            if len(record_owners) > 1:
+                self._reject(report, line_no, "codes belong to different instruments", codes)
+                continue
+            if not record_owners and any(c.scheme == CodeScheme.BASE for c in codes):
+                self._reject(report, line_no, "base code does not exist", codes)
+                continue
+
+            if not record_owners:
+                for c in codes:
+                    staged[(c.scheme, c.value)] = len(new_records)
+                new_records.append((line_no, list(codes)))
+                continue
+            owner = record_owners.pop()
+            new_codes = [c for c, code_owner in zip(codes, owners) if code_owner is None]
+            if not new_codes:
+                report.unchanged += 1
+                continue
+            if isinstance(owner, int):
+                new_codes = self._add_to_new_record(new_records[owner], new_codes, line_no, codes, report)
+            else:
+                try:
+                    self.instr_map.add_instr_codes(owner, new_codes, self.agent)
+                except ValueError as e:
+                    self._reject(report, line_no, "conflicts with a code of its instrument", codes, str(e))
+                    new_codes = None
+            if new_codes is not None:
+                for c in new_codes:
+                    staged[(c.scheme, c.value)] = owner
+                report.updated += 1
+
+        if new_records:
+            self._create(new_records, report)
+
+    def _add_to_new_record(self,
+                           record: Tuple[int, List[ICode]],
+                           new_codes: List[ICode],
+                           line_no: int,
+                           codes: List[ICode],
+                           report: IngestReport) -> Optional[List[ICode]]:
+        """
+        Add the new codes of a record to a new record yet to be created, returning them, or None if rejected.
+        """
+        record_codes = record[1]
+        for c in new_codes:
+            for curr in record_codes:
+                if curr.scheme == c.scheme:
+                    self._reject(report, line_no, "conflicts with a code of its instrument", codes,
+                                 f"Cannot add code {c} as the instrument already has code {curr} of the same scheme")
+                    return None
+        record_codes.extend(new_codes)
+        return new_codes
+
+    def _create(self,
+                records: List[Tuple[int, List[ICode]]],
+                report: IngestReport) -> None:
+        load_instrs = getattr(self.instr_map, "load_instrs", None)
+        if load_instrs is not None:
+            try:
+                load_instrs([codes for _, codes in records], self.agent)
+                report.created += len(records)
+                return
+            except ValueError:
+                # The map rejected a record the checks above passed, load them one at a time to reject just it.
+                pass
+        for line_no, codes in records:
+            try:
+                if load_instrs is not None:
+                    load_instrs([codes], self.agent)
+                else:
+                    self.instr_map.add_instr_codes(self.instr_map.create_instr(self.agent), codes, self.agent)
+                report.created += 1
+            except ValueError as e:
+                self._reject(report, line_no, "rejected by the map", codes, str(e))
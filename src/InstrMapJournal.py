@@ -0,0 +1,315 @@
+import os
+import struct
+import time
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+from interface.ICode import ICode
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+
+
+class InstrMapJournal:
+    """
+    Append only write ahead journal of the changes made to an InstrumentMap, used with snapshots to make the
+    map durable without re-writing the whole map on every change.
+
+    The journal is a header followed by one framed record per change
+        frame: uint32 payload length, uint32 crc32 of payload
+        payload: op, agent id, base code value, count, then count * (scheme num, code value)
+    where strings are uint16 length prefixed utf-8. A record torn by a crash fails its crc and it, and anything
+    after it, is dropped when the journal is next opened.
+
+    A change is encoded before it is made, so a change that cannot be journaled is rejected with the map
+    unchanged, and its record is appended once it has been made.
+
+    Records are fsync'd in groups of batch_size, so with batching a crash can lose the records of the last
+    unsynced group but each change costs only an in memory append. With a max_delay the group is also synced by
+    the first append after its first record has waited max_delay seconds. There is no background flush, so
+    records appended before a pause in changes wait for the next append, sync or close.
+
+    Methods:
+        append(records: bytes, count: int) -> None: Appends encoded records.
+        sync() -> None: Writes and fsyncs all records appended so far.
+        truncate() -> None: Discards all records, called once they are held in a snapshot.
+        close() -> None: Syncs and closes the journal.
+    Static Methods:
+        encode_create(agent_id: str, base_value: str, codes: List[Code]) -> bytes: Encodes the creation of an instrument.
+        encode_add(agent_id: str, base_value: str, codes: List[Code]) -> bytes: Encodes codes added to an instrument.
+        encode_merge(agent_id: str, base_value: str, retired_value: str) -> bytes: Encodes the merge of two instruments.
+        encode_split(agent_id: str, base_value: str, new_base_value: str, codes: List[Code]) -> bytes: Encodes the split of an instrument.
+        records(path: str) -> Iterator[Tuple[int, str, str, List[Code]]]: Yields the valid records of a journal.
+    """
+    MAGIC = b"IMAPJRNL"
+    VERSION = 1
+    HEADER = struct.Struct("<8sI")  # magic, version
+    FRAME = struct.Struct("<II")  # payload length, crc32 of payload
+    CREATE = 1
+    ADD = 2
+    MERGE = 3
+    SPLIT = 4
+
+    def __init__(self,
+                 path: str,
+                 batch_size: int = 1,
+                 max_delay: Optional[float] = None):
+        """
+        Open a journal for appending, creating it if it does not exist.
+        Args:
+            path (str): The journal file.
+            batch_size (int): The number of records to group in to each fsync.
+            max_delay (float): Optional, the seconds after which a group is synced by the next append even if it
+                               holds fewer than batch_size records.
+        Raises:
+            ValueError: If parameters are None or of the wrong type, or the file is not a journal of this version.
+        """
+        if path is None or not isinstance(path, str):
+            raise ValueError(f"path must be a string and cannot be None: {path}")
+
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise ValueError(f"batch_size must be a positive integer: {batch_size}")
+
+        if max_delay is not None and (not isinstance(max_delay, (int, float)) or max_delay < 0):
+            raise ValueError(f"max_delay must be a non negative number of seconds: {max_delay}")
+
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._buffer = bytearray()
+        self._pending = 0
+        self._first_pending = 0.0
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as f:
+                f.write(InstrMapJournal.HEADER.pack(InstrMapJournal.MAGIC, InstrMapJournal.VERSION))
+                f.flush()
+                os.fsync(f.fileno())
+            valid_length = InstrMapJournal.HEADER.size
+        else:
+            valid_length = InstrMapJournal._valid_length(path)
+
+        self._file = open(path, "r+b")
+        self._file.truncate(valid_length)
+        self._file.seek(valid_length)
+        return
+
+    @staticmethod
+    def _put(payload: bytearray,
+             value: str) -> None:
+        data = value.encode("utf-8")
+        if len(data) > 0xFFFF:
+            raise ValueError(f"Cannot journal a value longer than {0xFFFF} bytes: {value[:32]}...")
+        payload += struct.pack("<H", len(data))
+        payload += data
+
+    @staticmethod
+    def _encode(op: int,
+                agent_id: str,
+                base_value: str,
+                codes: Iterable[ICode]) -> bytes:
+        """
+        The framed record of a change.
+        """
+        payload = bytearray((op,))
+        InstrMapJournal._put(payload, agent_id)
+        InstrMapJournal._put(payload, base_value)
+        codes = list(codes)
+        payload += struct.pack("<H", len(codes))
+        for c in codes:
+            payload.append(c.scheme.num)
+            InstrMapJournal._put(payload, c.value)
+        return InstrMapJournal.FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+    @staticmethod
+    def encode_create(agent_id: str,
+                      base_value: str,
+                      codes: Iterable[ICode] = ()) -> bytes:
+        """
+        Encode the record of the creation of an instrument and, optionally, the codes it was created with.
+        Args:
+            agent_id (str): The id of the agent that created the instrument.
+            base_value (str): The value of the new base code.
+            codes (Iterable[Code]): The codes the instrument was created with.
+        Returns:
+            bytes: The record, to append once the instrument is created.
+        Raises:
+            ValueError: If a value is too long to journal.
+        """
+        return InstrMapJournal._encode(InstrMapJournal.CREATE, agent_id, base_value, codes)
+
+    @staticmethod
+    def encode_add(agent_id: str,
+                   base_value: str,
+                   codes: Iterable[ICode]) -> bytes:
+        """
+        Encode the record of codes added to an existing instrument.
+        Args:
+            agent_id (str): The id of the agent that added the codes.
+            base_value (str): The value of the instrument's base code.
+            codes (Iterable[Code]): The codes added.
+        Returns:
+            bytes: The record, to append once the codes are added.
+        Raises:
+            ValueError: If a value is too long to journal.
+        """
+        return InstrMapJournal._encode(InstrMapJournal.ADD, agent_id, base_value, codes)
+
+    @staticmethod
+    def encode_merge(agent_id: str,
+                     base_value: str,
+                     retired_value: str) -> bytes:
+        """
+        Encode the record of the merge of an instrument in to another, as the retired base code.
+        Args:
+            agent_id (str): The id of the agent that merged the instruments.
+            base_value (str): The value of the surviving instrument's base code.
+            retired_value (str): The value of the retired instrument's base code.
+        Returns:
+            bytes: The record, to append once the instruments are merged.
+        Raises:
+            ValueError: If a value is too long to journal.
+        """
+        return InstrMapJournal._encode(InstrMapJournal.MERGE, agent_id, base_value,
+                                       [Code._trusted(CodeScheme.BASE, retired_value)])
+
+    @staticmethod
+    def encode_split(agent_id: str,
+                     base_value: str,
+                     new_base_value: str,
+                     codes: Iterable[ICode]) -> bytes:
+        """
+        Encode the record of the split of an instrument, as the new base code followed by the codes moved to it.
+        Args:
+            agent_id (str): The id of the agent that split the instrument.
+            base_value (str): The value of the split instrument's base code.
+            new_base_value (str): The value of the new instrument's base code.
+            codes (Iterable[Code]): The codes moved to the new instrument.
+        Returns:
+            bytes: The record, to append once the instrument is split.
+        Raises:
+            ValueError: If a value is too long to journal.
+        """
+        return InstrMapJournal._encode(InstrMapJournal.SPLIT, agent_id, base_value,
+                                       [Code._trusted(CodeScheme.BASE, new_base_value)] + list(codes))
+
+    def append(self,
+               records: bytes,
+               count: int = 1) -> None:
+        """
+        Append encoded records to the journal, syncing once batch_size records are pending or the first pending
+        record has waited max_delay.
+        Args:
+            records (bytes): One or more records from the encode methods, concatenated.
+            count (int): The number of records.
+        """
+        if not self._pending:
+            self._first_pending = time.monotonic()
+        self._buffer += records
+        self._pending += count
+        if self._pending >= self.batch_size or (
+                self.max_delay is not None and time.monotonic() - self._first_pending >= self.max_delay):
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Write all records appended so far to the journal file and fsync it.
+        """
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def truncate(self) -> None:
+        """
+        Discard every record in the journal, called once the changes they record are held in a snapshot.
+        """
+        self._buffer = bytearray()
+        self._pending = 0
+        self._file.truncate(InstrMapJournal.HEADER.size)
+        self._file.seek(InstrMapJournal.HEADER.size)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """
+        Sync any unwritten records and close the journal.
+        """
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _read(path: str) -> Iterator[Tuple[int, Tuple[int, str, str, List[ICode]]]]:
+        """
+        Yields (end position, record) for the header, with a record of None, and then for each valid record of
+        the journal, stopping at the first torn record.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < InstrMapJournal.HEADER.size:
+            raise ValueError(f"{path} is not an instrument map journal")
+        magic, version = InstrMapJournal.HEADER.unpack_from(data, 0)
+        if magic != InstrMapJournal.MAGIC:
+            raise ValueError(f"{path} is not an instrument map journal")
+        if version != InstrMapJournal.VERSION:
+            raise ValueError(
+                f"{path} is a version {version} journal but only version {InstrMapJournal.VERSION} is supported")
+
+        schemes = {scheme.num: scheme for scheme in CodeScheme}
+        pos = InstrMapJournal.HEADER.size
+        yield pos, None
+        while pos + InstrMapJournal.FRAME.size <= len(data):
+            length, crc = InstrMapJournal.FRAME.unpack_from(data, pos)
+            start = pos + InstrMapJournal.FRAME.size
+            payload = data[start:start + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                return
+
+            codes = []
+            p = 1
+
+            def get() -> str:
+                nonlocal p
+                (n,) = struct.unpack_from("<H", payload, p)
+                p += 2 + n
+                return str(payload[p - n:p], "utf-8")
+
+            agent_id = get()
+            base_value = get()
+            (count,) = struct.unpack_from("<H", payload, p)
+            p += 2
+            for _ in range(count):
+                scheme = schemes[payload[p]]
+                p += 1
+                codes.append(Code._trusted(scheme, get()))
+            pos = start + length
+            yield pos, (payload[0], agent_id, base_value, codes)
+
+    @staticmethod
+    def _valid_length(path: str) -> int:
+        valid_length = 0
+        for valid_length, _ in InstrMapJournal._read(path):
+            pass
+        return valid_length
+
+    @staticmethod
+    def records(path: str) -> Iterator[Tuple[int, str, str, List[ICode]]]:
+        """
+        Read back the records of a journal, stopping at the first torn or corrupt record.
+        Args:
+            path (str): The journal file.
+        Returns:
+            Iterator[Tuple[int, str, str, List[Code]]]: (op, agent id, base code value, codes) per record.
+        Raises:
+            ValueError: If the file is not a journal of this version.
+        """
+        for _, record in InstrMapJournal._read(path):
+            if record is not None:
+                yield record
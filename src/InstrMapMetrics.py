@@ -0,0 +1,139 @@
+import time
+from typing import Dict, List, Optional
+from src.LatencyHistogram import LatencyHistogram
+
+
+class _OperationStats:
+    """
+    The counts, errors and latencies of one operation.
+    """
+    __slots__ = ("count", "items", "errors", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.items = 0
+        self.errors: Dict[str, int] = {}
+        self.latency = LatencyHistogram()
+
+
+class InstrMapMetrics:
+    """
+    Per operation call counts, error counts by exception type and latency histograms of an instrument map, as
+    recorded by InstrumentedInstrumentMap.
+
+    Recording can be turned off and on with enabled, when off InstrumentedInstrumentMap calls straight through.
+    Memory is fixed per operation whatever the number of calls recorded.
+
+    Attributes:
+        enabled (bool): Whether calls are being recorded.
+    Methods:
+        record(op: str, latency_ns: int, items: int) -> None: Records a call of an operation.
+        record_error(op: str, e: Exception) -> None: Records an error raised by a call of an operation.
+        snapshot() -> dict: The statistics of every operation.
+        to_prometheus(prefix: str) -> str: The statistics of every operation in the Prometheus text format.
+        reset() -> None: Discards everything recorded.
+    """
+    PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+    def __init__(self,
+                 enabled: bool = True):
+        """
+        Args:
+            enabled (bool): Whether to record calls from the start.
+        """
+        self.enabled = enabled
+        self._ops: Dict[str, _OperationStats] = {}
+        self._started = time.monotonic()
+        return
+
+    def _stats(self,
+               op: str) -> _OperationStats:
+        stats = self._ops.get(op)
+        if stats is None:
+            stats = self._ops.setdefault(op, _OperationStats())
+        return stats
+
+    def record(self,
+               op: str,
+               latency_ns: int,
+               items: int = 1) -> None:
+        """
+        Record a call of an operation, whether it succeeded or not.
+        Args:
+            op (str): The name of the operation.
+            latency_ns (int): How long the call took in ns.
+            items (int): The number of items the call handled, e.g. the codes in a batch translation.
+        """
+        stats = self._stats(op)
+        stats.count += 1
+        stats.items += items
+        stats.latency.record(latency_ns)
+
+    def record_error(self,
+                     op: str,
+                     e: Exception) -> None:
+        """
+        Record an error raised by a call of an operation, the call itself is recorded by record.
+        """
+        errors = self._stats(op).errors
+        name = type(e).__name__
+        errors[name] = errors.get(name, 0) + 1
+
+    def snapshot(self) -> dict:
+        """
+        The statistics of every operation called since the metrics were created or reset.
+        Returns:
+            dict: {"elapsed_s": seconds recorded over,
+                   "operations": {op: {"count", "items", "rate_per_s", "errors": {exception name: count},
+                                       "mean_ns", "min_ns", "max_ns", "p50_ns", "p90_ns", "p99_ns", "p99.9_ns"}}}
+        """
+        elapsed = time.monotonic() - self._started
+        operations = {}
+        for op, stats in list(self._ops.items()):
+            latency = stats.latency
+            op_snapshot = {"count": stats.count,
+                           "items": stats.items,
+                           "rate_per_s": stats.count / elapsed if elapsed > 0 else 0.0,
+                           "errors": dict(stats.errors),
+                           "mean_ns": latency.mean(),
+                           "min_ns": latency.min,
+                           "max_ns": latency.max}
+            for p in InstrMapMetrics.PERCENTILES:
+                op_snapshot[f"p{p:g}_ns"] = latency.percentile(p)
+            operations[op] = op_snapshot
+        return {"elapsed_s": elapsed, "operations": operations}
+
+    def to_prometheus(self,
+                      prefix: str = "instr_map") -> str:
+        """
+        The statistics of every operation in the Prometheus text exposition format, latencies as a summary in
+        seconds with its quantiles, calls and errors as counters.
+        Args:
+            prefix (str): The prefix of the metric names.
+        """
+        snapshot = self.snapshot()["operations"]
+        lines: List[str] = [f"# TYPE {prefix}_latency_seconds summary"]
+        for op, stats in snapshot.items():
+            for p in InstrMapMetrics.PERCENTILES:
+                value = stats[f"p{p:g}_ns"]
+                lines.append(f'{prefix}_latency_seconds{{op="{op}",quantile="{p / 100:g}"}} '
+                             f'{InstrMapMetrics._seconds(value)}')
+            latency = self._ops[op].latency
+            lines.append(f'{prefix}_latency_seconds_sum{{op="{op}"}} {latency.total / 1e9:g}')
+            lines.append(f'{prefix}_latency_seconds_count{{op="{op}"}} {latency.count}')
+        lines.append(f"# TYPE {prefix}_items_total counter")
+        for op, stats in snapshot.items():
+            lines.append(f'{prefix}_items_total{{op="{op}"}} {stats["items"]}')
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for op, stats in snapshot.items():
+            for error, count in stats["errors"].items():
+                lines.append(f'{prefix}_errors_total{{op="{op}",error="{error}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _seconds(value_ns: Optional[int]) -> str:
+        return "NaN" if value_ns is None else f"{value_ns / 1e9:g}"
+
+    def reset(self) -> None:
+        self._ops = {}
+        self._started = time.monotonic()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import struct
+from typing import List, Optional
+from interface.ICode import ICode
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class InstrMapProtocol:
+    """
+    The wire protocol between InstrMapServer and InstrMapClient.
+
+    Each message is a frame of a uint32 big endian payload length followed by a utf-8 JSON payload. A request
+    frame is a JSON list of requests and the response frame is the JSON list of their responses in the same
+    order, so a client can coalesce many small calls in to one round trip. A connection can carry several
+    request frames in flight and the server answers them in order.
+
+    request: {"op": name, "agent": agent id, ...op arguments}
+    response: {"result": ...} or {"error": exception name, "message": str}
+    code: [scheme, value]
+
+    Static Methods:
+        read_frame(reader: StreamReader) -> object: Reads and decodes one frame.
+        write_frame(writer: StreamWriter, message: object) -> None: Encodes and writes one frame.
+        encode_code(code: Code) -> list: Encodes a code.
+        decode_code(code: list) -> Code: Decodes a code.
+        decode_scheme(scheme: str) -> CodeScheme: Decodes a code scheme.
+        encode_codes(codes: List[Code]) -> list: Encodes a list of codes, any of which may be None.
+        decode_codes(codes: list) -> List[Code]: Decodes a list of codes, any of which may be None.
+        encode_error(e: Exception) -> dict: Encodes an exception as an error response.
+        decode_error(response: dict) -> Exception: Decodes an error response as an exception.
+    """
+    FRAME = struct.Struct(">I")
+    MAX_FRAME_SIZE = 64 * 1024 * 1024
+    ERRORS = {
+        "CodeDoesNotExist": CodeDoesNotExist,
+        "OnlyBaseCodeDefined": OnlyBaseCodeDefined,
+        "IncorrectPermissions": IncorrectPermissions,
+        "ValueError": ValueError,
+    }
+    _SCHEMES = {str(scheme): scheme for scheme in CodeScheme}
+
+    @staticmethod
+    async def read_frame(reader: asyncio.StreamReader) -> object:
+        """
+        Read one frame, raises asyncio.IncompleteReadError if the connection is closed.
+        """
+        (length,) = InstrMapProtocol.FRAME.unpack(await reader.readexactly(InstrMapProtocol.FRAME.size))
+        if length > InstrMapProtocol.MAX_FRAME_SIZE:
+            raise ValueError(
+                f"Frame of {length} bytes exceeds the maximum of {InstrMapProtocol.MAX_FRAME_SIZE}")
+        return json.loads(await reader.readexactly(length))
+
+    @staticmethod
+    def write_frame(writer: asyncio.StreamWriter,
+                    message: object) -> None:
+        """
+        Write one frame, the caller is responsible for draining the writer.
+        """
+        payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        writer.write(InstrMapProtocol.FRAME.pack(len(payload)) + payload)
+
+    @staticmethod
+    def encode_code(code: Optional[ICode]) -> Optional[list]:
+        return [str(code.scheme), code.value] if code is not None else None
+
+    @staticmethod
+    def decode_code(code: Optional[list]) -> Optional[ICode]:
+        if code is None:
+            return None
+        if not isinstance(code, list) or len(code) != 2 or code[0] not in InstrMapProtocol._SCHEMES:
+            raise ValueError(f"Invalid code: {code}")
+        return Code(InstrMapProtocol._SCHEMES[code[0]], code[1])
+
+    @staticmethod
+    def decode_scheme(scheme: Optional[str]) -> Optional[CodeScheme]:
+        if scheme is None:
+            return None
+        if scheme not in InstrMapProtocol._SCHEMES:
+            raise ValueError(f"Invalid code scheme: {scheme}")
+        return InstrMapProtocol._SCHEMES[scheme]
+
+    @staticmethod
+    def encode_codes(codes: List[Optional[ICode]]) -> List[Optional[list]]:
+        return [InstrMapProtocol.encode_code(c) for c in codes]
+
+    @staticmethod
+    def decode_codes(codes: List[Optional[list]]) -> List[Optional[ICode]]:
+        if not isinstance(codes, list):
+            raise ValueError(f"Invalid list of codes: {codes}")
+        return [InstrMapProtocol.decode_code(c) for c in codes]
+
+    @staticmethod
+    def encode_error(e: Exception) -> dict:
+        name = type(e).__name__
+        if name not in InstrMapProtocol.ERRORS:
+            name = "RuntimeError"
+        return {"error": name, "message": getattr(e, "message", str(e))}
+
+    @staticmethod
+    def decode_error(response: dict) -> Exception:
+        return InstrMapProtocol.ERRORS.get(response["error"], RuntimeError)(response["message"])
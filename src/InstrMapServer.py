@@ -0,0 +1,166 @@
+import asyncio
+from typing import Iterable, Optional
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.InstrMapProtocol import InstrMapProtocol
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class InstrMapServer:
+    """
+    An asyncio TCP server giving remote read access to an instrument map, see InstrMapProtocol for the wire format.
+
+    Requests name the id of the agent making them, which must be one of the agents the server was given, and are
+    served with that agent's permissions. Each request frame is answered in full before the next frame on the
+    same connection is read, the map itself is called synchronously on the event loop.
+
+    The get_instr_code_of_type requests a client coalesces in to a frame are served with one translate_codes
+    call per agent, source and target scheme, only the misses are re-run individually to report their error.
+
+    Methods:
+        start() -> None: Starts listening, port is then the port listened on.
+        stop() -> None: Stops listening and closes all connections.
+    """
+
+    def __init__(self,
+                 instr_map: IInstrumentMap,
+                 agents: Iterable[IAgent],
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        """
+        Args:
+            instr_map (IInstrumentMap): The map to serve.
+            agents (Iterable[Agent]): The agents that may make requests.
+            host (str): The host to listen on, localhost by default.
+            port (int): The port to listen on, 0 to listen on any free port.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+        """
+        if instr_map is None or not isinstance(instr_map, IInstrumentMap):
+            raise ValueError(
+                f"instr_map must be an instance of IInstrumentMap and cannot be None: {instr_map}")
+
+        if agents is None:
+            raise ValueError("agents cannot be None")
+
+        self._agents = {}
+        for agent in agents:
+            if not isinstance(agent, IAgent):
+                raise ValueError(f"agents must all be instances of Agent, but got {type(agent)}")
+            self._agents[agent.id()] = agent
+
+        self.instr_map = instr_map
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = set()
+        self._handlers = set()
+        return
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Closing a connection ends its handler's read with an IncompleteReadError, so the handlers finish cleanly.
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    async def _serve(self,
+                     reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                requests = await InstrMapProtocol.read_frame(reader)
+                if not isinstance(requests, list):
+                    break
+                InstrMapProtocol.write_frame(writer, self._handle_frame(requests))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def _handle_frame(self,
+                      requests: list) -> list:
+        responses = [None] * len(requests)
+        translations = {}
+        for i, request in enumerate(requests):
+            if isinstance(request, dict) and request.get("op") == "get_instr_code_of_type":
+                code = request.get("code")
+                if isinstance(code, list) and len(code) == 2 and isinstance(code[1], str):
+                    key = (request.get("agent"), code[0], request.get("scheme"))
+                    translations.setdefault(key, []).append(i)
+                    continue
+            responses[i] = self._handle(request)
+
+        for (agent_id, source_scheme, code_scheme), indexes in translations.items():
+            translated = [None] * len(indexes)
+            agent = self._agents.get(agent_id)
+            if agent is not None and len(indexes) > 1:
+                try:
+                    translated = self.instr_map.translate_codes([requests[i]["code"][1] for i in indexes],
+                                                                InstrMapProtocol.decode_scheme(code_scheme),
+                                                                agent,
+                                                                InstrMapProtocol.decode_scheme(source_scheme))
+                except Exception:
+                    pass
+            for i, code in zip(indexes, translated):
+                if code is not None:
+                    responses[i] = {"result": InstrMapProtocol.encode_code(code)}
+                else:
+                    responses[i] = self._handle(requests[i])
+        return responses
+
+    def _handle(self,
+                request: dict) -> dict:
+        try:
+            if not isinstance(request, dict):
+                raise ValueError(f"request must be an object: {request}")
+            agent = self._agents.get(request.get("agent"))
+            if agent is None:
+                raise IncorrectPermissions(f"Agent {request.get('agent')} is not known to the server")
+
+            op = request.get("op")
+            if op == "get_instr_codes":
+                codes = self.instr_map.get_instr_codes(
+                    InstrMapProtocol.decode_code(request.get("code")), agent)
+                return {"result": InstrMapProtocol.encode_codes(codes)}
+
+            if op == "get_instr_code_of_type":
+                code = self.instr_map.get_instr_code_of_type(
+                    InstrMapProtocol.decode_code(request.get("code")),
+                    InstrMapProtocol.decode_scheme(request.get("scheme")),
+                    agent)
+                return {"result": InstrMapProtocol.encode_code(code)}
+
+            if op == "translate_codes":
+                source_scheme = InstrMapProtocol.decode_scheme(request.get("source_scheme"))
+                codes = request.get("codes")
+                if source_scheme is None:
+                    codes = InstrMapProtocol.decode_codes(codes)
+                elif not isinstance(codes, list):
+                    raise ValueError(f"Invalid list of code values: {codes}")
+                translated = self.instr_map.translate_codes(
+                    codes, InstrMapProtocol.decode_scheme(request.get("scheme")), agent, source_scheme)
+                return {"result": InstrMapProtocol.encode_codes(translated)}
+
+            raise ValueError(f"Unknown op: {op}")
+        except Exception as e:
+            return InstrMapProtocol.encode_error(e)
@@ -0,0 +1,217 @@
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from src.CodeScheme import CodeScheme
+from exception.CodeDoesNotExist import CodeDoesNotExist
+
+if TYPE_CHECKING:
+    from src.InstrMap import InstrumentMap
+
+
+class InstrMapReaderSession:
+    """
+    A reader's view of an InstrumentMap, created by InstrumentMap.session once the agent's permissions have been
+    checked. Its methods are those of the map without the agent argument and skip the per call agent checks, the
+    arguments are still validated.
+
+    Agents are immutable so the permissions checked when the session was created hold for its lifetime.
+
+    Attributes:
+        agent (Agent): The agent the session was created for.
+    Methods:
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        get_retired_codes(code: Code) -> List[Code]: The base codes retired by merges in to an instrument.
+        find_codes(code_scheme: CodeScheme, prefix: str, start: str, stop: str, pattern: str) -> Iterator[Tuple[Code, Code]]: Searches the codes of a scheme.
+        export_instrs(code_schemes: Sequence[CodeScheme], chunk_size: int) -> Iterator[List[Tuple[Code, Dict[CodeScheme, Code]]]]: Iterates over every instrument and its codes in chunks.
+    """
+
+    def __init__(self,
+                 instr_map: 'InstrumentMap',
+                 agent: IAgent):
+        """
+        Args:
+            instr_map (InstrumentMap): The map to view.
+            agent (Agent): The agent, already checked to be a reader of the map.
+        """
+        self._map = instr_map
+        self.agent = agent
+        return
+
+    def get_instr_codes(self,
+                        code: ICode) -> List[ICode]:
+        """
+        As InstrumentMap.get_instr_codes, with the agent of the session.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None but got type {type(code)}")
+
+        return self._map._instr_codes_of(self._map._find_instr(code))
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme) -> ICode:
+        """
+        As InstrumentMap.get_instr_code_of_type, with the agent of the session.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                "code must be an instance of Code and cannot be None")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        return self._map._instr_code_of_type(code, self._map._find_instr(code), code_scheme)
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        As InstrumentMap.translate_codes, with the agent of the session.
+        """
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        if source_scheme is not None and not isinstance(source_scheme, CodeScheme):
+            raise ValueError(
+                "source code sheme must be an instance of CodeScheme")
+
+        return self._map._translate_codes(codes, code_scheme, source_scheme)
+
+    def get_retired_codes(self,
+                          code: ICode) -> List[ICode]:
+        """
+        As InstrumentMap.get_retired_codes, with the agent of the session.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        return self._map._retired_codes_of(self._map._find_instr(code))
+
+    def find_codes(self,
+                   code_scheme: CodeScheme,
+                   prefix: Optional[str] = None,
+                   start: Optional[str] = None,
+                   stop: Optional[str] = None,
+                   pattern: Optional[str] = None) -> Iterator[Tuple[ICode, ICode]]:
+        """
+        As InstrumentMap.find_codes, with the agent of the session.
+        """
+        self._map._check_find_args(code_scheme, prefix, start, stop, pattern)
+        return self._map._find_codes(code_scheme, prefix, start, stop, pattern)
+
+    def export_instrs(self,
+                      code_schemes: Optional[Sequence[CodeScheme]] = None,
+                      chunk_size: int = 10000) -> Iterator[List[Tuple[ICode, Dict[CodeScheme, ICode]]]]:
+        """
+        As InstrumentMap.export_instrs, with the agent of the session.
+        """
+        code_schemes = self._map._export_schemes(code_schemes, chunk_size)
+        return self._map._export_instrs(code_schemes, chunk_size, filtered=len(code_schemes) < len(CodeScheme) - 1)
+
+
+class InstrMapMaintainerSession(InstrMapReaderSession):
+    """
+    A maintainer's view of an InstrumentMap, a reader session that can also change the map. Changes are journaled
+    against the agent of the session.
+
+    Methods:
+        create_instr() -> Code: Creates a new base instrument code and adds it to the map.
+        create_instrs(n: int) -> List[Code]: Creates n new base instrument codes in one call.
+        add_instr_codes(code: Code, codes: List[Code]) -> None: Adds related codes to an existing base code.
+        load_instrs(records: Iterable[Iterable[Code]]) -> List[Code]: Creates many instruments and their codes all or nothing.
+        merge_instr(code: Code, retired_code: Code) -> Code: Merges two instruments, redirecting the retired base code.
+        split_instr(code: Code, codes: List[Code]) -> Code: Moves some of an instrument's codes to a new instrument.
+    """
+
+    def create_instr(self) -> ICode:
+        """
+        As InstrumentMap.create_instr, with the agent of the session.
+        """
+        return self._map._create_instr(self.agent.id())
+
+    def create_instrs(self,
+                      n: int) -> List[ICode]:
+        """
+        As InstrumentMap.create_instrs, with the agent of the session.
+        """
+        if not isinstance(n, int) or isinstance(n, bool) or n < 0:
+            raise ValueError(f"n must be a non negative integer: {n}")
+
+        return self._map._create_instrs(n, self.agent.id())
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode]) -> None:
+        """
+        As InstrumentMap.add_instr_codes, with the agent of the session.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        instr_id = self._map.instr_map[str(code.scheme)].get(code.value)
+        if instr_id is None:
+            raise CodeDoesNotExist(
+                f"Cannot add codes for a Code that does not exist in the map: {code}")
+
+        if codes is None or not isinstance(codes, List) or not all(isinstance(c, ICode) for c in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
+
+        self._map._add_instr_codes(instr_id, codes, self.agent.id())
+
+    def load_instrs(self,
+                    records: Iterable[Iterable[ICode]]) -> List[ICode]:
+        """
+        As InstrumentMap.load_instrs, with the agent of the session.
+        """
+        if records is None:
+            raise ValueError("records cannot be None")
+
+        return self._map._load_instrs(records, self.agent.id())
+
+    def merge_instr(self,
+                    code: ICode,
+                    retired_code: ICode) -> ICode:
+        """
+        As InstrumentMap.merge_instr, with the agent of the session.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        if retired_code is None or not isinstance(retired_code, ICode):
+            raise ValueError(
+                f"retired_code must be an instance of Code and cannot be None: {retired_code}")
+
+        return self._map._merge_codes(code, retired_code, self._map._find_instr(code),
+                                      self._map._find_instr(retired_code), self.agent.id())
+
+    def split_instr(self,
+                    code: ICode,
+                    codes: List[ICode]) -> ICode:
+        """
+        As InstrumentMap.split_instr, with the agent of the session.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        instr_id = self._map._find_instr(code)
+
+        if codes is None or not isinstance(codes, List) or not all(isinstance(c, ICode) for c in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
+
+        return self._map._split_codes(code, instr_id, codes, self.agent.id())
@@ -0,0 +1,433 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+from exception.MapIsReadOnly import MapIsReadOnly
+
+
+class InstrMapSnapshot:
+    """
+    Reads and writes the compact binary snapshot format of an instrument map.
+
+    Every instrument is given a dense instrument number and for each code scheme the snapshot holds
+        offsets: uint32[n+1], the code value of instrument i is data[offsets[i]:offsets[i+1]], empty if it has none.
+        data: the utf-8 code values of all instruments concatenated, the string table for the scheme.
+        table: uint32[power of 2], open addressing hash table (crc32, linear probing) of instrument number + 1
+               keyed on code value, 0 marks an empty slot.
+    followed by the redirects of the instruments retired by a merge
+        redirects: uint32[n], the surviving instrument number + 1 of instrument i, 0 if it is not retired. A retired
+                   instrument holds only its base code, so the retired base code value resolves to the survivor.
+    preceded by a header and a directory of where each scheme's sections start. The integer arrays are in
+    native byte order and are read in place from a memory map, so opening a snapshot does not depend on the
+    size of the map and processes opening the same file share its pages through the OS cache.
+
+    Static Methods:
+        write(path: str, instr_codes: dict, redirects: dict) -> None: Writes a snapshot of the given instrument codes to a file.
+        dump(f: BinaryIO, instr_codes: dict, redirects: dict) -> None: Writes a snapshot of the given instrument codes to a binary stream.
+    """
+    MAGIC = b"INSTRMAP"
+    VERSION = 2
+    # magic, version, little endian, num schemes, reserved, num instruments, redirects pos
+    HEADER = struct.Struct("<8sIIIIQQ")
+    DIRECTORY_ENTRY = struct.Struct("<IIQQQQ")  # scheme num, reserved, offsets pos, data pos, table pos, table size
+
+    @staticmethod
+    def _pad(f: BinaryIO,
+             start_pos: int) -> int:
+        """
+        Pad the stream to 8 byte alignment, returning the position padded to relative to the start of the snapshot.
+        """
+        pos = f.tell() - start_pos
+        if pos % 8:
+            f.write(b"\0" * (8 - pos % 8))
+        return f.tell() - start_pos
+
+    @staticmethod
+    def write(path: str,
+              instr_codes: dict,
+              redirects: Optional[Dict[int, int]] = None) -> None:
+        """
+        Write a snapshot of the instruments held in the given instrument codes.
+        Args:
+            path (str): The file to write the snapshot to, it is replaced atomically if it exists so processes
+                        with the old snapshot open keep a consistent view.
+            instr_codes (dict): scheme -> [code value or None] by instrument id as held by InstrumentMap, the
+                                instrument numbers of the snapshot are the instrument ids.
+            redirects (dict): Optional, retired instrument id -> surviving instrument id of the instruments retired
+                              by a merge.
+        Raises:
+            ValueError: If the code values of one scheme do not fit in a 4GB string table.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            InstrMapSnapshot.dump(f, instr_codes, redirects)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def dump(f: BinaryIO,
+             instr_codes: dict,
+             redirects: Optional[Dict[int, int]] = None) -> None:
+        """
+        Write a snapshot of the instruments held in the given instrument codes to a binary stream.
+        Args:
+            f (BinaryIO): The seekable binary stream to write the snapshot to, from its current position.
+            instr_codes (dict): scheme -> [code value or None] by instrument id as held by InstrumentMap, the
+                                instrument numbers of the snapshot are the instrument ids.
+            redirects (dict): Optional, retired instrument id -> surviving instrument id of the instruments retired
+                              by a merge.
+        Raises:
+            ValueError: If the code values of one scheme do not fit in a 4GB string table.
+        """
+        schemes = list(CodeScheme)
+        num_instr = len(instr_codes[str(CodeScheme.BASE)])
+
+        start_pos = f.tell()
+        f.write(b"\0" * InstrMapSnapshot.HEADER.size)
+        directory_pos = f.tell()
+        f.write(b"\0" * InstrMapSnapshot.DIRECTORY_ENTRY.size * len(schemes))
+
+        directory = []
+        for scheme in schemes:
+            scheme_codes = instr_codes[str(scheme)]
+            offsets = array("I", bytes(4 * (num_instr + 1)))
+            data = bytearray()
+            table_size = 2
+            while table_size < 2 * (num_instr - scheme_codes.count(None)):
+                table_size *= 2
+            mask = table_size - 1
+            table = array("I", bytes(4 * table_size))
+            for i, value in enumerate(scheme_codes):
+                if value is not None:
+                    key = value.encode("utf-8")
+                    slot = zlib.crc32(key) & mask
+                    while table[slot]:
+                        slot = (slot + 1) & mask
+                    table[slot] = i + 1
+                    data += key
+                    if len(data) > 0xFFFFFFFF:
+                        raise ValueError(
+                            f"Code values of scheme {scheme} are too large for a snapshot string table")
+                offsets[i + 1] = len(data)
+
+            offsets_pos = InstrMapSnapshot._pad(f, start_pos)
+            offsets.tofile(f)
+            data_pos = InstrMapSnapshot._pad(f, start_pos)
+            f.write(data)
+            table_pos = InstrMapSnapshot._pad(f, start_pos)
+            table.tofile(f)
+            directory.append(InstrMapSnapshot.DIRECTORY_ENTRY.pack(
+                scheme.num, 0, offsets_pos, data_pos, table_pos, table_size))
+
+        survivors = array("I", bytes(4 * num_instr))
+        for retired_id, instr_id in (redirects or {}).items():
+            survivors[retired_id] = instr_id + 1
+        redirects_pos = InstrMapSnapshot._pad(f, start_pos)
+        survivors.tofile(f)
+
+        end_pos = f.tell()
+        f.seek(start_pos)
+        f.write(InstrMapSnapshot.HEADER.pack(InstrMapSnapshot.MAGIC,
+                                             InstrMapSnapshot.VERSION,
+                                             1 if sys.byteorder == "little" else 0,
+                                             len(schemes),
+                                             0,
+                                             num_instr,
+                                             redirects_pos))
+        f.write(b"".join(directory))
+        f.seek(end_pos)
+
+
+class SnapshotInstrumentMap(IInstrumentMap):
+    """
+    A read only instrument map served directly from a memory mapped snapshot written by InstrMapSnapshot, or from a
+    snapshot held in any other buffer such as shared memory.
+
+    Lookups probe the snapshot's hash tables in place, so no per instrument state is built when it is opened.
+    A base code retired by a merge resolves to the instrument it was merged in to.
+    The map should be closed, or used as a context manager, to release the memory map.
+
+    Methods:
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        instruments() -> Iterator[Tuple[str, ...]]: Yields the code values of every instrument.
+        redirects() -> Iterator[Tuple[int, int]]: Yields the surviving instrument number of every retired instrument.
+        close() -> None: Releases the memory map.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 buffer=None):
+        """
+        Open a snapshot from a file or a buffer, exactly one of which must be given.
+        Args:
+            path (str): The snapshot file to open.
+            buffer (buffer): A buffer holding a snapshot, it must stay open until the map is closed.
+        Raises:
+            ValueError: If the file is not a snapshot, or is a snapshot of another version or byte order.
+        """
+        super().__init__()
+        if (path is None) == (buffer is None):
+            raise ValueError("Exactly one of path or buffer must be given")
+        self._mmap = None
+        self._buffer = None
+        self._sections = {}
+        self._redirects = None
+        if path is None:
+            path = "buffer"
+        try:
+            if buffer is None:
+                with open(path, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                buffer = self._mmap
+            self._buffer = memoryview(buffer)
+            magic, version, little_endian, num_schemes, _, self.num_instr, redirects_pos = \
+                InstrMapSnapshot.HEADER.unpack_from(self._buffer, 0)
+        except (ValueError, struct.error):
+            self.close()
+            raise ValueError(f"{path} is not an instrument map snapshot")
+        if magic != InstrMapSnapshot.MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an instrument map snapshot")
+        if version != InstrMapSnapshot.VERSION:
+            self.close()
+            raise ValueError(
+                f"{path} is a version {version} snapshot but only version {InstrMapSnapshot.VERSION} is supported")
+        if bool(little_endian) != (sys.byteorder == "little"):
+            self.close()
+            raise ValueError(f"{path} was written on a platform of different byte order")
+
+        for s in range(num_schemes):
+            scheme_num, _, offsets_pos, data_pos, table_pos, table_size = InstrMapSnapshot.DIRECTORY_ENTRY.unpack_from(
+                self._buffer, InstrMapSnapshot.HEADER.size + s * InstrMapSnapshot.DIRECTORY_ENTRY.size)
+            offsets = self._buffer[offsets_pos:offsets_pos + 4 * (self.num_instr + 1)].cast("I")
+            data = self._buffer[data_pos:data_pos + offsets[self.num_instr]]
+            table = self._buffer[table_pos:table_pos + 4 * table_size].cast("I")
+            self._sections[scheme_num] = (offsets, data, table, table_size - 1)
+        self._redirects = self._buffer[redirects_pos:redirects_pos + 4 * self.num_instr].cast("I")
+        return
+
+    def close(self) -> None:
+        """
+        Release the memory map, or the views of the buffer given, the map cannot be used once closed.
+        """
+        for section in self._sections.values():
+            for view in section[:3]:
+                view.release()
+        self._sections = {}
+        if self._redirects is not None:
+            self._redirects.release()
+            self._redirects = None
+        if self._buffer is not None:
+            self._buffer.release()
+            self._buffer = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def instruments(self) -> Iterator[Tuple[str, ...]]:
+        """
+        Iterate over every instrument in the snapshot, including those retired by a merge, which hold only their
+        base code.
+        Returns:
+            Iterator[Tuple[str, ...]]: Per instrument a tuple of its code value, or None, for each scheme in CodeScheme order.
+        """
+        sections = [self._sections[scheme.num] for scheme in CodeScheme]
+        for i in range(self.num_instr):
+            yield tuple(self._value(section, i) for section in sections)
+
+    def redirects(self) -> Iterator[Tuple[int, int]]:
+        """
+        Iterate over the instruments retired by a merge.
+        Returns:
+            Iterator[Tuple[int, int]]: Per retired instrument its instrument number and that of the instrument it
+                                       was merged in to.
+        """
+        for i, survivor in enumerate(self._redirects):
+            if survivor:
+                yield i, survivor - 1
+
+    @staticmethod
+    def _value(section: tuple,
+               i: int) -> Optional[str]:
+        offsets, data, _, _ = section
+        start, end = offsets[i], offsets[i + 1]
+        if start == end:
+            return None
+        return str(data[start:end], "utf-8")
+
+    def _find(self,
+              section: tuple,
+              value: str) -> int:
+        """
+        The instrument number with the given code value in the given scheme section, or -1 if there is none. A
+        base code retired by a merge gives the number of the instrument it was merged in to.
+        """
+        offsets, data, table, mask = section
+        key = value.encode("utf-8")
+        slot = zlib.crc32(key) & mask
+        while True:
+            entry = table[slot]
+            if entry == 0:
+                return -1
+            if data[offsets[entry - 1]:offsets[entry]] == key:
+                survivor = self._redirects[entry - 1]
+                return survivor - 1 if survivor else entry - 1
+            slot = (slot + 1) & mask
+
+    def create_instr(self,
+                     agent: IAgent) -> ICode:
+        raise MapIsReadOnly("Cannot create an instrument in a snapshot")
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode],
+                        agent: IAgent) -> None:
+        raise MapIsReadOnly("Cannot add codes to a snapshot")
+
+    def _check_reader(self,
+                      agent: IAgent) -> None:
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to read the map)")
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent) -> List[ICode]:
+        """
+        Retrieve all code schemes values that map to the given code
+        Args:
+            code (Code): The code for which to find all equivalent codes.
+            agent (Agent): The agent requesting the get of the alternate codes.
+        Returns:
+            List[Code]: A list of codes that map to the same base code as the given code.
+        Raises:
+            ValueError: If the provided parameters are None or not an instance of required type.
+            CodeDoesNotExist: If the provided code does not exist in the map.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None but got type {type(code)}")
+
+        i = self._find(self._sections[code.scheme.num], code.value)
+        if i < 0:
+            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+
+        self._check_reader(agent)
+
+        all_codes = []
+        for scheme in CodeScheme:
+            value = self._value(self._sections[scheme.num], i)
+            if value is not None:
+                all_codes.append(Code._trusted(scheme, value))
+        return all_codes
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent) -> ICode:
+        """
+        Retrieve the instrument code of a specific type from the snapshot.
+        Args:
+            code (Code): The code to search for. Must be an instance of Code and cannot be None.
+            code_scheme (CodeScheme): The code scheme to match. Must be an instance of CodeScheme and cannot be None.
+            agent (Agent): The agent requesting the get of the alternate codes.
+        Returns:
+            Code: The matching instrument code of the specified type.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            CodeDoesNotExist: If the `code` does not exist in the snapshot.
+            OnlyBaseCodeDefined: If no matching code scheme is found for the given `code`.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                "code must be an instance of Code and cannot be None")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        i = self._find(self._sections[code.scheme.num], code.value)
+        if i < 0:
+            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+
+        self._check_reader(agent)
+
+        value = self._value(self._sections[code_scheme.num], i)
+        if value is not None:
+            return Code._trusted(code_scheme, value)
+
+        raise OnlyBaseCodeDefined(
+            f"Code {code} has no matching codes for code scheme {code_scheme}")
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        Translate a batch of codes to their code of the given scheme in a single call.
+        Args:
+            codes (Sequence[Code | str]): The codes to translate, or raw code values if source_scheme is given.
+            code_scheme (CodeScheme): The code scheme to translate to.
+            agent (Agent): The agent requesting the translation.
+            source_scheme (CodeScheme): Optional, the code scheme of the raw code values given in codes.
+        Returns:
+            List[Code]: Parallel to codes, the matching code of the given scheme or None if there is none.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        if source_scheme is not None and not isinstance(source_scheme, CodeScheme):
+            raise ValueError(
+                "source code sheme must be an instance of CodeScheme")
+
+        self._check_reader(agent)
+
+        target = self._sections[code_scheme.num]
+        translated = []
+        for c in codes:
+            if source_scheme is None:
+                if not isinstance(c, ICode):
+                    raise ValueError(
+                        f"codes must all be instances of Code when no source scheme is given, but got {type(c)}")
+                i = self._find(self._sections[c.scheme.num], c.value)
+            else:
+                i = self._find(self._sections[source_scheme.num], c)
+            value = self._value(target, i) if i >= 0 else None
+            translated.append(Code._trusted(code_scheme, value) if value is not None else None)
+        return translated
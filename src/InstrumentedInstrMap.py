@@ -0,0 +1,120 @@
+from time import perf_counter_ns
+from typing import Callable, Iterable, List, Optional, Sequence, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.CodeScheme import CodeScheme
+from src.InstrMapMetrics import InstrMapMetrics
+
+
+class InstrumentedInstrumentMap(IInstrumentMap):
+    """
+    Wraps any instrument map to record the count, errors and latency of every call made through it in an
+    InstrMapMetrics, which can be snapshot or exported for scraping.
+
+    Instrumentation is opt in, a map that is not wrapped pays nothing, and a wrapped map whose metrics are not
+    enabled pays one attribute check per call. Attributes the wrapper does not define, e.g. InstrumentMap.session,
+    are those of the wrapped map and are not instrumented.
+
+    Attributes:
+        instr_map (IInstrumentMap): The wrapped map.
+        metrics (InstrMapMetrics): The metrics calls are recorded in.
+    Methods:
+        create_instr() -> Code: Creates a new base instrument code and adds it to the map.
+        add_instr_codes(code: Code, codes: List[Code]) -> None: Adds related codes to an existing base code.
+        load_instrs(records: Iterable[Iterable[Code]]) -> List[Code]: Creates many instruments, if the map can.
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+    """
+
+    def __init__(self,
+                 instr_map: IInstrumentMap,
+                 metrics: Optional[InstrMapMetrics] = None):
+        """
+        Args:
+            instr_map (IInstrumentMap): The map to instrument.
+            metrics (InstrMapMetrics): Optional, the metrics to record in, enabled new metrics if not given.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+        """
+        if instr_map is None or not isinstance(instr_map, IInstrumentMap):
+            raise ValueError(
+                f"instr_map must be an instance of IInstrumentMap and cannot be None: {instr_map}")
+
+        if metrics is not None and not isinstance(metrics, InstrMapMetrics):
+            raise ValueError(f"metrics must be an instance of InstrMapMetrics: {metrics}")
+
+        super().__init__()
+        self.instr_map = instr_map
+        self.metrics = metrics if metrics is not None else InstrMapMetrics()
+        return
+
+    def __getattr__(self, name: str):
+        # Only called for attributes not found on the wrapper, instr_map is guarded as it is not set until __init__.
+        if name == "instr_map":
+            raise AttributeError(name)
+        return getattr(self.instr_map, name)
+
+    def _timed(self,
+               op: str,
+               items: int,
+               method: Callable,
+               *args):
+        start = perf_counter_ns()
+        try:
+            return method(*args)
+        except Exception as e:
+            self.metrics.record_error(op, e)
+            raise
+        finally:
+            self.metrics.record(op, perf_counter_ns() - start, items)
+
+    def create_instr(self,
+                     agent: IAgent) -> ICode:
+        if not self.metrics.enabled:
+            return self.instr_map.create_instr(agent)
+        return self._timed("create_instr", 1, self.instr_map.create_instr, agent)
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode],
+                        agent: IAgent) -> None:
+        if not self.metrics.enabled:
+            return self.instr_map.add_instr_codes(code, codes, agent)
+        return self._timed("add_instr_codes", 1, self.instr_map.add_instr_codes, code, codes, agent)
+
+    def load_instrs(self,
+                    records: Iterable[Iterable[ICode]],
+                    agent: IAgent) -> List[ICode]:
+        if not self.metrics.enabled:
+            return self.instr_map.load_instrs(records, agent)
+        items = len(records) if hasattr(records, "__len__") else 1
+        return self._timed("load_instrs", items, self.instr_map.load_instrs, records, agent)
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent) -> List[ICode]:
+        if not self.metrics.enabled:
+            return self.instr_map.get_instr_codes(code, agent)
+        return self._timed("get_instr_codes", 1, self.instr_map.get_instr_codes, code, agent)
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent) -> ICode:
+        if not self.metrics.enabled:
+            return self.instr_map.get_instr_code_of_type(code, code_scheme, agent)
+        return self._timed("get_instr_code_of_type", 1, self.instr_map.get_instr_code_of_type,
+                           code, code_scheme, agent)
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        if not self.metrics.enabled:
+            return self.instr_map.translate_codes(codes, code_scheme, agent, source_scheme)
+        items = len(codes) if hasattr(codes, "__len__") else 1
+        return self._timed("translate_codes", items, self.instr_map.translate_codes,
+                           codes, code_scheme, agent, source_scheme)
@@ -0,0 +1,136 @@
+from array import array
+from typing import Optional
+
+
+class LatencyHistogram:
+    """
+    A fixed memory histogram of latencies in nanoseconds, in the style of HdrHistogram.
+
+    Values below 2 ** SUB_BUCKET_BITS ns are counted exactly, above that each power of 2 is split in to
+    2 ** (SUB_BUCKET_BITS - 1) linear buckets, so any value is counted within 1 / 2 ** (SUB_BUCKET_BITS - 1) of its
+    true value (1.6%) whatever its magnitude. Values of 2 ** MAX_BITS ns (about 4.9 hours) or more are counted in
+    the last bucket. Recording a value is a few integer operations and the histogram never grows.
+
+    Recording is not locked, histograms shared between threads may rarely lose a count.
+
+    Attributes:
+        count (int): The number of values recorded.
+        total (int): The sum of the values recorded.
+        min (int): The smallest value recorded, None if there are none.
+        max (int): The largest value recorded, None if there are none.
+    Methods:
+        record(value: int) -> None: Records a value.
+        percentile(p: float) -> int: The value at or below which p percent of the values fall.
+        mean() -> float: The mean of the values recorded.
+        merge(other: LatencyHistogram) -> None: Adds the values recorded by another histogram.
+        reset() -> None: Discards all the values recorded.
+    """
+    SUB_BUCKET_BITS = 7
+    MAX_BITS = 44
+    _SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    _HALF_SUB_BUCKET_BITS = SUB_BUCKET_BITS - 1
+    _HALF_SUB_BUCKETS = _SUB_BUCKETS >> 1
+    _MAX_SHIFT = MAX_BITS - SUB_BUCKET_BITS + 1
+    _NUM_BUCKETS = _SUB_BUCKETS + (MAX_BITS - SUB_BUCKET_BITS) * _HALF_SUB_BUCKETS
+
+    def __init__(self):
+        self.counts = array("q", bytes(8 * LatencyHistogram._NUM_BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+        return
+
+    @staticmethod
+    def _index(value: int) -> int:
+        shift = value.bit_length() - LatencyHistogram.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        # SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS, simplified.
+        index = (shift << LatencyHistogram._HALF_SUB_BUCKET_BITS) + (value >> shift)
+        return min(index, LatencyHistogram._NUM_BUCKETS - 1)
+
+    @staticmethod
+    def _highest_value(index: int) -> int:
+        """
+        The highest value counted in the bucket at the given index.
+        """
+        if index < LatencyHistogram._SUB_BUCKETS:
+            return index
+        shift, sub_bucket = divmod(index - LatencyHistogram._SUB_BUCKETS, LatencyHistogram._HALF_SUB_BUCKETS)
+        shift += 1
+        return ((sub_bucket + LatencyHistogram._HALF_SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self,
+               value: int) -> None:
+        """
+        Record a value.
+        Args:
+            value (int): The value in ns, which must not be negative.
+        """
+        # _index inlined, as this is on the path of every instrumented call.
+        shift = value.bit_length() - LatencyHistogram.SUB_BUCKET_BITS
+        if shift <= 0:
+            index = value
+        elif shift < LatencyHistogram._MAX_SHIFT:
+            index = (shift << LatencyHistogram._HALF_SUB_BUCKET_BITS) + (value >> shift)
+        else:
+            index = LatencyHistogram._NUM_BUCKETS - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.count == 1:
+            self.min = self.max = value
+        elif value > self.max:
+            self.max = value
+        elif value < self.min:
+            self.min = value
+
+    def percentile(self,
+                   p: float) -> Optional[int]:
+        """
+        The value at or below which p percent of the recorded values fall, to within the precision of the histogram.
+        Args:
+            p (float): The percentile, 0 to 100.
+        Returns:
+            int: The value in ns, None if no values have been recorded.
+        Raises:
+            ValueError: If p is not between 0 and 100.
+        """
+        if not 0.0 <= p <= 100.0:
+            raise ValueError(f"percentile must be between 0 and 100: {p}")
+
+        if self.count == 0:
+            return None
+
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index == LatencyHistogram._NUM_BUCKETS - 1:
+                    return self.max
+                return min(LatencyHistogram._highest_value(index), self.max)
+        return self.max
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def merge(self,
+              other: 'LatencyHistogram') -> None:
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+
+    def reset(self) -> None:
+        self.counts = array("q", bytes(8 * LatencyHistogram._NUM_BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
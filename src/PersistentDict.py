@@ -0,0 +1,182 @@
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+
+_MISSING = object()
+_BITS = 8
+_MASK = (1 << _BITS) - 1
+
+
+class PersistentDict:
+    """
+    A dict that can be forked in constant time, for maps that publish a new version on every change while readers
+    keep using the old one.
+
+    The items are held in a hash trie, lists of WIDTH children picked by the hash of the key BITS bits at a time,
+    with dicts of at most LEAF_SIZE items as its leaves. A leaf that grows past LEAF_SIZE is split in to WIDTH
+    leaves by the next bits of the hash. A fork shares the whole trie with the dict it was forked from, and each
+    then copies a node before changing it, and the nodes on the path from the root to it, so a change costs a
+    copy of a few lists of WIDTH and a dict of at most LEAF_SIZE whatever the size of the dict. Nodes copied
+    since the last fork are changed in place, so a bulk change copies each node at most once.
+
+    Keys are never removed, as an instrument map only ever adds or remaps codes.
+
+    Methods:
+        fork() -> PersistentDict: A dict with the same items that shares all the nodes of this one.
+        get(key: object, default: object) -> object: The value of a key, default if it is not in the dict.
+        update(items: Dict | Iterable[Tuple[object, object]]) -> None: Sets many keys.
+        keys() -> Iterator[object]: The keys, in no particular order.
+        items() -> Iterator[Tuple[object, object]]: The items, in no particular order.
+    """
+    BITS = _BITS
+    WIDTH = 1 << _BITS
+    MASK = _MASK
+    LEAF_SIZE = 128
+    # Python hashes are 64 bits, past that depth the keys of a leaf all have the same hash bits so it is not split.
+    MAX_DEPTH = 64 // BITS
+
+    def __init__(self,
+                 items: Optional[Union[Dict[object, object], Iterable[Tuple[object, object]]]] = None):
+        """
+        Args:
+            items (Dict | Iterable[Tuple[object, object]]): Optional, the items of the dict.
+        """
+        items = dict(items) if items is not None else {}
+        self._root: Union[dict, list] = PersistentDict._build(items, 0)
+        self._len = len(items)
+        self._owned = set()
+        return
+
+    @staticmethod
+    def _build(items: dict,
+               depth: int) -> Union[dict, list]:
+        """
+        The trie of the items at the given depth, built a level at a time rather than a key at a time.
+        """
+        if len(items) <= PersistentDict.LEAF_SIZE or depth >= PersistentDict.MAX_DEPTH:
+            return items
+        return [PersistentDict._build(child, depth + 1) for child in PersistentDict._partition(items, depth)]
+
+    @staticmethod
+    def _partition(items: dict,
+                   depth: int) -> list:
+        """
+        The items of a node at the given depth as WIDTH dicts, by the next bits of the hashes of their keys.
+        """
+        shift = depth * _BITS
+        split = [{} for _ in range(PersistentDict.WIDTH)]
+        for key, value in items.items():
+            split[(hash(key) >> shift) & _MASK][key] = value
+        return split
+
+    def fork(self) -> 'PersistentDict':
+        forked = PersistentDict.__new__(PersistentDict)
+        forked._root = self._root
+        forked._len = self._len
+        forked._owned = set()
+        # The nodes are now shared, so this dict must copy them before changing them too.
+        self._owned = set()
+        return forked
+
+    def __len__(self) -> int:
+        return self._len
+
+    def get(self,
+            key: object,
+            default: object = None) -> object:
+        node = self._root
+        if type(node) is list:
+            h = hash(key)
+            while type(node) is list:
+                node = node[h & _MASK]
+                h >>= _BITS
+        return node.get(key, default)
+
+    def __getitem__(self,
+                    key: object) -> object:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self,
+                     key: object) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def _own(self,
+             node: Union[dict, list]) -> Union[dict, list]:
+        if id(node) in self._owned:
+            return node
+        node = node.copy()
+        self._owned.add(id(node))
+        return node
+
+    def __setitem__(self,
+                    key: object,
+                    value: object) -> None:
+        h = hash(key)
+        parent = None
+        node = self._root = self._own(self._root)
+        depth = 0
+        while type(node) is list:
+            parent, i = node, h & _MASK
+            node = parent[i] = self._own(node[i])
+            h >>= _BITS
+            depth += 1
+        size = len(node)
+        node[key] = value
+        if len(node) == size:
+            return
+        self._len += 1
+        if len(node) > PersistentDict.LEAF_SIZE and depth < PersistentDict.MAX_DEPTH:
+            split = self._split(node, depth)
+            self._owned.discard(id(node))
+            if parent is None:
+                self._root = split
+            else:
+                parent[i] = split
+
+    def _split(self,
+               leaf: dict,
+               depth: int) -> list:
+        """
+        The leaf at the given depth as a node of WIDTH leaves, owned by this dict.
+        """
+        split = PersistentDict._partition(leaf, depth)
+        self._owned.update(map(id, split))
+        self._owned.add(id(split))
+        return split
+
+    def update(self,
+               items: Union[Dict[object, object], Iterable[Tuple[object, object]]]) -> None:
+        if hasattr(items, "items"):
+            items = items.items()
+        for key, value in items:
+            self[key] = value
+
+    def _leaves(self,
+                node: Union[dict, list]) -> Iterator[dict]:
+        if type(node) is dict:
+            yield node
+            return
+        for child in node:
+            yield from self._leaves(child)
+
+    def keys(self) -> Iterator[object]:
+        for leaf in self._leaves(self._root):
+            yield from leaf
+
+    def __iter__(self) -> Iterator[object]:
+        return self.keys()
+
+    def items(self) -> Iterator[Tuple[object, object]]:
+        for leaf in self._leaves(self._root):
+            yield from leaf.items()
+
+    def __eq__(self,
+               other: object) -> bool:
+        if isinstance(other, PersistentDict):
+            other = dict(other.items())
+        return isinstance(other, dict) and len(self) == len(other) and dict(self.items()) == other
+
+    def __repr__(self) -> str:
+        return f"PersistentDict({dict(self.items())!r})"
@@ -0,0 +1,192 @@
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Union
+
+
+_BITS = 8
+_MASK = (1 << _BITS) - 1
+
+
+class PersistentList:
+    """
+    A list that can be forked in constant time, for maps that publish a new version on every change while readers
+    keep using the old one.
+
+    The values are held in a tree of lists of WIDTH children, the leaves holding the values, so the value at an
+    index is found by using its bits, BITS at a time, to pick a child at each level. A fork shares the whole tree
+    with the list it was forked from, and each then copies a node before changing it, and the nodes on the path
+    from the root to it, so a change costs a copy of a few lists of WIDTH whatever the length of the list. Nodes
+    copied since the last fork are changed in place, so a bulk change copies each node at most once.
+
+    Methods:
+        fork() -> PersistentList: A list with the same values that shares all the nodes of this one.
+        append(value: object) -> None: Adds a value to the end of the list.
+        extend(values: Iterable[object]) -> None: Adds many values to the end of the list.
+        count(value: object) -> int: The number of values equal to value.
+    """
+    BITS = _BITS
+    WIDTH = 1 << _BITS
+    MASK = _MASK
+
+    def __init__(self,
+                 values: Optional[Iterable[object]] = None):
+        """
+        Args:
+            values (Iterable[object]): Optional, the values of the list.
+        """
+        self._root: list = []
+        self._shift = 0
+        self._len = 0
+        self._owned = {id(self._root)}
+        if values is not None:
+            self.extend(values)
+        return
+
+    def fork(self) -> 'PersistentList':
+        forked = PersistentList.__new__(PersistentList)
+        forked._root = self._root
+        forked._shift = self._shift
+        forked._len = self._len
+        forked._owned = set()
+        # The nodes are now shared, so this list must copy them before changing them too.
+        self._owned = set()
+        return forked
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _index(self,
+               i: int) -> int:
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("list index out of range")
+        return i
+
+    def _leaf(self,
+              i: int) -> list:
+        node = self._root
+        shift = self._shift
+        while shift:
+            node = node[(i >> shift) & _MASK]
+            shift -= _BITS
+        return node
+
+    def __getitem__(self,
+                    i: Union[int, slice]) -> object:
+        if type(i) is not int or not 0 <= i < self._len:
+            if isinstance(i, slice):
+                return self._slice(i)
+            i = self._index(i)
+        node = self._root
+        shift = self._shift
+        while shift:
+            node = node[(i >> shift) & _MASK]
+            shift -= _BITS
+        return node[i & _MASK]
+
+    def _slice(self,
+               s: slice) -> List[object]:
+        start, stop, step = s.indices(self._len)
+        if step != 1:
+            return [self[i] for i in range(start, stop, step)]
+        values = []
+        while start < stop:
+            offset = start & _MASK
+            taken = self._leaf(start)[offset:offset + stop - start]
+            values += taken
+            start += len(taken)
+        return values
+
+    def __iter__(self) -> Iterator[object]:
+        return chain.from_iterable(self._leaves(self._root, self._shift))
+
+    def _leaves(self,
+                node: list,
+                shift: int) -> Iterator[list]:
+        if not shift:
+            yield node
+            return
+        for child in node:
+            yield from self._leaves(child, shift - _BITS)
+
+    def _own(self,
+             node: list,
+             i: int) -> list:
+        """
+        The child i of a node this list owns, copied first if it is shared with another list.
+        """
+        child = node[i]
+        if id(child) not in self._owned:
+            child = list(child)
+            self._owned.add(id(child))
+            node[i] = child
+        return child
+
+    def _own_root(self) -> list:
+        if id(self._root) not in self._owned:
+            self._root = list(self._root)
+            self._owned.add(id(self._root))
+        return self._root
+
+    def __setitem__(self,
+                    i: int,
+                    value: object) -> None:
+        i = self._index(i)
+        node = self._own_root()
+        shift = self._shift
+        while shift:
+            node = self._own(node, (i >> shift) & _MASK)
+            shift -= _BITS
+        node[i & _MASK] = value
+
+    def _tail(self) -> list:
+        """
+        The leaf the next value appended goes in to, owned by this list, adding a level to the tree if it is full.
+        """
+        n = self._len
+        if n == 1 << (self._shift + _BITS):
+            self._root = [self._root]
+            self._owned.add(id(self._root))
+            self._shift += _BITS
+        node = self._own_root()
+        shift = self._shift
+        while shift:
+            i = (n >> shift) & _MASK
+            if i == len(node):
+                child = []
+                self._owned.add(id(child))
+                node.append(child)
+                node = child
+            else:
+                node = self._own(node, i)
+            shift -= _BITS
+        return node
+
+    def append(self,
+               value: object) -> None:
+        self._tail().append(value)
+        self._len += 1
+
+    def extend(self,
+               values: Iterable[object]) -> None:
+        values = list(values)
+        i = 0
+        while i < len(values):
+            leaf = self._tail()
+            taken = values[i:i + PersistentList.WIDTH - len(leaf)]
+            leaf += taken
+            self._len += len(taken)
+            i += len(taken)
+
+    def count(self,
+              value: object) -> int:
+        return sum(leaf.count(value) for leaf in self._leaves(self._root, self._shift))
+
+    def __eq__(self,
+               other: object) -> bool:
+        if isinstance(other, PersistentList):
+            other = list(other)
+        return isinstance(other, list) and list(self) == other
+
+    def __repr__(self) -> str:
+        return f"PersistentList({list(self)!r})"
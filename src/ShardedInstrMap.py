@@ -0,0 +1,679 @@
+import multiprocessing
+import os
+import threading
+import zlib
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.GloballyUniqueIdentifier import GloballyUniqueIdentifier
+from src.AgentRole import AgentRole
+from src.InstrMap import InstrumentMap
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+from exception.MapIsReadOnly import MapIsReadOnly
+
+
+_BASE = str(CodeScheme.BASE)
+_SCHEMES = {str(scheme): scheme for scheme in CodeScheme}
+_SCHEME_INDEX = {scheme: i for i, scheme in enumerate(CodeScheme)}
+_SCHEME_NAMES = {scheme.num: str(scheme) for scheme in CodeScheme}
+
+
+def _shard_of(value: str,
+              num_shards: int) -> int:
+    # crc32 rather than hash() as routers in other processes must route a value to the same shard.
+    return zlib.crc32(value.encode("utf-8")) % num_shards
+
+
+class _Shard:
+    """
+    The state of one shard process.
+
+    The shard owns the instruments whose base code value hashes to it, held in an InstrumentMap, and is the
+    directory for the alias codes whose value hashes to it, mapping each to the base code value of its instrument.
+    All arguments and results are plain strings and lists, which are cheap to pickle.
+    """
+    READ_OPS = frozenset(("resolve", "lookup", "rows", "check_claims", "size"))
+    WRITE_OPS = frozenset(("create", "add", "load", "unload", "claim"))
+
+    def __init__(self):
+        self.instr_map = InstrumentMap()
+        self.directory = {str(scheme): {} for scheme in CodeScheme if scheme != CodeScheme.BASE}
+
+    def resolve(self,
+                groups: List[Tuple[str, List[str]]]) -> List[List[Optional[str]]]:
+        """
+        For each (scheme, code values) the base code value of each code, None for codes that do not exist.
+        """
+        resolved = []
+        for scheme, values in groups:
+            if scheme == _BASE:
+                base_map = self.instr_map.instr_map[_BASE]
+                resolved.append([value if value in base_map else None for value in values])
+            else:
+                resolved.append(list(map(self.directory[scheme].get, values)))
+        return resolved
+
+    def lookup(self,
+               base_values: List[str],
+               scheme: str) -> List[Optional[str]]:
+        """
+        The code value of the given scheme of each instrument, None if it has none or does not exist.
+        """
+        instr_ids = self.instr_map.instr_map[_BASE]
+        target_values = self.instr_map.instr_codes[scheme]
+        return [target_values[instr_id] if instr_id is not None else None
+                for instr_id in map(instr_ids.get, base_values)]
+
+    def rows(self,
+             base_values: List[str]) -> List[Optional[List[Optional[str]]]]:
+        """
+        The code values of every scheme, in CodeScheme order, of each instrument, None if it does not exist.
+        """
+        instr_ids = self.instr_map.instr_map[_BASE]
+        columns = [self.instr_map.instr_codes[str(scheme)] for scheme in CodeScheme]
+        return [[column[instr_id] for column in columns] if instr_id is not None else None
+                for instr_id in map(instr_ids.get, base_values)]
+
+    def check_claims(self,
+                     claims: List[Tuple[str, str, str]]) -> Optional[Tuple[str, str, str]]:
+        """
+        The first of the (scheme, code value, base code value) claims whose code belongs to another instrument.
+        """
+        for scheme, value, base_value in claims:
+            curr_base_value = self.directory[scheme].get(value)
+            if curr_base_value is not None and curr_base_value != base_value:
+                return scheme, value, curr_base_value
+        return None
+
+    def claim(self,
+              claims: List[Tuple[str, str, str]]) -> None:
+        for scheme, value, base_value in claims:
+            self.directory[scheme][value] = base_value
+
+    def create(self,
+               base_value: str) -> None:
+        self.instr_map._new_instr(base_value)
+
+    def add(self,
+            base_value: str,
+            codes: List[Tuple[str, str]],
+            agent_id: str) -> None:
+        # Raises as InstrumentMap.add_instr_codes if the instrument already has a different code of a scheme.
+        instr_id = self.instr_map.instr_map[_BASE].get(base_value)
+        if instr_id is None:
+            raise CodeDoesNotExist(
+                f"Cannot add codes for a Code that does not exist in the map: {Code(CodeScheme.BASE, base_value)}")
+        self.instr_map._add_instr_codes(instr_id,
+                                        [Code._trusted(_SCHEMES[scheme], value) for scheme, value in codes],
+                                        agent_id)
+
+    def load(self,
+             records: List[Tuple[str, List[Tuple[str, str]]]]) -> None:
+        scheme_maps = self.instr_map.instr_map
+        scheme_codes = self.instr_map.instr_codes
+        for base_value, codes in records:
+            instr_id = self.instr_map._new_instr(base_value)
+            for scheme, value in codes:
+                scheme_maps[scheme][value] = instr_id
+                scheme_codes[scheme][instr_id] = value
+
+    def unload(self,
+               base_values: List[str]) -> None:
+        """
+        Remove the instruments of a failed load. A load is the last change made to the shard before it is undone,
+        so its instruments are the last instruments created.
+        """
+        base_map = self.instr_map.instr_map[_BASE]
+        instr_ids = [instr_id for instr_id in map(base_map.get, base_values) if instr_id is not None]
+        if not instr_ids:
+            return
+        first_id = min(instr_ids)
+        for scheme, scheme_codes in self.instr_map.instr_codes.items():
+            scheme_map = self.instr_map.instr_map[scheme]
+            for value in scheme_codes[first_id:]:
+                if value is not None:
+                    del scheme_map[value]
+            del scheme_codes[first_id:]
+
+    def size(self) -> Tuple[int, int]:
+        """
+        The number of instruments owned and alias codes held in the directory.
+        """
+        return (len(self.instr_map.instr_codes[_BASE]),
+                sum(len(scheme_directory) for scheme_directory in self.directory.values()))
+
+
+def _serve(shard: _Shard,
+           conn: Connection,
+           lock: threading.Lock,
+           ops: frozenset) -> None:
+    while True:
+        try:
+            op, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        if op == "stop":
+            return
+        try:
+            if op not in ops:
+                raise MapIsReadOnly(f"Shard operation {op} is not permitted on this connection")
+            with lock:
+                reply = ("ok", getattr(shard, op)(*args))
+        except Exception as e:
+            reply = ("error", e)
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            return
+
+
+def _accept(shard: _Shard,
+            listener: Listener,
+            lock: threading.Lock) -> None:
+    while True:
+        try:
+            conn = listener.accept()
+        except (EOFError, AuthenticationError):
+            continue
+        except OSError:
+            return
+        threading.Thread(target=_serve, args=(shard, conn, lock, _Shard.READ_OPS), daemon=True).start()
+
+
+def _run_shard(conn: Connection,
+               authkey: bytes) -> None:
+    """
+    The main of a shard process. The owning map is served on the main thread, and the shard ends when the owning
+    map stops it or goes away. Attached maps connect to the shard's listener and are served read only.
+    """
+    shard = _Shard()
+    lock = threading.Lock()
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+    conn.send(listener.address)
+    threading.Thread(target=_accept, args=(shard, listener, lock), daemon=True).start()
+    _serve(shard, conn, lock, _Shard.READ_OPS | _Shard.WRITE_OPS)
+    listener.close()
+
+
+class ShardedInstrumentMap(IInstrumentMap):
+    """
+    An instrument map partitioned over a number of shard processes on one host, so the work of large batches is
+    spread over as many cores as there are shards rather than bound to the one core the GIL allows a process.
+
+    Each instrument is owned by the shard its base code value hashes to, which holds all its codes, and each alias
+    code is entered in the directory of the shard its own value hashes to, so a code is resolved to its instrument
+    in at most two hops: to the alias's directory shard for the base code value, then to the owning shard. Batch
+    translations send one request per shard per hop, to all the shards at once, so the shards work in parallel
+    and the router only splits and merges.
+
+    The map that starts the shards owns them, is the only map that can change them, and stops them on close.
+    Other processes can attach read only maps to the same shards with attach(addresses, authkey), so that the
+    routing, argument checks and creation of result Codes are spread over many processes too.
+
+    Calls through one map are serialised, use a map per thread or attach one per process for parallel callers.
+    Readers may see a change made by the owning map part applied, as it is applied shard by shard.
+
+    Single lookups cost an inter process round trip per hop, the sharded map pays off for batches.
+
+    Attributes:
+        num_shards (int): The number of shards.
+        addresses (List[tuple]): The addresses of the shards, for attach.
+        authkey (bytes): The key that authenticates connections to the shards, for attach.
+    Methods:
+        create_instr() -> Code: Creates a new base instrument code and adds it to the map.
+        add_instr_codes(code: Code, codes: List[Code]) -> None: Adds related codes to an existing base code.
+        load_instrs(records: Iterable[Iterable[Code]]) -> List[Code]: Creates many instruments and their codes all or nothing.
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        shard_sizes() -> List[Tuple[int, int]]: The number of instruments and alias codes held by each shard.
+        close() -> None: Stops the shards if this map owns them, otherwise disconnects from them.
+    Class Methods:
+        attach(addresses: List[tuple], authkey: bytes) -> ShardedInstrumentMap: A read only map of running shards.
+    """
+
+    def __init__(self,
+                 num_shards: Optional[int] = None):
+        """
+        Start the shard processes, each with an empty shard.
+        Args:
+            num_shards (int): The number of shard processes to start, the number of cores by default.
+        Raises:
+            ValueError: If parameters are of the wrong type.
+        """
+        if num_shards is None:
+            num_shards = os.cpu_count() or 1
+
+        if not isinstance(num_shards, int) or num_shards < 1:
+            raise ValueError(f"num_shards must be a positive integer: {num_shards}")
+
+        super().__init__()
+        self.num_shards = num_shards
+        self.authkey = os.urandom(32)
+        self.read_only = False
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._processes = []
+        self._conns = []
+        self.addresses = []
+        context = multiprocessing.get_context()
+        try:
+            for _ in range(num_shards):
+                conn, child_conn = context.Pipe()
+                process = context.Process(target=_run_shard, args=(child_conn, self.authkey), daemon=True)
+                process.start()
+                child_conn.close()
+                self._processes.append(process)
+                self._conns.append(conn)
+                self.addresses.append(conn.recv())
+        except BaseException:
+            self.close()
+            raise
+        return
+
+    @classmethod
+    def attach(cls,
+               addresses: List[tuple],
+               authkey: bytes) -> 'ShardedInstrumentMap':
+        """
+        Attach a read only map to the running shards of another map.
+        Args:
+            addresses (List[tuple]): The addresses of the shards, as the addresses attribute of the owning map.
+            authkey (bytes): The authkey attribute of the owning map.
+        Returns:
+            ShardedInstrumentMap: A read only map of the shards.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            ConnectionError: If a shard cannot be connected to.
+        """
+        if not addresses or not isinstance(authkey, bytes):
+            raise ValueError("addresses must be the non-empty addresses and authkey the authkey of a sharded map")
+
+        instr_map = cls.__new__(cls)
+        IInstrumentMap.__init__(instr_map)
+        instr_map.num_shards = len(addresses)
+        instr_map.authkey = authkey
+        instr_map.read_only = True
+        instr_map._lock = threading.Lock()
+        instr_map._write_lock = threading.Lock()
+        instr_map._processes = []
+        instr_map._conns = []
+        instr_map.addresses = [tuple(address) for address in addresses]
+        try:
+            for address in instr_map.addresses:
+                instr_map._conns.append(Client(address, authkey=authkey))
+        except BaseException:
+            instr_map.close()
+            raise
+        return instr_map
+
+    def close(self) -> None:
+        for conn in self._conns:
+            try:
+                if self._processes:
+                    conn.send(("stop", ()))
+                conn.close()
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._conns = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _fan_out(self,
+                 op: str,
+                 requests: Dict[int, tuple]) -> Dict[int, object]:
+        """
+        Send each shard its request, then collect every reply, so the shards work on their requests in parallel.
+        """
+        with self._lock:
+            try:
+                for shard, args in requests.items():
+                    self._conns[shard].send((op, args))
+                results = {}
+                error = None
+                for shard in requests:
+                    status, result = self._conns[shard].recv()
+                    if status == "ok":
+                        results[shard] = result
+                    elif error is None:
+                        error = result
+            except (EOFError, OSError, IndexError) as e:
+                raise ConnectionError(f"Connection to instrument map shard lost: {e}") from e
+        if error is not None:
+            raise error
+        return results
+
+    def _call(self,
+              shard: int,
+              op: str,
+              *args) -> object:
+        return self._fan_out(op, {shard: args})[shard]
+
+    def _group(self,
+               values: Iterable[str]) -> List[Tuple[List[int], List[str]]]:
+        """
+        Split code values by the shard they hash to, as the positions and values sent to each shard.
+        """
+        num_shards = self.num_shards
+        crc32 = zlib.crc32
+        groups = [([], []) for _ in range(num_shards)]
+        for i, value in enumerate(values):
+            indexes, shard_values = groups[crc32(value.encode("utf-8")) % num_shards]
+            indexes.append(i)
+            shard_values.append(value)
+        return groups
+
+    def _resolve_base(self,
+                      code: ICode) -> str:
+        base_value = self._call(_shard_of(code.value, self.num_shards), "resolve",
+                                [(str(code.scheme), [code.value])])[0][0]
+        if base_value is None:
+            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+        return base_value
+
+    def _row(self,
+             code: ICode) -> List[Optional[str]]:
+        base_value = self._resolve_base(code)
+        row = self._call(_shard_of(base_value, self.num_shards), "rows", [base_value])[0]
+        if row is None:
+            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+        return row
+
+    def _check_agent(self,
+                     agent: IAgent,
+                     role: AgentRole) -> None:
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if role == AgentRole.MAINTAINER:
+            if self.read_only:
+                raise MapIsReadOnly("Cannot change the instruments of a sharded map attached read only")
+            if not agent.has_required_permissions(AgentRole.MAINTAINER):
+                raise IncorrectPermissions(
+                    f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to create an instrument)")
+        elif not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to read the map)")
+
+    def _check_claims(self,
+                      claims: Dict[int, List[Tuple[str, str, str]]]) -> None:
+        """
+        Raise if any of the (scheme, code value, base code value) claims, by directory shard, is of a code of
+        another instrument.
+        """
+        for conflict in self._fan_out("check_claims", {shard: (shard_claims,)
+                                                       for shard, shard_claims in claims.items()}).values():
+            if conflict is not None:
+                scheme, value, _ = conflict
+                raise ValueError(
+                    f"Cannot add code for a Code that already exists in the map with a different base code: "
+                    f"{Code(_SCHEMES[scheme], value)}")
+
+    def _claim(self,
+               claims: Dict[int, List[Tuple[str, str, str]]]) -> None:
+        if claims:
+            self._fan_out("claim", {shard: (shard_claims,) for shard, shard_claims in claims.items()})
+
+    def create_instr(self,
+                     agent: IAgent) -> ICode:
+        """
+        As IInstrumentMap.create_instr, the instrument is created on the shard its base code hashes to.
+        Raises:
+            MapIsReadOnly: If the map is attached read only.
+        """
+        self._check_agent(agent, AgentRole.MAINTAINER)
+        new_code = Code._trusted(CodeScheme.BASE, Code.gen_base_code_value())
+        self._call(_shard_of(new_code.value, self.num_shards), "create", new_code.value)
+        return new_code
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode],
+                        agent: IAgent) -> None:
+        """
+        As IInstrumentMap.add_instr_codes. Every code is checked against the directories before the owning shard
+        adds them, and they are only entered in the directories once it has, so a rejected call changes nothing.
+        Raises:
+            MapIsReadOnly: If the map is attached read only.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        if codes is None:
+            raise ValueError("codes cannot be None")
+
+        if not isinstance(codes, List) or not all(isinstance(c, ICode) for c in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
+
+        self._check_agent(agent, AgentRole.MAINTAINER)
+
+        with self._write_lock:
+            base_value = self._resolve_base(code)
+            for c in codes:
+                if c.scheme == CodeScheme.BASE and c.value != base_value:
+                    raise ValueError(
+                        f"Cannot add code for a Code that already exists in the map with a different base code: {c}")
+            claims = {}
+            for c in codes:
+                if c.scheme != CodeScheme.BASE:
+                    claims.setdefault(_shard_of(c.value, self.num_shards), []).append(
+                        (str(c.scheme), c.value, base_value))
+            self._check_claims(claims)
+            self._call(_shard_of(base_value, self.num_shards), "add",
+                       base_value, [(str(c.scheme), c.value) for c in codes], agent.id())
+            self._claim(claims)
+
+    def load_instrs(self,
+                    records: Iterable[Iterable[ICode]],
+                    agent: IAgent) -> List[ICode]:
+        """
+        As InstrumentMap.load_instrs, the records are validated by the router and against the shard directories
+        before any shard is changed, then each shard loads its share of them in parallel. If any shard fails to
+        load its share the shards that did are told to unload theirs, so the load is all or nothing.
+        Raises:
+            MapIsReadOnly: If the map is attached read only.
+        """
+        if records is None:
+            raise ValueError("records cannot be None")
+
+        self._check_agent(agent, AgentRole.MAINTAINER)
+
+        # Records and claims are staged by shard as they are validated. Codes are keyed by scheme number as that is
+        # far cheaper to hash than the scheme enum on a per code basis.
+        num_shards = self.num_shards
+        crc32 = zlib.crc32
+        records_by_shard = [[] for _ in range(num_shards)]
+        claims_by_shard = [[] for _ in range(num_shards)]
+        staged_codes = {scheme.num: set() for scheme in CodeScheme}
+        base_codes = []
+        base_values = GloballyUniqueIdentifier.blocks()
+        for i, record in enumerate(records):
+            if record is None or isinstance(record, (str, ICode)):
+                raise ValueError(
+                    f"record {i} must be an iterable of Code instances, but got {type(record)}")
+            base_code = Code._trusted(CodeScheme.BASE, next(base_values))
+            codes = []
+            schemes = set()
+            for c in record:
+                if not isinstance(c, ICode):
+                    raise ValueError(
+                        f"record {i} must only contain Code instances, but got {type(c)}")
+                scheme_num = c.scheme.num
+                if scheme_num == CodeScheme.BASE.num:
+                    raise ValueError(
+                        f"record {i} cannot contain base code {c} as base codes are allocated by the load")
+                if c.value in staged_codes[scheme_num]:
+                    raise ValueError(
+                        f"Cannot load code {c} of record {i} as it already exists in the map with a different base code")
+                if scheme_num in schemes:
+                    raise ValueError(
+                        f"Cannot load code {c} of record {i} as it already has a code of the same scheme")
+                schemes.add(scheme_num)
+                staged_codes[scheme_num].add(c.value)
+                scheme = _SCHEME_NAMES[scheme_num]
+                codes.append((scheme, c.value))
+                claims_by_shard[crc32(c.value.encode("utf-8")) % num_shards].append(
+                    (scheme, c.value, base_code.value))
+            base_codes.append(base_code)
+            records_by_shard[crc32(base_code.value.encode("utf-8")) % num_shards].append((base_code.value, codes))
+
+        records_by_shard = {shard: shard_records for shard, shard_records in enumerate(records_by_shard)
+                            if shard_records}
+        claims_by_shard = {shard: shard_claims for shard, shard_claims in enumerate(claims_by_shard) if shard_claims}
+        with self._write_lock:
+            # The base code values are new, so any code already in a directory is a conflict.
+            self._check_claims(claims_by_shard)
+            if records_by_shard:
+                try:
+                    self._fan_out("load", {shard: (shard_records,)
+                                           for shard, shard_records in records_by_shard.items()})
+                except Exception:
+                    self._fan_out("unload", {shard: ([base_value for base_value, _ in shard_records],)
+                                             for shard, shard_records in records_by_shard.items()})
+                    raise
+            self._claim(claims_by_shard)
+        return base_codes
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent) -> List[ICode]:
+        """
+        As IInstrumentMap.get_instr_codes.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None but got type {type(code)}")
+
+        self._check_agent(agent, AgentRole.READER)
+
+        return [Code._trusted(scheme, value) for scheme, value in zip(CodeScheme, self._row(code))
+                if value is not None]
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent) -> ICode:
+        """
+        As IInstrumentMap.get_instr_code_of_type.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                "code must be an instance of Code and cannot be None")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        self._check_agent(agent, AgentRole.READER)
+
+        matching_value = self._row(code)[_SCHEME_INDEX[code_scheme]]
+        if matching_value is not None:
+            return Code._trusted(code_scheme, matching_value)
+
+        raise OnlyBaseCodeDefined(
+            f"Code {code} has no matching codes for code scheme {code_scheme}")
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        As IInstrumentMap.translate_codes. Alias codes are resolved to their base code values by all the directory
+        shards at once, then the base code values translated by all the owning shards at once.
+        """
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        if source_scheme is not None and not isinstance(source_scheme, CodeScheme):
+            raise ValueError(
+                "source code sheme must be an instance of CodeScheme")
+
+        self._check_agent(agent, AgentRole.READER)
+
+        # Code values by source scheme, with their positions in codes.
+        by_scheme: Dict[str, Tuple[List[int], List[str]]] = {}
+        if source_scheme is not None:
+            by_scheme[str(source_scheme)] = (range(len(codes)), list(codes))
+        else:
+            for i, c in enumerate(codes):
+                if not isinstance(c, ICode):
+                    raise ValueError(
+                        f"codes must all be instances of Code when no source scheme is given, but got {type(c)}")
+                indexes, values = by_scheme.setdefault(str(c.scheme), ([], []))
+                indexes.append(i)
+                values.append(c.value)
+
+        # Hop one, resolve alias codes to base code values. Base code values go straight to hop two, whose lookup
+        # reports those that do not exist as None.
+        base_values: List[Optional[str]] = [None] * len(codes)
+        requests = {}
+        for scheme, (indexes, values) in by_scheme.items():
+            if scheme == _BASE:
+                for i, value in zip(indexes, values):
+                    base_values[i] = value
+                continue
+            for shard, (shard_indexes, shard_values) in enumerate(self._group(values)):
+                if shard_values:
+                    requests.setdefault(shard, ([], []))
+                    requests[shard][0].append([indexes[j] for j in shard_indexes])
+                    requests[shard][1].append((scheme, shard_values))
+        if requests:
+            resolved = self._fan_out("resolve", {shard: (groups,) for shard, (_, groups) in requests.items()})
+            for shard, (positions, _) in requests.items():
+                for group_positions, group_resolved in zip(positions, resolved[shard]):
+                    for i, base_value in zip(group_positions, group_resolved):
+                        base_values[i] = base_value
+
+        # Hop two, the code of the target scheme of each instrument. Alias codes resolved to a base code value
+        # already have their base code, so only base code values given as codes need checking for BASE.
+        trusted_code = Code._trusted
+        translated: List[Optional[ICode]] = [None] * len(codes)
+        if code_scheme == CodeScheme.BASE and _BASE not in by_scheme:
+            for i, base_value in enumerate(base_values):
+                if base_value is not None:
+                    translated[i] = trusted_code(code_scheme, base_value)
+            return translated
+
+        present = [i for i, base_value in enumerate(base_values) if base_value is not None]
+        groups = self._group(base_values[i] for i in present)
+        looked_up = self._fan_out("lookup", {shard: (shard_values, str(code_scheme))
+                                             for shard, (_, shard_values) in enumerate(groups) if shard_values})
+        for shard, target_values in looked_up.items():
+            for j, value in zip(groups[shard][0], target_values):
+                if value is not None:
+                    translated[present[j]] = trusted_code(code_scheme, value)
+        return translated
+
+    def shard_sizes(self) -> List[Tuple[int, int]]:
+        """
+        Returns:
+            List[Tuple[int, int]]: The number of instruments owned and alias codes held in the directory of each
+                                   shard, in shard order.
+        """
+        sizes = self._fan_out("size", {shard: () for shard in range(self.num_shards)})
+        return [sizes[shard] for shard in range(self.num_shards)]
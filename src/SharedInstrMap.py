@@ -0,0 +1,257 @@
+import io
+import struct
+import sys
+from multiprocessing import shared_memory
+from typing import List, Optional, Sequence, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.CodeScheme import CodeScheme
+from src.AgentRole import AgentRole
+from src.InstrMap import InstrumentMap
+from src.InstrMapSnapshot import InstrMapSnapshot, SnapshotInstrumentMap
+from exception.IncorrectPermissions import IncorrectPermissions
+from exception.MapIsReadOnly import MapIsReadOnly
+
+
+# The segments created by publishers in this process, which the resource tracker must keep tracking.
+_published_segments = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing shared memory segment without the resource tracker unlinking it when this process exits,
+    as only the publisher owns the segments.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    segment = shared_memory.SharedMemory(name=name)
+    if name not in _published_segments:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def _create(name: str,
+            size: int) -> shared_memory.SharedMemory:
+    segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+    _published_segments.add(name)
+    return segment
+
+
+def _unlink(segment: shared_memory.SharedMemory) -> None:
+    segment.close()
+    segment.unlink()
+    _published_segments.discard(segment.name.lstrip("/"))
+
+
+class SharedInstrMapPublisher:
+    """
+    Publishes versions of an instrument map to shared memory for SharedInstrumentMap readers in other processes.
+
+    Each version is published as a snapshot (see InstrMapSnapshot) in its own shared memory segment named
+    <name>_<generation>, then the generation is written to the small control segment <name> which readers check
+    to pick up the new version. The segments of all but the last two generations are unlinked, readers still
+    attached to an unlinked segment keep a valid view of it until they move on.
+
+    Methods:
+        publish(instr_map: InstrumentMap) -> int: Publishes a new version of the map, returning its generation.
+        close() -> None: Unlinks all the segments of the publisher.
+    """
+    CONTROL = struct.Struct("<Q")  # generation
+
+    def __init__(self,
+                 name: str):
+        """
+        Args:
+            name (str): The name of the control segment readers attach to, keep it short as some platforms limit it.
+        Raises:
+            ValueError: If the name is None or of the wrong type.
+            FileExistsError: If a segment of that name already exists.
+        """
+        if name is None or not isinstance(name, str) or not name:
+            raise ValueError(f"name must be a non-empty string: {name}")
+
+        self.name = name
+        self.generation = 0
+        self._control = _create(name, SharedInstrMapPublisher.CONTROL.size)
+        SharedInstrMapPublisher.CONTROL.pack_into(self._control.buf, 0, self.generation)
+        self._segments = []
+        return
+
+    def publish(self,
+                instr_map: InstrumentMap,
+                agent: IAgent) -> int:
+        """
+        Publish the current state of the given map as a new generation.
+        Args:
+            instr_map (InstrumentMap): The map to publish.
+            agent (Agent): The agent requesting the publish.
+        Returns:
+            int: The generation published.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if instr_map is None or not isinstance(instr_map, InstrumentMap):
+            raise ValueError(f"instr_map must be an instance of InstrumentMap and cannot be None: {instr_map}")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to publish the map)")
+
+        snapshot = io.BytesIO()
+        InstrMapSnapshot.dump(snapshot, instr_map.instr_codes, instr_map._retired_ids())
+        data = snapshot.getbuffer()
+
+        generation = self.generation + 1
+        segment = _create(f"{self.name}_{generation}", len(data))
+        segment.buf[:len(data)] = data
+        data.release()
+        self._segments.append(segment)
+
+        SharedInstrMapPublisher.CONTROL.pack_into(self._control.buf, 0, generation)
+        self.generation = generation
+
+        while len(self._segments) > 2:
+            _unlink(self._segments.pop(0))
+        return generation
+
+    def close(self) -> None:
+        for segment in self._segments + [self._control]:
+            _unlink(segment)
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SharedInstrumentMap(IInstrumentMap):
+    """
+    A read only instrument map that reads, zero copy, the latest version published to shared memory by a
+    SharedInstrMapPublisher, so any number of reader processes share one copy of the map.
+
+    Every call first compares the published generation with the one it is attached to, and if a new version
+    has been published attaches to it, so readers pick up new versions without restarting.
+
+    Attributes:
+        generation (int): The generation of the version currently attached to.
+    Methods:
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        close() -> None: Detaches from shared memory.
+    """
+    MAX_ATTACH_ATTEMPTS = 10
+
+    def __init__(self,
+                 name: str):
+        """
+        Args:
+            name (str): The name the publisher was created with.
+        Raises:
+            ValueError: If the name is None or of the wrong type, or no version has been published yet.
+            FileNotFoundError: If there is no publisher of that name.
+        """
+        if name is None or not isinstance(name, str) or not name:
+            raise ValueError(f"name must be a non-empty string: {name}")
+
+        super().__init__()
+        self.name = name
+        self.generation = 0
+        self._segment = None
+        self._snapshot = None
+        self._control = _attach(name)
+        if not self._published_generation():
+            self._control.close()
+            raise ValueError(f"No version of {name} has been published yet")
+        self._attach()
+        return
+
+    def _published_generation(self) -> int:
+        return SharedInstrMapPublisher.CONTROL.unpack_from(self._control.buf, 0)[0]
+
+    def _attach(self) -> None:
+        # The publisher may unlink a generation between it being read and attached to, so re-read and retry.
+        for _ in range(SharedInstrumentMap.MAX_ATTACH_ATTEMPTS):
+            generation = self._published_generation()
+            try:
+                segment = _attach(f"{self.name}_{generation}")
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            raise FileNotFoundError(f"Could not attach to a published version of {self.name}")
+
+        snapshot = SnapshotInstrumentMap(buffer=segment.buf)
+        self._detach()
+        self._segment, self._snapshot, self.generation = segment, snapshot, generation
+
+    def _detach(self) -> None:
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _current(self) -> SnapshotInstrumentMap:
+        if self._published_generation() != self.generation:
+            self._attach()
+        return self._snapshot
+
+    def close(self) -> None:
+        self._detach()
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def create_instr(self,
+                     agent: IAgent) -> ICode:
+        raise MapIsReadOnly("Cannot create an instrument in a shared memory replica")
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode],
+                        agent: IAgent) -> None:
+        raise MapIsReadOnly("Cannot add codes to a shared memory replica")
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent) -> List[ICode]:
+        """
+        As IInstrumentMap.get_instr_codes, against the latest published version.
+        """
+        return self._current().get_instr_codes(code, agent)
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent) -> ICode:
+        """
+        As IInstrumentMap.get_instr_code_of_type, against the latest published version.
+        """
+        return self._current().get_instr_code_of_type(code, code_scheme, agent)
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        As IInstrumentMap.translate_codes, against the latest published version.
+        """
+        return self._current().translate_codes(codes, code_scheme, agent, source_scheme)
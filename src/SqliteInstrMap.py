@@ -0,0 +1,474 @@
+import sqlite3
+import threading
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from interface.IInstrMap import IInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+
+_SCHEMES = {scheme.num: scheme for scheme in CodeScheme}
+
+
+class SqliteInstrumentMap(IInstrumentMap):
+    """
+    An instrument map held in a local SQLite file rather than in memory, for universes larger than is worth
+    holding in Python dicts, and that survives the process without snapshots or a journal.
+
+    Every code, base codes included, is a row of one table
+        codes (scheme, value, instr_id), primary key (scheme, value), unique index (instr_id, scheme)
+    so a code resolves to its instrument by the primary key, the codes of an instrument are a range of the
+    (instr_id, scheme) index, and the two keys enforce that a code belongs to one instrument and an instrument
+    has one code of each scheme. The table is WITHOUT ROWID so the primary key is the table itself.
+
+    The database is in WAL mode so readers do not block the writer or each other. Each thread has its own
+    connection, opened on its first call, whose statements are prepared once and cached by the sqlite3 module,
+    as every statement is a constant, or one of a few for translate_codes, with bound parameters. Changes are
+    made in BEGIN IMMEDIATE transactions and rolled back if rejected, so a rejected change leaves the map
+    unchanged, and batches are written with executemany. translate_codes resolves a batch a chunk of codes per
+    query rather than a query per code.
+
+    Methods:
+        create_instr() -> Code: Creates a new base instrument code and adds it to the map.
+        create_instrs(n: int) -> List[Code]: Creates n new base instrument codes in one call.
+        add_instr_codes(code: Code, codes: List[Code]) -> None: Adds related codes to an existing base code.
+        get_instr_codes(code: Code) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme) -> List[Code]: Translates a batch of codes.
+        find_codes(code_scheme: CodeScheme, prefix: str, start: str, stop: str, pattern: str) -> Iterator[Tuple[Code, Code]]: Searches the codes of a scheme.
+        load_instrs(records: Iterable[Iterable[Code]]) -> List[Code]: Creates many instruments and their codes all or nothing.
+        close() -> None: Closes the connections of every thread.
+    """
+    # The most values bound to one query, below SQLite's limit on bound parameters.
+    MAX_BATCH = 500
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS codes ("
+              "scheme INTEGER NOT NULL, value TEXT NOT NULL, instr_id INTEGER NOT NULL, "
+              "PRIMARY KEY (scheme, value)) WITHOUT ROWID",
+              "CREATE UNIQUE INDEX IF NOT EXISTS codes_instr ON codes (instr_id, scheme)")
+    NEXT_INSTR_ID = "SELECT COALESCE(MAX(instr_id) + 1, 0) FROM codes"
+    INSERT_CODE = "INSERT INTO codes (scheme, value, instr_id) VALUES (?, ?, ?)"
+    FIND_INSTR = "SELECT instr_id FROM codes WHERE scheme = ? AND value = ?"
+    INSTR_CODES = "SELECT scheme, value FROM codes WHERE instr_id = ? ORDER BY scheme"
+    INSTR_CODE_OF_TYPE = "SELECT value FROM codes WHERE instr_id = ? AND scheme = ?"
+    FOUND_CODES = ("SELECT c.value, b.value FROM codes c JOIN codes b ON b.instr_id = c.instr_id AND b.scheme = 0 "
+                   "WHERE c.scheme = ?")
+
+    def __init__(self,
+                 path: str,
+                 timeout: float = 30.0):
+        """
+        Open the map held in a SQLite file, creating the file and its table if they do not exist.
+        Args:
+            path (str): The database file, which must be a file as each thread opens its own connection.
+            timeout (float): The seconds to wait for another connection's write transaction to finish.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+        """
+        if path is None or not isinstance(path, str) or path == ":memory:":
+            raise ValueError(f"path must be the path of a database file and cannot be None: {path}")
+
+        super().__init__()
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._conn()
+        for statement in SqliteInstrumentMap.SCHEMA:
+            conn.execute(statement)
+        return
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit, transactions are begun explicitly where changes are made. The connection is only used
+            # by this thread, but close may be called from any.
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """
+        Close the connections of every thread, the map cannot be used once closed.
+        """
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _check_agent(self,
+                     agent: IAgent,
+                     role: AgentRole,
+                     action: str) -> None:
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if role == AgentRole.MAINTAINER:
+            permitted = agent.has_required_permissions(AgentRole.MAINTAINER)
+        else:
+            permitted = (agent.has_required_permissions(AgentRole.MAINTAINER) or
+                         agent.has_required_permissions(AgentRole.READER))
+        if not permitted:
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {role} to {action})")
+
+    def _find_instr(self,
+                    conn: sqlite3.Connection,
+                    code: ICode) -> int:
+        row = conn.execute(SqliteInstrumentMap.FIND_INSTR, (code.scheme.num, code.value)).fetchone()
+        if row is None:
+            raise CodeDoesNotExist(f"Code {code} does not exist in the map")
+        return row[0]
+
+    def create_instr(self,
+                     agent: IAgent) -> ICode:
+        """
+        Creates an instrument record in the map and allocates it a new globally unique identifier.
+        Args:
+            agent (Agent): The agent requesting the creation of the instrument.
+        Returns:
+            Code: The base code of the created instrument.
+        Raises:
+            ValueError: If given arguments are null or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        self._check_agent(agent, AgentRole.MAINTAINER, "create an instrument")
+        return self._load_instrs([[]])[0]
+
+    def create_instrs(self,
+                      agent: IAgent,
+                      n: int) -> List[ICode]:
+        """
+        Creates n instrument records in one transaction, allocating their globally unique identifiers as a block.
+        Args:
+            agent (Agent): The agent requesting the creation of the instruments.
+            n (int): The number of instruments to create.
+        Returns:
+            List[Code]: The base codes of the created instruments.
+        Raises:
+            ValueError: If given arguments are null or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        self._check_agent(agent, AgentRole.MAINTAINER, "create an instrument")
+
+        if not isinstance(n, int) or isinstance(n, bool) or n < 0:
+            raise ValueError(f"n must be a non negative integer: {n}")
+
+        return self._load_instrs([[]] * n)
+
+    def load_instrs(self,
+                    records: Iterable[Iterable[ICode]],
+                    agent: IAgent) -> List[ICode]:
+        """
+        Bulk load many new instruments, creating a base code for each record and adding the record's codes to it,
+        all in one transaction so if any record is rejected the map is left unchanged.
+        Args:
+            records (Iterable[Iterable[Code]]): The codes of each instrument to create, one record per instrument.
+            agent (Agent): The agent requesting the load.
+        Returns:
+            List[Code]: The base codes created, parallel to records.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type.
+            ValueError: If a record contains a base code or more than one code of the same scheme.
+            ValueError: If a code already exists in the map or is given in more than one record.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        if records is None:
+            raise ValueError("records cannot be None")
+
+        self._check_agent(agent, AgentRole.MAINTAINER, "create an instrument")
+
+        checked = []
+        for i, record in enumerate(records):
+            if record is None or isinstance(record, (str, ICode)):
+                raise ValueError(
+                    f"record {i} must be an iterable of Code instances, but got {type(record)}")
+            record = list(record)
+            for c in record:
+                if not isinstance(c, ICode):
+                    raise ValueError(
+                        f"record {i} must only contain Code instances, but got {type(c)}")
+                if c.scheme == CodeScheme.BASE:
+                    raise ValueError(
+                        f"record {i} cannot contain base code {c} as base codes are allocated by the load")
+            checked.append(record)
+        return self._load_instrs(checked)
+
+    def _load_instrs(self,
+                     records: List[List[ICode]]) -> List[ICode]:
+        conn = self._conn()
+        base_codes = [Code._trusted(CodeScheme.BASE, value) for value in Code.gen_base_code_values(len(records))]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first_id = conn.execute(SqliteInstrumentMap.NEXT_INSTR_ID).fetchone()[0]
+            rows = []
+            for instr_id, base_code, record in zip(range(first_id, first_id + len(records)), base_codes, records):
+                rows.append((CodeScheme.BASE.num, base_code.value, instr_id))
+                rows.extend((c.scheme.num, c.value, instr_id) for c in record)
+            # The keys of the table reject a code that exists or repeats and a second code of a scheme.
+            conn.executemany(SqliteInstrumentMap.INSERT_CODE, rows)
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK")
+            raise ValueError(
+                f"Cannot load codes that already exist in the map, repeat or give an instrument two codes of a scheme: {e}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return base_codes
+
+    def add_instr_codes(self,
+                        code: ICode,
+                        codes: List[ICode],
+                        agent: IAgent) -> None:
+        """
+        Adds a list of instrument codes to the instrument map for a given base code.
+        Args:
+            code (Code): The base code to which the instruction codes will be added.
+            codes (List[Code]): A list of instrument codes to be added.
+            agent (Agent): The agent requesting the addition of the alternate codes.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type.
+            ValueError: If an instrument code in `codes` already exists in the map with a different base code.
+            ValueError: If the base code already has a different code of the same scheme as one in `codes`.
+            CodeDoesNotExist: If the base `code` does not exist in the instrument map.
+            IncorrectPermissions: If the agent does not have the required permissions to create an instrument.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        conn = self._conn()
+        instr_id = self._find_instr(conn, code)
+
+        if codes is None:
+            raise ValueError("codes cannot be None")
+
+        if not isinstance(codes, List) or not all(isinstance(c, ICode) for c in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
+
+        self._check_agent(agent, AgentRole.MAINTAINER, "create an instrument")
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Validate every code before changing anything so a rejected call leaves the map untouched.
+            new_codes = {}
+            for c in codes:
+                row = conn.execute(SqliteInstrumentMap.FIND_INSTR, (c.scheme.num, c.value)).fetchone()
+                if row is not None:
+                    if row[0] != instr_id:
+                        raise ValueError(
+                            f"Cannot add code for a Code that already exists in the map with a different base code: {c}")
+                    continue
+                curr = conn.execute(SqliteInstrumentMap.INSTR_CODE_OF_TYPE, (instr_id, c.scheme.num)).fetchone()
+                curr_value = new_codes[c.scheme].value if c.scheme in new_codes else curr and curr[0]
+                if curr_value is not None and curr_value != c.value:
+                    raise ValueError(
+                        f"Cannot add code {c} as {code} already has code {Code(c.scheme, curr_value)} of the same scheme")
+                new_codes[c.scheme] = c
+            conn.executemany(SqliteInstrumentMap.INSERT_CODE,
+                             [(c.scheme.num, c.value, instr_id) for c in new_codes.values()])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent) -> List[ICode]:
+        """
+        Retrieve all code schemes values that map to the given code.
+        Args:
+            code (Code): The code to search for.
+            agent (Agent): The agent requesting the get of the alternate codes.
+        Returns:
+            List[Code]: The codes of the instrument, the base code first.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            CodeDoesNotExist: If the `code` does not exist in the map.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                "code must be an instance of Code and cannot be None")
+
+        self._check_agent(agent, AgentRole.READER, "read the map")
+
+        conn = self._conn()
+        rows = conn.execute(SqliteInstrumentMap.INSTR_CODES, (self._find_instr(conn, code),)).fetchall()
+        return [Code._trusted(_SCHEMES[scheme_num], value) for scheme_num, value in rows]
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent) -> ICode:
+        """
+        Retrieve the instrument code of a specific type.
+        Args:
+            code (Code): The code to search for.
+            code_scheme (CodeScheme): The code scheme to match.
+            agent (Agent): The agent requesting the get of the alternate codes.
+        Returns:
+            Code: The matching code of the specified type.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            CodeDoesNotExist: If the `code` does not exist in the map.
+            OnlyBaseCodeDefined: If the instrument has no code of the given scheme.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                "code must be an instance of Code and cannot be None")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        self._check_agent(agent, AgentRole.READER, "read the map")
+
+        conn = self._conn()
+        row = conn.execute(SqliteInstrumentMap.INSTR_CODE_OF_TYPE,
+                           (self._find_instr(conn, code), code_scheme.num)).fetchone()
+        if row is None:
+            raise OnlyBaseCodeDefined(
+                f"Code {code} has no matching codes for code scheme {code_scheme}")
+        return Code._trusted(code_scheme, row[0])
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None) -> List[Optional[ICode]]:
+        """
+        Translate a batch of codes to their code of the given scheme, a query per chunk of codes of a scheme.
+        Args:
+            codes (Sequence[Code | str]): The codes to translate, or raw code values if source_scheme is given.
+            code_scheme (CodeScheme): The code scheme to translate to.
+            agent (Agent): The agent requesting the translation.
+            source_scheme (CodeScheme): Optional, the code scheme of the raw code values given in codes.
+        Returns:
+            List[Code]: Parallel to codes, the matching code of the given scheme or None if the code does not
+                        exist in the map or the instrument has no code of the given scheme.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        if source_scheme is not None and not isinstance(source_scheme, CodeScheme):
+            raise ValueError(
+                "source code sheme must be an instance of CodeScheme")
+
+        self._check_agent(agent, AgentRole.READER, "translate codes")
+
+        # The distinct values of each source scheme, to look up in chunks.
+        by_scheme = {}
+        keys = []
+        for c in codes:
+            if source_scheme is not None:
+                key = (source_scheme.num, c)
+            elif isinstance(c, ICode):
+                key = (c.scheme.num, c.value)
+            else:
+                raise ValueError(
+                    f"codes must all be instances of Code when no source scheme is given, but got {type(c)}")
+            by_scheme.setdefault(key[0], set()).add(key[1])
+            keys.append(key)
+
+        conn = self._conn()
+        translated = {}
+        for scheme_num, values in by_scheme.items():
+            values = list(values)
+            for i in range(0, len(values), SqliteInstrumentMap.MAX_BATCH):
+                chunk = values[i:i + SqliteInstrumentMap.MAX_BATCH]
+                rows = conn.execute(
+                    "SELECT c.value, t.value FROM codes c JOIN codes t ON t.instr_id = c.instr_id AND t.scheme = ? "
+                    f"WHERE c.scheme = ? AND c.value IN ({','.join('?' * len(chunk))})",
+                    [code_scheme.num, scheme_num] + chunk)
+                for value, target_value in rows:
+                    translated[(scheme_num, value)] = Code._trusted(code_scheme, target_value)
+        return [translated.get(key) for key in keys]
+
+    def find_codes(self,
+                   code_scheme: CodeScheme,
+                   agent: IAgent,
+                   prefix: Optional[str] = None,
+                   start: Optional[str] = None,
+                   stop: Optional[str] = None,
+                   pattern: Optional[str] = None) -> Iterator[Tuple[ICode, ICode]]:
+        """
+        Search the codes of a scheme by prefix, by range or by glob pattern, as InstrumentMap.find_codes, as a
+        range scan of the primary key.
+        Args:
+            code_scheme (CodeScheme): The scheme of the codes to search.
+            agent (Agent): The agent requesting the search.
+            prefix (str): Optional, the prefix of the code values to find.
+            start (str): Optional, the first code value of the range to find, from the first code if not given.
+            stop (str): Optional, the code value the range to find stops before, to the last code if not given.
+            pattern (str): Optional, a case sensitive glob pattern of * ? and [] the code values must match.
+        Returns:
+            Iterator[Tuple[Code, Code]]: The (code, base code) of each code found in code value order.
+        Raises:
+            ValueError: If parameters are None or of the wrong type, or more than one kind of search is given.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        for arg in (prefix, start, stop, pattern):
+            if arg is not None and not isinstance(arg, str):
+                raise ValueError(f"prefix, start, stop and pattern must be strings: {arg}")
+
+        if sum((prefix is not None, start is not None or stop is not None, pattern is not None)) > 1:
+            raise ValueError("Only one of prefix, start and stop or pattern can be given")
+
+        self._check_agent(agent, AgentRole.READER, "search the map")
+
+        query = SqliteInstrumentMap.FOUND_CODES
+        params = [code_scheme.num]
+        if prefix:
+            start, stop = prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        if pattern is not None:
+            # SQLite's GLOB negates a set with ^ where fnmatch uses !.
+            query += " AND c.value GLOB ?"
+            params.append(pattern.replace("[!", "[^"))
+        if start is not None:
+            query += " AND c.value >= ?"
+            params.append(start)
+        if stop is not None:
+            query += " AND c.value < ?"
+            params.append(stop)
+        query += " ORDER BY c.value"
+        return self._found_codes(code_scheme, query, params)
+
+    def _found_codes(self,
+                     code_scheme: CodeScheme,
+                     query: str,
+                     params: list) -> Iterator[Tuple[ICode, ICode]]:
+        for value, base_value in self._conn().execute(query, params):
+            yield Code._trusted(code_scheme, value), Code._trusted(CodeScheme.BASE, base_value)
@@ -0,0 +1,203 @@
+import bisect
+import math
+import random
+from typing import Dict, Iterator, List, Optional
+from interface.ICode import ICode
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.CodeValidator import CodeValidator
+
+
+_ALNUM = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_SEDOL_CHARS = "0123456789BCDFGHJKLMNPQRSTVWXYZ"
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_MASK64 = (1 << 64) - 1
+# Codes are encoded 3 characters at a time from these tables of every 3 character string.
+_ALNUM3 = [a + b + c for a in _ALNUM for b in _ALNUM for c in _ALNUM]
+_SEDOL_CHARS3 = [a + b + c for a in _SEDOL_CHARS for b in _SEDOL_CHARS for c in _SEDOL_CHARS]
+
+
+class SyntheticUniverse:
+    """
+    A seeded generator of a synthetic universe of instruments and their ISIN, SEDOL and RIC codes, for tests and
+    benchmarks at any size up to tens of millions of instruments.
+
+    Instrument i's codes are derived from i alone, through a seeded permutation of i (i * a + b mod m, a coprime
+    to m) for each scheme, so codes are unique by construction with no set of already generated codes, and any
+    instrument can be regenerated without generating those before it.
+
+    Codes follow the real formats and distributions closely enough to exercise hashing and string handling
+    realistically:
+        ISIN: country (weighted by listings) + 9 character national id + Luhn check digit, GB ISINs embed the SEDOL.
+        SEDOL: 6 characters of digits and consonants + weighted check digit.
+        RIC: 1 to 6 letter ticker + exchange suffix of the country.
+    and not every instrument has a code of every scheme, see COVERAGE.
+
+    Methods:
+        record(i: int) -> List[Code]: The codes of instrument i.
+        records() -> Iterator[List[Code]]: The codes of every instrument in order, as taken by InstrumentMap.load_instrs.
+    Static Methods:
+        isin_check_digit(body: str) -> str: The check digit of the first 11 characters of an ISIN.
+        sedol_check_digit(body: str) -> str: The check digit of the first 6 characters of a SEDOL.
+    """
+    # country, weight, RIC exchange suffixes
+    COUNTRIES = [("US", 34, ["N", "O"]), ("JP", 9, ["T"]), ("GB", 8, ["L"]), ("CN", 7, ["SS", "SZ"]),
+                 ("CA", 5, ["TO"]), ("HK", 5, ["HK"]), ("IN", 5, ["NS", "BO"]), ("DE", 5, ["DE"]),
+                 ("FR", 4, ["PA"]), ("AU", 4, ["AX"]), ("KR", 4, ["KS"]), ("TW", 4, ["TW"]),
+                 ("NL", 3, ["AS"]), ("SG", 3, ["SI"])]
+    # The fraction of instruments with a code of each scheme, every GB instrument has a SEDOL as its ISIN embeds it.
+    COVERAGE = {CodeScheme.ISIN: 0.95, CodeScheme.SEDOL: 0.85, CodeScheme.RIC: 0.6}
+
+    def __init__(self,
+                 size: int,
+                 seed: int = 0,
+                 coverage: Optional[Dict[CodeScheme, float]] = None):
+        """
+        Args:
+            size (int): The number of instruments in the universe.
+            seed (int): The seed, universes of the same size, seed and coverage have the same codes.
+            coverage (Dict[CodeScheme, float]): Optional, the fraction of instruments with a code of each scheme,
+                                                overriding COVERAGE for the schemes given.
+        Raises:
+            ValueError: If parameters are of the wrong type or out of range.
+        """
+        if not isinstance(size, int) or size < 0:
+            raise ValueError(f"size must be a non negative integer: {size}")
+
+        if not isinstance(seed, int):
+            raise ValueError(f"seed must be an integer: {seed}")
+
+        self.size = size
+        self.seed = seed
+        self.coverage = dict(SyntheticUniverse.COVERAGE)
+        for scheme, fraction in (coverage or {}).items():
+            if scheme not in self.coverage or not 0.0 <= fraction <= 1.0:
+                raise ValueError(f"coverage must be a fraction for ISIN, SEDOL or RIC: {scheme} {fraction}")
+            self.coverage[scheme] = fraction
+        # Thresholds against 16 bit draws, so coverage is decided with integer compares.
+        self._thresholds = [int(self.coverage[scheme] * 0x10000)
+                            for scheme in (CodeScheme.ISIN, CodeScheme.SEDOL, CodeScheme.RIC)]
+
+        total = sum(weight for _, weight, _ in SyntheticUniverse.COUNTRIES)
+        self._country_bounds = []
+        cumulative = 0
+        for _, weight, _ in SyntheticUniverse.COUNTRIES:
+            cumulative += weight
+            self._country_bounds.append(cumulative * 0x10000 // total)
+
+        ticker_len = 1
+        while SyntheticUniverse._ticker_count(ticker_len) < max(size, 26 ** 4):
+            ticker_len += 1
+
+        rng = random.Random(seed)
+        self._isin_perm = SyntheticUniverse._permutation(rng, 36 ** 9)
+        self._sedol_perm = SyntheticUniverse._permutation(rng, 31 ** 6)
+        self._ticker_perm = SyntheticUniverse._permutation(rng, SyntheticUniverse._ticker_count(ticker_len))
+        self._salt = rng.getrandbits(64)
+        return
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def _ticker_count(max_len: int) -> int:
+        return sum(26 ** n for n in range(1, max_len + 1))
+
+    @staticmethod
+    def _permutation(rng: random.Random,
+                     modulus: int) -> tuple:
+        multiplier = rng.randrange(1, modulus)
+        while math.gcd(multiplier, modulus) != 1:
+            multiplier = rng.randrange(1, modulus)
+        return multiplier, rng.randrange(modulus), modulus
+
+    @staticmethod
+    def _permute(i: int,
+                 perm: tuple) -> int:
+        multiplier, offset, modulus = perm
+        return (i * multiplier + offset) % modulus
+
+    @staticmethod
+    def _encode(n: int,
+                chars3: List[str],
+                width: int) -> str:
+        """
+        Encode n as width characters, width a multiple of 3, from the table of 3 character strings.
+        """
+        base = len(chars3)
+        encoded = ""
+        for _ in range(width // 3):
+            n, digits = divmod(n, base)
+            encoded = chars3[digits] + encoded
+        return encoded
+
+    def _mix(self,
+             i: int) -> int:
+        # splitmix64 of the salted index, the per instrument source of country and coverage draws.
+        x = (i + self._salt + 0x9E3779B97F4A7C15) & _MASK64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return x ^ (x >> 31)
+
+    @staticmethod
+    def isin_check_digit(body: str) -> str:
+        """
+        The Luhn check digit of an ISIN's first 11 characters, see CodeValidator.
+        """
+        return CodeValidator.isin_check_digit(body)
+
+    @staticmethod
+    def sedol_check_digit(body: str) -> str:
+        """
+        The check digit of a SEDOL's first 6 characters, see CodeValidator.
+        """
+        return CodeValidator.sedol_check_digit(body)
+
+    def record(self,
+               i: int) -> List[ICode]:
+        """
+        The codes of instrument i, in the order SEDOL, ISIN, RIC, of those it has.
+        Raises:
+            IndexError: If i is not an instrument of the universe.
+        """
+        if not 0 <= i < self.size:
+            raise IndexError(f"Instrument {i} is not in a universe of {self.size}")
+
+        draws = self._mix(i)
+        country, _, suffixes = SyntheticUniverse.COUNTRIES[
+            bisect.bisect_right(self._country_bounds, draws & 0xFFFF)]
+        isin_threshold, sedol_threshold, ric_threshold = self._thresholds
+
+        codes = []
+        sedol = None
+        if country == "GB" or (draws >> 16) & 0xFFFF < sedol_threshold:
+            body = SyntheticUniverse._encode(SyntheticUniverse._permute(i, self._sedol_perm),
+                                             _SEDOL_CHARS3, 6)
+            sedol = body + SyntheticUniverse.sedol_check_digit(body)
+            codes.append(Code._trusted(CodeScheme.SEDOL, sedol))
+
+        if (draws >> 32) & 0xFFFF < isin_threshold:
+            if sedol is not None and country == "GB":
+                body = "GB00" + sedol
+            else:
+                body = country + SyntheticUniverse._encode(SyntheticUniverse._permute(i, self._isin_perm),
+                                                           _ALNUM3, 9)
+            codes.append(Code._trusted(CodeScheme.ISIN, body + SyntheticUniverse.isin_check_digit(body)))
+
+        if (draws >> 48) & 0xFFFF < ric_threshold:
+            # Tickers are the bijective base 26 numbers A..Z, AA..ZZ, ... so are unique and of 1 to n letters.
+            n = SyntheticUniverse._permute(i, self._ticker_perm) + 1
+            ticker = []
+            while n:
+                n, letter = divmod(n - 1, 26)
+                ticker.append(_LETTERS[letter])
+            suffix = suffixes[(draws >> 20) % len(suffixes)]
+            codes.append(Code._trusted(CodeScheme.RIC, "".join(reversed(ticker)) + "." + suffix))
+        return codes
+
+    def records(self) -> Iterator[List[ICode]]:
+        """
+        Yield the codes of every instrument in order.
+        """
+        for i in range(self.size):
+            yield self.record(i)
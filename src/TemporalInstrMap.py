@@ -0,0 +1,483 @@
+from bisect import bisect_right
+from datetime import date
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+from interface.ICode import ICode
+from interface.IAgent import IAgent
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.AgentRole import AgentRole
+from src.InstrMap import InstrumentMap
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+# Dates are held as proleptic Gregorian ordinals, the start of all time and the open end of an interval.
+_MIN = date.min.toordinal()
+_MAX = date.max.toordinal() + 1
+_LATEST = _MAX - 1
+
+
+class _Timeline:
+    """
+    The history of one link, an alias's instrument or an instrument's alias of one scheme, as the non overlapping
+    [start, end) intervals of each value, sorted by start so the value at a date is a bisect away.
+
+    Each version the link was changed in keeps its own intervals, so the link can also be read as it was known at
+    an earlier version, again with a bisect. Changes copy the intervals of one link, of which there are only a few.
+    """
+    __slots__ = ("versions", "states")
+
+    def __init__(self,
+                 value: Optional[object]):
+        # Seeded at version 0 with a value valid for all time, if the link was added without dates.
+        self.versions = [0]
+        self.states = [([_MIN], [_MAX], [value]) if value is not None else ([], [], [])]
+
+    def at(self,
+           t: int,
+           known_at: Optional[int] = None) -> Optional[object]:
+        if known_at is None:
+            starts, ends, values = self.states[-1]
+        else:
+            k = bisect_right(self.versions, known_at) - 1
+            if k < 0:
+                return None
+            starts, ends, values = self.states[k]
+        i = bisect_right(starts, t) - 1
+        if i >= 0 and t < ends[i]:
+            return values[i]
+        return None
+
+    def intervals(self,
+                  known_at: Optional[int] = None) -> List[Tuple[int, int, object]]:
+        k = len(self.versions) - 1 if known_at is None else bisect_right(self.versions, known_at) - 1
+        return list(zip(*self.states[k])) if k >= 0 else []
+
+    def set(self,
+            start: int,
+            end: int,
+            value: Optional[object],
+            version: int) -> List[Tuple[int, int, object]]:
+        """
+        Set the value over [start, end), None to clear it, returning the (start, end, value) intervals displaced.
+        """
+        segments = []
+        displaced = []
+        for s, e, v in zip(*self.states[-1]):
+            if e <= start or s >= end:
+                segments.append((s, e, v))
+                continue
+            if v != value:
+                displaced.append((max(s, start), min(e, end), v))
+            if s < start:
+                segments.append((s, start, v))
+            if e > end:
+                segments.append((end, e, v))
+        if value is not None:
+            segments.append((start, end, value))
+        segments.sort()
+
+        merged = []
+        for s, e, v in segments:
+            if merged and merged[-1][1] == s and merged[-1][2] == v:
+                merged[-1] = (merged[-1][0], e, v)
+            else:
+                merged.append((s, e, v))
+        state = ([s for s, _, _ in merged], [e for _, e, _ in merged], [v for _, _, v in merged])
+
+        if self.versions[-1] == version:
+            self.states[-1] = state
+        else:
+            self.versions.append(version)
+            self.states.append(state)
+        return displaced
+
+
+class TemporalInstrumentMap(InstrumentMap):
+    """
+    An InstrumentMap that also keeps the history of every alias, so codes can be resolved as of a date, for
+    instance to resolve historical trades by the identifiers they were booked with.
+
+    link_instr_codes links codes to an instrument over a validity interval. Unlike add_instr_codes it can re-link
+    an alias that belongs to another instrument, or give an instrument a new alias of a scheme it already has, the
+    new link replaces the old ones over its interval and they are kept either side of it. Each call is a new
+    version of the map, and lookups can be made as the map was known at a version as well as as of a date.
+
+    Each link with a history has a timeline, sorted intervals per version, in each direction: alias -> instrument
+    and instrument -> alias of a scheme. An as of lookup is a dict lookup and two bisects per hop, so it stays
+    logarithmic in the length of a link's history whatever the size of the map. Codes added without dates, by
+    add_instr_codes or load_instrs, are valid for all time, known from version 0, and cost nothing extra.
+
+    Lookups without as_of or known_at answer from the latest links, those with no end date, exactly as
+    InstrumentMap. Only the latest links are saved by snapshots and the history is not journaled. merge_instr and
+    split_instr move codes without dates, so they refuse to move a code with a history.
+
+    Attributes:
+        version (int): The version of the map, the number of link_instr_codes calls made.
+    Methods:
+        link_instr_codes(code: Code, codes: List[Code], valid_from: date, valid_to: date) -> int: Links codes to an instrument over an interval.
+        get_instr_codes(code: Code, as_of: date, known_at: int) -> List[Code]: Retrieves all related codes for a given code.
+        get_instr_code_of_type(code: Code, code_scheme: CodeScheme, as_of: date, known_at: int) -> Code: Retrieves a specific type of code for a given code.
+        translate_codes(codes: Sequence[Code | str], code_scheme: CodeScheme, as_of: date | Sequence[date], known_at: int) -> List[Code]: Translates a batch of codes.
+        get_code_history(code: Code, known_at: int) -> List[Tuple[date, date, Code]]: The instruments of an alias over time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.version = 0
+        self._alias_history = {str(scheme): {} for scheme in CodeScheme}
+        self._instr_history = {str(scheme): {} for scheme in CodeScheme}
+        return
+
+    @staticmethod
+    def _ordinal(day: Optional[date],
+                 default: int) -> int:
+        if day is None:
+            return default
+        if not isinstance(day, date):
+            raise ValueError(f"dates must be instances of date: {day}")
+        return day.toordinal()
+
+    @staticmethod
+    def _date(ordinal: int) -> Optional[date]:
+        return date.fromordinal(ordinal) if _MIN < ordinal < _MAX else None
+
+    @staticmethod
+    def _check_reader(agent: IAgent) -> None:
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not (agent.has_required_permissions(AgentRole.MAINTAINER) or agent.has_required_permissions(AgentRole.READER)):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.READER} to read the map)")
+
+    def _alias_timeline(self,
+                        scheme: str,
+                        value: str) -> _Timeline:
+        timeline = self._alias_history[scheme].get(value)
+        if timeline is None:
+            timeline = self._alias_history[scheme][value] = _Timeline(self.instr_map[scheme].get(value))
+        return timeline
+
+    def _instr_timeline(self,
+                        scheme: str,
+                        instr_id: int) -> _Timeline:
+        timeline = self._instr_history[scheme].get(instr_id)
+        if timeline is None:
+            timeline = self._instr_history[scheme][instr_id] = _Timeline(self.instr_codes[scheme][instr_id])
+        return timeline
+
+    def _check_no_history(self,
+                          codes: Iterable[ICode],
+                          instr_id: Optional[int] = None) -> None:
+        for c in codes:
+            if c.value in self._alias_history[str(c.scheme)] or \
+                    (instr_id is not None and instr_id in self._instr_history[str(c.scheme)]):
+                raise ValueError(
+                    f"Cannot add code {c} without dates as it has a history, use link_instr_codes")
+
+    def _add_instr_codes(self,
+                         instr_id: int,
+                         codes: List[ICode],
+                         agent_id: str) -> None:
+        self._check_no_history(codes, instr_id)
+        super()._add_instr_codes(instr_id, codes, agent_id)
+
+    def _merge_instr(self,
+                     instr_id: int,
+                     retired_id: int,
+                     agent_id: str) -> None:
+        moved = [c for c in self._instr_codes_of(retired_id) if c.scheme != CodeScheme.BASE]
+        self._check_no_history(moved, instr_id)
+        self._check_no_history(moved, retired_id)
+        super()._merge_instr(instr_id, retired_id, agent_id)
+
+    def _split_instr(self,
+                     instr_id: int,
+                     codes: List[ICode],
+                     new_base_value: str,
+                     agent_id: str) -> ICode:
+        self._check_no_history(codes, instr_id)
+        return super()._split_instr(instr_id, codes, new_base_value, agent_id)
+
+    def _load_instrs(self,
+                     records: Iterable[Iterable[ICode]],
+                     agent_id: str) -> List[ICode]:
+        records = [record if record is None or isinstance(record, (str, ICode)) else list(record)
+                   for record in records]
+        for record in records:
+            if isinstance(record, list):
+                self._check_no_history(c for c in record if isinstance(c, ICode))
+        return super()._load_instrs(records, agent_id)
+
+    def link_instr_codes(self,
+                         code: ICode,
+                         codes: List[ICode],
+                         agent: IAgent,
+                         valid_from: Optional[date],
+                         valid_to: Optional[date] = None) -> int:
+        """
+        Link codes to an instrument from valid_from up to, but not including, valid_to. Over that interval each
+        code replaces any other link of the code and any other code of its scheme the instrument had.
+        Args:
+            code (Code): The base code, or a latest alias, of the instrument to link the codes to.
+            codes (List[Code]): The codes to link, at most one per scheme.
+            agent (Agent): The agent requesting the link.
+            valid_from (date): The first date of the link, None for the start of time.
+            valid_to (date): Optional, the date the link ends on, open ended if not given.
+        Returns:
+            int: The version of the map the link was made in.
+        Raises:
+            ValueError: If any paramater is none or of the wrong type.
+            ValueError: If codes contains a base code or more than one code of the same scheme.
+            ValueError: If valid_to is not after valid_from.
+            CodeDoesNotExist: If `code` does not exist in the instrument map.
+            IncorrectPermissions: If the agent does not have the required permissions to maintain the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None: {code}")
+
+        if codes is None or not isinstance(codes, List) or not all(isinstance(c, ICode) for c in codes):
+            raise ValueError(
+                f"codes must be a list of Code instances, but got {type(codes)}")
+
+        if agent is None or not isinstance(agent, IAgent):
+            raise ValueError(
+                f"agent must be an instance of Agent and cannot be None: {agent}")
+
+        if not agent.has_required_permissions(AgentRole.MAINTAINER):
+            raise IncorrectPermissions(
+                f"Agent {agent} does not have the required permissions {AgentRole.MAINTAINER} to link codes)")
+
+        start = self._ordinal(valid_from, _MIN)
+        end = self._ordinal(valid_to, _MAX)
+        if end <= start:
+            raise ValueError(f"valid_to {valid_to} must be after valid_from {valid_from}")
+
+        schemes = set()
+        for c in codes:
+            if c.scheme == CodeScheme.BASE:
+                raise ValueError(f"Cannot link base code {c} as base codes are allocated by the map")
+            if c.scheme in schemes:
+                raise ValueError(f"Cannot link more than one code of scheme {c.scheme}: {c}")
+            schemes.add(c.scheme)
+
+        instr_id = self._find_instr(code)
+        self.version += 1
+        version = self.version
+
+        touched_aliases = set()
+        touched_instrs = set()
+        for c in codes:
+            scheme = str(c.scheme)
+            touched_aliases.add((scheme, c.value))
+            touched_instrs.add((scheme, instr_id))
+            # The alias leaves the instruments it was linked to over the interval, and the instrument drops the
+            # aliases of the scheme it had, the two timelines of a link always mirror each other.
+            for s, e, old_id in self._alias_timeline(scheme, c.value).set(start, end, instr_id, version):
+                self._instr_timeline(scheme, old_id).set(s, e, None, version)
+                touched_instrs.add((scheme, old_id))
+            for s, e, old_value in self._instr_timeline(scheme, instr_id).set(start, end, c.value, version):
+                self._alias_timeline(scheme, old_value).set(s, e, None, version)
+                touched_aliases.add((scheme, old_value))
+
+        # The latest links are those open at the end of time, put them in the indexes InstrumentMap reads.
+        for scheme, value in touched_aliases:
+            latest_id = self._alias_history[scheme][value].at(_LATEST)
+            if latest_id is None:
+                self.instr_map[scheme].pop(value, None)
+            else:
+                self.instr_map[scheme][value] = latest_id
+                self._index_codes(scheme, (value,))
+        for scheme, touched_id in touched_instrs:
+            self.instr_codes[scheme][touched_id] = self._instr_history[scheme][touched_id].at(_LATEST)
+        return version
+
+    def _find_instr_at(self,
+                       code: ICode,
+                       t: int,
+                       known_at: Optional[int]) -> Optional[int]:
+        timeline = self._alias_history[str(code.scheme)].get(code.value)
+        if timeline is None:
+            return self.instr_map[str(code.scheme)].get(code.value)
+        return timeline.at(t, known_at)
+
+    def _code_value_at(self,
+                       scheme: str,
+                       instr_id: int,
+                       t: int,
+                       known_at: Optional[int]) -> Optional[str]:
+        timeline = self._instr_history[scheme].get(instr_id)
+        if timeline is None:
+            return self.instr_codes[scheme][instr_id]
+        return timeline.at(t, known_at)
+
+    def _check_as_of(self,
+                     code: ICode,
+                     as_of: Optional[date],
+                     known_at: Optional[int]) -> Tuple[int, int]:
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None but got type {type(code)}")
+
+        if known_at is not None and not isinstance(known_at, int):
+            raise ValueError(f"known_at must be a version of the map: {known_at}")
+
+        t = self._ordinal(as_of, _LATEST)
+        instr_id = self._find_instr_at(code, t, known_at)
+        if instr_id is None:
+            raise CodeDoesNotExist(f"Code {code} does not exist in the map as of {as_of}")
+        return t, instr_id
+
+    def get_instr_codes(self,
+                        code: ICode,
+                        agent: IAgent,
+                        as_of: Optional[date] = None,
+                        known_at: Optional[int] = None) -> List[ICode]:
+        """
+        As InstrumentMap.get_instr_codes, with the codes of the instrument as of a date.
+        Args:
+            as_of (date): Optional, the date to resolve the codes as of, the latest links if not given.
+            known_at (int): Optional, the version of the map to resolve the codes as they were known at.
+        """
+        if as_of is None and known_at is None:
+            return super().get_instr_codes(code, agent)
+
+        t, instr_id = self._check_as_of(code, as_of, known_at)
+        self._check_reader(agent)
+
+        all_codes = []
+        for scheme in CodeScheme:
+            value = self._code_value_at(str(scheme), instr_id, t, known_at)
+            if value is not None:
+                all_codes.append(Code._trusted(scheme, value))
+        return all_codes
+
+    def get_instr_code_of_type(self,
+                               code: ICode,
+                               code_scheme: CodeScheme,
+                               agent: IAgent,
+                               as_of: Optional[date] = None,
+                               known_at: Optional[int] = None) -> ICode:
+        """
+        As InstrumentMap.get_instr_code_of_type, with the code of the instrument as of a date.
+        Args:
+            as_of (date): Optional, the date to resolve the code as of, the latest links if not given.
+            known_at (int): Optional, the version of the map to resolve the code as it was known at.
+        """
+        if as_of is None and known_at is None:
+            return super().get_instr_code_of_type(code, code_scheme, agent)
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        t, instr_id = self._check_as_of(code, as_of, known_at)
+        self._check_reader(agent)
+
+        matching_value = self._code_value_at(str(code_scheme), instr_id, t, known_at)
+        if matching_value is not None:
+            return Code._trusted(code_scheme, matching_value)
+
+        raise OnlyBaseCodeDefined(
+            f"Code {code} has no matching codes for code scheme {code_scheme} as of {as_of}")
+
+    def translate_codes(self,
+                        codes: Sequence[Union[ICode, str]],
+                        code_scheme: CodeScheme,
+                        agent: IAgent,
+                        source_scheme: Optional[CodeScheme] = None,
+                        as_of: Optional[Union[date, Sequence[date]]] = None,
+                        known_at: Optional[int] = None) -> List[Optional[ICode]]:
+        """
+        As InstrumentMap.translate_codes, with the codes translated as of a date, or each as of its own date.
+        Args:
+            as_of (date | Sequence[date]): Optional, the date to translate all the codes as of, or a date per code
+                                           parallel to codes, e.g. the trade dates. The latest links if not given.
+            known_at (int): Optional, the version of the map to translate the codes as they were known at.
+        """
+        if as_of is None and known_at is None:
+            return super().translate_codes(codes, code_scheme, agent, source_scheme)
+
+        if codes is None or isinstance(codes, str):
+            raise ValueError(
+                f"codes must be a sequence of Code or code values and cannot be None: {codes}")
+
+        if code_scheme is None or not isinstance(code_scheme, CodeScheme):
+            raise ValueError(
+                "code sheme must be an instance of CodeScheme and cannot be None")
+
+        if source_scheme is not None and not isinstance(source_scheme, CodeScheme):
+            raise ValueError(
+                "source code sheme must be an instance of CodeScheme")
+
+        if known_at is not None and not isinstance(known_at, int):
+            raise ValueError(f"known_at must be a version of the map: {known_at}")
+
+        self._check_reader(agent)
+
+        codes = list(codes)
+        if as_of is None or isinstance(as_of, date):
+            times = [self._ordinal(as_of, _LATEST)] * len(codes)
+        else:
+            times = [self._ordinal(day, _LATEST) for day in as_of]
+            if len(times) != len(codes):
+                raise ValueError(f"as_of must be a date or a date per code, got {len(times)} dates for {len(codes)} codes")
+
+        target = str(code_scheme)
+        target_history = self._instr_history[target]
+        target_values = self.instr_codes[target]
+        translated = []
+        for c, t in zip(codes, times):
+            if source_scheme is not None:
+                scheme, value = str(source_scheme), c
+            elif isinstance(c, ICode):
+                scheme, value = str(c.scheme), c.value
+            else:
+                raise ValueError(
+                    f"codes must all be instances of Code when no source scheme is given, but got {type(c)}")
+            timeline = self._alias_history[scheme].get(value)
+            instr_id = self.instr_map[scheme].get(value) if timeline is None else timeline.at(t, known_at)
+            if instr_id is None:
+                translated.append(None)
+                continue
+            timeline = target_history.get(instr_id)
+            matching_value = target_values[instr_id] if timeline is None else timeline.at(t, known_at)
+            translated.append(Code._trusted(code_scheme, matching_value) if matching_value is not None else None)
+        return translated
+
+    def get_code_history(self,
+                         code: ICode,
+                         agent: IAgent,
+                         known_at: Optional[int] = None) -> List[Tuple[Optional[date], Optional[date], ICode]]:
+        """
+        The instruments an alias has been linked to over time.
+        Args:
+            code (Code): The alias code.
+            agent (Agent): The agent requesting the history.
+            known_at (int): Optional, the version of the map to give the history as it was known at.
+        Returns:
+            List[Tuple[date, date, Code]]: The (valid_from, valid_to, base code) of each link in date order,
+                                           None for the start or end of time.
+        Raises:
+            ValueError: If parameters are None or of the wrong type.
+            IncorrectPermissions: If the agent does not have the required permissions to read the map.
+        """
+        if code is None or not isinstance(code, ICode):
+            raise ValueError(
+                f"code must be an instance of Code and cannot be None but got type {type(code)}")
+
+        self._check_reader(agent)
+
+        timeline = self._alias_history[str(code.scheme)].get(code.value)
+        if timeline is None:
+            instr_id = self.instr_map[str(code.scheme)].get(code.value)
+            intervals = [(_MIN, _MAX, instr_id)] if instr_id is not None else []
+        else:
+            intervals = timeline.intervals(known_at)
+        base_values = self.instr_codes[str(CodeScheme.BASE)]
+        return [(self._date(start), self._date(end), Code._trusted(CodeScheme.BASE, base_values[instr_id]))
+                for start, end, instr_id in intervals]
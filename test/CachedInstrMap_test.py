@@ -0,0 +1,225 @@
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.CachedInstrMap import CachedInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+
+
+class _RacingInstrumentMap(InstrumentMap):
+    """
+    Runs a change once, just after the next lookup has read the map and before its result is returned.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.change = None
+
+    def _run_change(self):
+        change, self.change = self.change, None
+        if change is not None:
+            change()
+
+    def get_instr_code_of_type(self, code, code_scheme, agent):
+        try:
+            return super().get_instr_code_of_type(code, code_scheme, agent)
+        finally:
+            self._run_change()
+
+    def translate_codes(self, codes, code_scheme, agent, source_scheme=None):
+        try:
+            return super().translate_codes(codes, code_scheme, agent, source_scheme)
+        finally:
+            self._run_change()
+
+
+class TestCachedInstrumentMap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def _populate(self, instrMap, num_instr):
+        all_tests = []
+        for _ in range(num_instr):
+            test_code = instrMap.create_instr(agent=self.agent_maint)
+            test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                              Code(CodeScheme.ISIN, TestUtil.genISIN())]
+            instrMap.add_instr_codes(code=test_code, codes=test_alt_codes, agent=self.agent_maint)
+            all_tests.append([test_code] + test_alt_codes)
+        return all_tests
+
+    def test_hits(self):
+        instrMap = CachedInstrumentMap(InstrumentMap())
+        all_tests = self._populate(instrMap, 10)
+        for _ in range(3):
+            for codes in all_tests:
+                self.assertEqual(instrMap.get_instr_code_of_type(codes[1], CodeScheme.ISIN, self.agent_reader),
+                                 codes[2])
+        stats = instrMap.stats()
+        self.assertEqual(stats["misses"], 10)
+        self.assertEqual(stats["hits"], 20)
+        self.assertEqual(stats["size"], 10)
+        with self.assertRaises(ValueError):
+            instrMap.get_instr_code_of_type(all_tests[0][1], CodeScheme.ISIN, None)
+
+    def test_negative_entries(self):
+        instrMap = CachedInstrumentMap(InstrumentMap())
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        missing_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        for _ in range(2):
+            with self.assertRaises(OnlyBaseCodeDefined):
+                instrMap.get_instr_code_of_type(test_code, CodeScheme.ISIN, self.agent_reader)
+            with self.assertRaises(CodeDoesNotExist):
+                instrMap.get_instr_code_of_type(missing_code, CodeScheme.BASE, self.agent_reader)
+        self.assertEqual(instrMap.stats()["hits"], 2)
+
+        # Adding the codes invalidates both negative entries.
+        instrMap.add_instr_codes(test_code, [missing_code], self.agent_maint)
+        self.assertEqual(instrMap.get_instr_code_of_type(test_code, CodeScheme.ISIN, self.agent_reader),
+                         missing_code)
+        self.assertEqual(instrMap.get_instr_code_of_type(missing_code, CodeScheme.BASE, self.agent_reader),
+                         test_code)
+
+    def test_precise_invalidation(self):
+        instrMap = CachedInstrumentMap(InstrumentMap())
+        all_tests = self._populate(instrMap, 5)
+        for codes in all_tests:
+            with self.assertRaises(OnlyBaseCodeDefined):
+                instrMap.get_instr_code_of_type(codes[1], CodeScheme.RIC, self.agent_reader)
+            instrMap.get_instr_code_of_type(codes[2], CodeScheme.BASE, self.agent_reader)
+        self.assertEqual(instrMap.stats()["size"], 10)
+
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        instrMap.add_instr_codes(all_tests[0][0], [ric_code], self.agent_maint)
+        stats = instrMap.stats()
+        self.assertEqual(stats["invalidations"], 2)
+        self.assertEqual(stats["size"], 8)
+        self.assertEqual(instrMap.get_instr_code_of_type(all_tests[0][1], CodeScheme.RIC, self.agent_reader),
+                         ric_code)
+
+    def test_merge_and_split_invalidate(self):
+        instrMap = CachedInstrumentMap(InstrumentMap())
+        (base_code, sedol_code, isin_code), = self._populate(instrMap, 1)
+        retired_code = instrMap.create_instr(agent=self.agent_maint)
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        instrMap.add_instr_codes(retired_code, [ric_code], self.agent_maint)
+        self.assertEqual(instrMap.get_instr_code_of_type(retired_code, CodeScheme.BASE, self.agent_reader),
+                         retired_code)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(sedol_code, CodeScheme.RIC, self.agent_reader)
+
+        instrMap.merge_instr(base_code, retired_code, self.agent_maint)
+        self.assertEqual(instrMap.get_instr_code_of_type(retired_code, CodeScheme.BASE, self.agent_reader),
+                         base_code)
+        self.assertEqual(instrMap.get_instr_code_of_type(sedol_code, CodeScheme.RIC, self.agent_reader),
+                         ric_code)
+
+        new_code = instrMap.split_instr(base_code, [ric_code], self.agent_maint)
+        self.assertEqual(instrMap.get_instr_code_of_type(ric_code, CodeScheme.BASE, self.agent_reader), new_code)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(retired_code, CodeScheme.RIC, self.agent_reader)
+
+    def test_add_invalidates_retired_codes(self):
+        instrMap = CachedInstrumentMap(InstrumentMap())
+        base_code = instrMap.create_instr(agent=self.agent_maint)
+        retired_code = instrMap.create_instr(agent=self.agent_maint)
+        instrMap.merge_instr(base_code, retired_code, self.agent_maint)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(retired_code, CodeScheme.ISIN, self.agent_reader)
+
+        # The negative entry keyed on the retired base code is dropped along with those of the instrument.
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        instrMap.add_instr_codes(base_code, [isin_code], self.agent_maint)
+        self.assertEqual(instrMap.get_instr_code_of_type(retired_code, CodeScheme.ISIN, self.agent_reader),
+                         isin_code)
+        self.assertEqual(instrMap.get_instr_code_of_type(retired_code, CodeScheme.ISIN, self.agent_reader),
+                         instrMap.instr_map.get_instr_code_of_type(retired_code, CodeScheme.ISIN, self.agent_reader))
+
+    def test_stale_lookup_is_not_cached(self):
+        racingMap = _RacingInstrumentMap()
+        instrMap = CachedInstrumentMap(racingMap)
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+
+        # The lookup reads no ISIN, then the ISIN is added and invalidated before the lookup caches its result.
+        racingMap.change = lambda: instrMap.add_instr_codes(test_code, [isin_code], self.agent_maint)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(test_code, CodeScheme.ISIN, self.agent_reader)
+        self.assertEqual(instrMap.get_instr_code_of_type(test_code, CodeScheme.ISIN, self.agent_reader), isin_code)
+        self.assertEqual(instrMap.stats()["size"], 1)
+
+        racingMap.change = instrMap.clear
+        self.assertEqual(instrMap.translate_codes([isin_code], CodeScheme.ISIN, self.agent_reader), [isin_code])
+        self.assertEqual(instrMap.translate_codes([test_code], CodeScheme.ISIN, self.agent_reader), [isin_code])
+        self.assertEqual(instrMap.stats()["size"], 1)
+
+    def test_eviction(self):
+        instrMap = CachedInstrumentMap(InstrumentMap(), maxsize=4)
+        all_tests = self._populate(instrMap, 6)
+        for codes in all_tests:
+            instrMap.get_instr_code_of_type(codes[0], CodeScheme.SEDOL, self.agent_reader)
+        stats = instrMap.stats()
+        self.assertEqual(stats["size"], 4)
+        self.assertEqual(stats["evictions"], 2)
+
+        # The least recently used are evicted, a hit refreshes an entry.
+        instrMap.get_instr_code_of_type(all_tests[2][0], CodeScheme.SEDOL, self.agent_reader)
+        instrMap.get_instr_code_of_type(all_tests[0][0], CodeScheme.SEDOL, self.agent_reader)
+        instrMap.get_instr_code_of_type(all_tests[2][0], CodeScheme.SEDOL, self.agent_reader)
+        stats = instrMap.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["evictions"], 3)
+        with self.assertRaises(ValueError):
+            CachedInstrumentMap(InstrumentMap(), maxsize=0)
+
+    def test_translate_codes(self):
+        instrMap = CachedInstrumentMap(InstrumentMap())
+        all_tests = self._populate(instrMap, 10)
+        missing_code = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        sedol_codes = [codes[1] for codes in all_tests] + [missing_code]
+        expected = [codes[2] for codes in all_tests] + [None]
+        self.assertEqual(instrMap.translate_codes(sedol_codes, CodeScheme.ISIN, self.agent_reader), expected)
+        self.assertEqual(instrMap.translate_codes(sedol_codes, CodeScheme.ISIN, self.agent_reader), expected)
+        self.assertEqual(instrMap.translate_codes([c.value for c in sedol_codes], CodeScheme.ISIN,
+                                                  self.agent_reader, CodeScheme.SEDOL), expected)
+        stats = instrMap.stats()
+        self.assertEqual(stats["hits"], 20)
+        self.assertEqual(stats["misses"], 13)
+
+    def test_direct_changes(self):
+        wrapped = InstrumentMap()
+        instrMap = CachedInstrumentMap(wrapped)
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(test_code, CodeScheme.ISIN, self.agent_reader)
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        wrapped.add_instr_codes(test_code, [isin_code], self.agent_maint)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(test_code, CodeScheme.ISIN, self.agent_reader)
+        instrMap.invalidate(test_code, self.agent_reader)
+        self.assertEqual(instrMap.get_instr_code_of_type(test_code, CodeScheme.ISIN, self.agent_reader), isin_code)
+        instrMap.clear()
+        self.assertEqual(instrMap.stats()["size"], 0)
+
+    def test_load_instrs(self):
+        instrMap = CachedInstrumentMap(InstrumentMap())
+        sedol_code = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        with self.assertRaises(CodeDoesNotExist):
+            instrMap.get_instr_code_of_type(sedol_code, CodeScheme.BASE, self.agent_reader)
+        base_codes = instrMap.load_instrs(iter([iter([sedol_code])]), self.agent_maint)
+        self.assertEqual(instrMap.get_instr_code_of_type(sedol_code, CodeScheme.BASE, self.agent_reader),
+                         base_codes[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
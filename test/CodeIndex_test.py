@@ -0,0 +1,43 @@
+import unittest
+from src.CodeIndex import CodeIndex
+
+
+class TestCodeIndex(unittest.TestCase):
+
+    def test_queries(self):
+        live = {value: i for i, value in enumerate(["AAPL.O", "AAPL.OQ", "AMZN.O", "IBM.N", "AAP.N"])}
+        code_index = CodeIndex(live)
+        self.assertEqual(list(code_index.prefix("AAPL")), ["AAPL.O", "AAPL.OQ"])
+        self.assertEqual(list(code_index.range("AAPL.OQ", "IBM.N")), ["AAPL.OQ", "AMZN.O"])
+        self.assertEqual(list(code_index.range(stop="AAPL")), ["AAP.N"])
+        self.assertEqual(list(code_index.match("A*.O")), ["AAPL.O", "AMZN.O"])
+        self.assertEqual(list(code_index.match("[AI]?[MP]*")), ["AAP.N", "AAPL.O", "AAPL.OQ", "IBM.N"])
+        self.assertEqual(len(list(code_index.prefix(""))), 5)
+
+    def test_inserts_and_removals(self):
+        live = {"B": 0}
+        code_index = CodeIndex(live)
+        for value in ["C", "A", "B"]:
+            live[value] = len(live)
+            code_index.add(value)
+        self.assertEqual(list(code_index.range()), ["A", "B", "C"])
+        del live["B"]
+        self.assertEqual(list(code_index.range()), ["A", "C"])
+        live["D"] = 4
+        code_index.extend(["D"])
+        self.assertEqual(code_index._run, ["A", "C", "D"])
+        self.assertEqual(list(code_index.range("B")), ["C", "D"])
+        # The added values are folded in to the main run once there are enough of them.
+        added = ["E"] + [f"F{i:05d}" for i in range(CodeIndex.MIN_FOLD)]
+        live.update((value, len(live)) for value in added)
+        code_index.extend(["A"] + added)
+        self.assertEqual(code_index._run, [])
+        self.assertEqual(list(code_index.range(stop="F")), ["A", "C", "D", "E"])
+        code_index.add("AB")
+        live["AB"] = len(live)
+        self.assertEqual(code_index._run, ["AB"])
+        self.assertEqual(list(code_index.range(stop="F")), ["A", "AB", "C", "D", "E"])
+        self.assertEqual(len(list(code_index.prefix("F"))), CodeIndex.MIN_FOLD)
+
+if __name__ == '__main__':
+    unittest.main()
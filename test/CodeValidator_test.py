@@ -0,0 +1,59 @@
+import unittest
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.CodeValidator import CodeValidator
+from src.SyntheticUniverse import SyntheticUniverse
+from exception.InvalidCode import InvalidCode
+
+
+class TestCodeValidator(unittest.TestCase):
+
+    def test_is_valid(self):
+        # Real codes, Apple Inc, BAE Systems and an Australian government bond.
+        for value in ("US0378331005", "AU0000XVGZA3"):
+            self.assertTrue(CodeValidator.is_valid(CodeScheme.ISIN, value))
+        for value in ("0263494", "B0YBKJ7"):
+            self.assertTrue(CodeValidator.is_valid(CodeScheme.SEDOL, value))
+        for value in ("VOD.L", "BRKb.N", "0005.HK", ".FTSE", "EUR="):
+            self.assertTrue(CodeValidator.is_valid(CodeScheme.RIC, value))
+        self.assertTrue(CodeValidator.is_valid(CodeScheme.BASE, Code.gen_base_code_value()))
+
+        for value in ("US0378331006", "us0378331005", "US037833100", "1S0378331005", "US03783310O5"):
+            self.assertFalse(CodeValidator.is_valid(CodeScheme.ISIN, value))
+        for value in ("0263495", "A0YBKJ7", "026349", "02634944"):
+            self.assertFalse(CodeValidator.is_valid(CodeScheme.SEDOL, value))
+        for value in ("", "VOD L", "VOD..L", "VOD.LONDON"):
+            self.assertFalse(CodeValidator.is_valid(CodeScheme.RIC, value))
+        self.assertFalse(CodeValidator.is_valid(CodeScheme.BASE, "not-a-uuid"))
+        self.assertFalse(CodeValidator.is_valid(CodeScheme.ISIN, None))
+
+    def test_validated_code(self):
+        self.assertEqual(Code.validated(CodeScheme.ISIN, "US0378331005"), Code(CodeScheme.ISIN, "US0378331005"))
+        with self.assertRaises(InvalidCode):
+            Code.validated(CodeScheme.SEDOL, "0263495")
+        with self.assertRaises(ValueError):
+            Code.validated(CodeScheme.SEDOL, "")
+        with self.assertRaises(ValueError):
+            CodeValidator.is_valid("ISIN", "US0378331005")
+
+    def test_valid_mask(self):
+        records = list(SyntheticUniverse(5000, seed=3).records())
+        for scheme in (CodeScheme.SEDOL, CodeScheme.ISIN, CodeScheme.RIC):
+            values = [c.value for record in records for c in record if c.scheme == scheme]
+            self.assertTrue(all(CodeValidator.valid_mask(scheme, values)))
+            changed = [value[:i] + c + value[i + 1:] for value in values[:50] for i in range(len(value))
+                       for c in "07AZa" if c != value[i]] + ["", "X", "é" * len(values[0]), None]
+            self.assertEqual(CodeValidator.valid_mask(scheme, changed),
+                             [CodeValidator.is_valid(scheme, value) for value in changed])
+            # Any one digit of a check digit code changed to another is caught.
+            if scheme != CodeScheme.RIC:
+                changed = [value[:i] + c + value[i + 1:] for value in values[:50] for i in range(len(value))
+                           for c in "0123456789" if value[i] <= "9" and c != value[i]]
+                self.assertFalse(any(CodeValidator.valid_mask(scheme, changed)))
+        self.assertEqual(CodeValidator.valid_mask(CodeScheme.ISIN, []), [])
+        with self.assertRaises(ValueError):
+            CodeValidator.valid_mask(CodeScheme.ISIN, "US0378331005")
+
+
+if __name__ == '__main__':
+    unittest.main()
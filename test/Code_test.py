@@ -37,6 +37,16 @@ class TestCode(unittest.TestCase):
         except ValueError:
             self.fail("gen_base_code_value() did not return a valid UUID")
 
+    def test_gen_base_code_values(self):
+        base_code_values = Code.gen_base_code_values(1000) + Code.gen_base_code_values(1000)
+        self.assertEqual(len(set(base_code_values)), 2000)
+        for base_code_value in base_code_values[::97]:
+            self.assertEqual(uuid.UUID(base_code_value).version, 4)
+            self.assertEqual(str(uuid.UUID(base_code_value)), base_code_value)
+        self.assertEqual(Code.gen_base_code_values(0), [])
+        with self.assertRaises(ValueError):
+            Code.gen_base_code_values(-1)
+
     def test_str(self):
         self.assertEqual(str(self.code), f"scheme: {
                          self.code_scheme} : value: {self.code_value}")
@@ -54,6 +64,33 @@ class TestCode(unittest.TestCase):
         dict[self.code] = self.code
         self.assertTrue(self.code in dict)
 
+    def test_not_eq_other_scheme(self):
+        other_code = Code(CodeScheme.ISIN, self.code_value)
+        self.assertFalse(self.code == other_code)
+        self.assertEqual(len({self.code, other_code}), 2)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.code, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.code.value = "54321"
+
+    def test_of(self):
+        code = Code.of(self.code_scheme, self.code_value)
+        self.assertEqual(code, self.code)
+        self.assertIs(Code.of(self.code_scheme, self.code_value), code)
+        self.assertIsNot(Code.of(CodeScheme.ISIN, self.code_value), code)
+
+    def test_of_invalid(self):
+        with self.assertRaises(ValueError):
+            Code.of("InvalidScheme", self.code_value)
+        with self.assertRaises(ValueError):
+            Code.of(self.code_scheme, "")
+
+    def test_trusted(self):
+        code = Code._trusted(self.code_scheme, self.code_value)
+        self.assertEqual(code, self.code)
+        self.assertEqual(hash(code), hash(self.code))
+
 
 if __name__ == '__main__':
     unittest.main()
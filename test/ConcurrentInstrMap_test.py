@@ -0,0 +1,239 @@
+import os
+import tempfile
+import threading
+import unittest
+from TestUtil import TestUtil
+from src.ConcurrentInstrMap import ConcurrentInstrumentMap
+from src.InstrMap import InstrumentMap
+from src.InstrMapJournal import InstrMapJournal
+from src.InstrMapChangeFeed import InstrMapChangeFeed
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class TestConcurrentInstrumentMap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def test_create_and_add(self):
+        instrMap = ConcurrentInstrumentMap()
+        with self.assertRaises(ValueError):
+            instrMap.create_instr(agent=None)
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.create_instr(agent=self.agent_reader)
+
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                          Code(CodeScheme.ISIN, TestUtil.genISIN())]
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.add_instr_codes(test_code, test_alt_codes, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            instrMap.add_instr_codes(test_code, None, agent=self.agent_maint)
+        instrMap.add_instr_codes(test_code, test_alt_codes, agent=self.agent_maint)
+        instrMap.add_instr_codes(test_code, test_alt_codes, agent=self.agent_maint)
+        self.assertEqual(instrMap.version, 2)
+
+        for code_to_test in [test_code] + test_alt_codes:
+            self.assertEqual(instrMap.get_instr_codes(
+                code=code_to_test, agent=self.agent_reader), [test_code] + test_alt_codes)
+        self.assertEqual(instrMap.get_instr_code_of_type(
+            code=test_alt_codes[0], code_scheme=CodeScheme.ISIN, agent=self.agent_reader), test_alt_codes[1])
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(
+                code=test_code, code_scheme=CodeScheme.RIC, agent=self.agent_reader)
+        with self.assertRaises(CodeDoesNotExist):
+            instrMap.get_instr_codes(
+                code=Code(CodeScheme.RIC, TestUtil.genRIC()), agent=self.agent_reader)
+
+        new_test_code = instrMap.create_instr(agent=self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.add_instr_codes(new_test_code, test_alt_codes, agent=self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.add_instr_codes(
+                test_code, [Code(CodeScheme.ISIN, TestUtil.genISIN())], agent=self.agent_maint)
+
+        translated = instrMap.translate_codes(
+            codes=[test_alt_codes[1].value, "NotAnIsin"], code_scheme=CodeScheme.SEDOL,
+            agent=self.agent_reader, source_scheme=CodeScheme.ISIN)
+        self.assertEqual(translated, [test_alt_codes[0], None])
+        translated = instrMap.translate_codes(
+            codes=[test_code, new_test_code], code_scheme=CodeScheme.ISIN, agent=self.agent_reader)
+        self.assertEqual(translated, [test_alt_codes[1], None])
+
+    def test_readers_keep_their_version(self):
+        instrMap = ConcurrentInstrumentMap()
+        base_codes = instrMap.create_instrs(agent=self.agent_maint, n=5)
+        isin_codes = [Code(CodeScheme.ISIN, TestUtil.genISIN()) for _ in base_codes]
+        sedol_code = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        self.assertEqual(instrMap.version, 1)
+        self.assertEqual(list(instrMap.find_codes(CodeScheme.ISIN, agent=self.agent_reader)), [])
+
+        chunks = instrMap.export_instrs(agent=self.agent_reader, chunk_size=2)
+        first_chunk = next(chunks)
+        for base_code, isin_code in zip(base_codes, isin_codes):
+            instrMap.add_instr_codes(base_code, [isin_code], agent=self.agent_maint)
+        # A change that fails part way is never published.
+        with self.assertRaises(ValueError):
+            instrMap.add_instr_codes(base_codes[0], [sedol_code, isin_codes[1]], agent=self.agent_maint)
+        self.assertEqual(instrMap.version, 6)
+
+        # The export started before the changes sees none of them.
+        rows = first_chunk + [row for chunk in chunks for row in chunk]
+        self.assertEqual(rows, [(base_code, {}) for base_code in base_codes])
+        with self.assertRaises(CodeDoesNotExist):
+            instrMap.get_instr_codes(code=sedol_code, agent=self.agent_reader)
+        self.assertEqual(list(instrMap.find_codes(CodeScheme.ISIN, agent=self.agent_reader)),
+                         sorted(zip(isin_codes, base_codes), key=lambda found: found[0].value))
+
+    def test_journal_merge_and_split(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            snapshot_path = os.path.join(tmp_dir, "instr_map.snap")
+            journal_path = os.path.join(tmp_dir, "instr_map.journal")
+            instrMap = ConcurrentInstrumentMap(
+                InstrumentMap.recover(snapshot_path, journal_path, agent=self.agent_maint))
+            records = [[Code(CodeScheme.SEDOL, TestUtil.genSEDOL()), Code(CodeScheme.ISIN, TestUtil.genISIN())],
+                       [Code(CodeScheme.RIC, TestUtil.genRIC())]]
+            base_code, retired_code = instrMap.load_instrs(records, agent=self.agent_maint)
+            (sedol_code, isin_code), (ric_code,) = records
+            instrMap.merge_instr(base_code, ric_code, agent=self.agent_maint)
+            new_code = instrMap.split_instr(isin_code, [sedol_code], agent=self.agent_maint)
+            self.assertEqual(instrMap.get_instr_codes(code=retired_code, agent=self.agent_reader),
+                             [base_code, isin_code, ric_code])
+            self.assertEqual(instrMap.get_retired_codes(code=base_code, agent=self.agent_reader), [retired_code])
+            self.assertEqual(instrMap.translate_codes(
+                codes=[sedol_code], code_scheme=CodeScheme.BASE, agent=self.agent_reader), [new_code])
+
+            instrMap.checkpoint(snapshot_path, agent=self.agent_maint)
+            instrMap._state.journal.close()
+            self.assertEqual(list(InstrMapJournal.records(journal_path)), [])
+            recovered = InstrumentMap.recover(snapshot_path, journal_path, agent=self.agent_maint)
+            self.assertEqual(recovered.get_instr_codes(code=retired_code, agent=self.agent_reader),
+                             [base_code, isin_code, ric_code])
+            recovered.journal.close()
+        with self.assertRaises(ValueError):
+            ConcurrentInstrumentMap(instrMap)
+
+    def test_feed_subscribers_read_the_change(self):
+        feed = InstrMapChangeFeed()
+        instrMap = ConcurrentInstrumentMap(InstrumentMap(feed=feed))
+        seen = []
+        feed.subscribe(lambda event: seen.append((event.op, instrMap.get_instr_codes(event.base_code,
+                                                                                     self.agent_reader))))
+
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        instrMap.add_instr_codes(test_code, [isin_code], agent=self.agent_maint)
+        loaded_code, = instrMap.load_instrs([[Code(CodeScheme.SEDOL, TestUtil.genSEDOL())]], agent=self.agent_maint)
+        instrMap.merge_instr(test_code, loaded_code, agent=self.agent_maint)
+        self.assertEqual([op for op, _ in seen], [InstrMapChangeFeed.CREATE, InstrMapChangeFeed.ADD,
+                                                  InstrMapChangeFeed.CREATE, InstrMapChangeFeed.MERGE])
+        self.assertEqual(seen[0][1], [test_code])
+        self.assertEqual(seen[1][1], [test_code, isin_code])
+        self.assertEqual(seen[2][1][0], loaded_code)
+        self.assertEqual(len(seen[2][1]), 2)
+        self.assertEqual(seen[3][1], instrMap.get_instr_codes(test_code, self.agent_reader))
+        self.assertEqual(feed.last_seq, 4)
+
+        # A change that is rejected is neither published to readers nor to the feed.
+        with self.assertRaises(ValueError):
+            instrMap.load_instrs([[isin_code]], agent=self.agent_maint)
+        self.assertEqual(feed.last_seq, 4)
+
+    def test_write_cost_does_not_grow_with_size(self):
+        copied = []
+        for num_instr in (1000, 100000):
+            plainMap = InstrumentMap()
+            plainMap.create_instrs(self.agent_maint, num_instr)
+            instrMap = ConcurrentInstrumentMap(plainMap)
+            instrMap.create_instr(agent=self.agent_maint)
+            test_code = instrMap.create_instr(agent=self.agent_maint)
+            instrMap.add_instr_codes(test_code, [Code(CodeScheme.RIC, TestUtil.genRIC())], agent=self.agent_maint)
+            # The nodes copied by the last write are those owned by the dicts and lists of the published version.
+            state = instrMap._state
+            copied.append(sum(len(codes._owned)
+                              for codes in list(state.instr_map.values()) + list(state.instr_codes.values())))
+        # A hundred times more instruments adds at most a level to the trees, a node more copied per dict and list.
+        self.assertLessEqual(copied[1], copied[0] + 2 * len(CodeScheme))
+        self.assertLessEqual(copied[1], 4 * len(CodeScheme))
+
+    def test_concurrent_writers_map_code_once(self):
+        instrMap = ConcurrentInstrumentMap()
+        base_codes = [instrMap.create_instr(agent=self.agent_maint) for _ in range(8)]
+        contested_codes = [Code(CodeScheme.ISIN, TestUtil.genISIN()) for _ in range(50)]
+        barrier = threading.Barrier(len(base_codes))
+
+        def writer(base_code):
+            barrier.wait()
+            for c in contested_codes:
+                try:
+                    instrMap.add_instr_codes(base_code, [c], agent=self.agent_maint)
+                except ValueError:
+                    pass
+
+        threads = [threading.Thread(target=writer, args=(b,)) for b in base_codes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Every base code can hold only one ISIN, so exactly one writer wins each of the first codes it adds.
+        owners = {}
+        for base_code in base_codes:
+            codes = instrMap.get_instr_codes(code=base_code, agent=self.agent_reader)
+            for c in codes[1:]:
+                self.assertNotIn(c, owners)
+                owners[c] = base_code
+        for c, base_code in owners.items():
+            self.assertEqual(instrMap.get_instr_code_of_type(
+                code=c, code_scheme=CodeScheme.BASE, agent=self.agent_reader), base_code)
+
+    def test_readers_see_whole_changes(self):
+        instrMap = ConcurrentInstrumentMap()
+        updates = []
+        for _ in range(200):
+            updates.append((instrMap.create_instr(agent=self.agent_maint),
+                            [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                             Code(CodeScheme.ISIN, TestUtil.genISIN())]))
+        done = threading.Event()
+        failures = []
+
+        def reader():
+            while not done.is_set():
+                for base_code, alt_codes in updates:
+                    codes = instrMap.get_instr_codes(code=base_code, agent=self.agent_reader)
+                    if len(codes) not in (1, 3):
+                        failures.append(codes)
+                    for c in alt_codes:
+                        try:
+                            instrMap.get_instr_code_of_type(
+                                code=c, code_scheme=CodeScheme.ISIN, agent=self.agent_reader)
+                        except CodeDoesNotExist:
+                            pass
+                        except OnlyBaseCodeDefined:
+                            failures.append(c)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for t in readers:
+            t.start()
+        for base_code, alt_codes in updates:
+            instrMap.add_instr_codes(base_code, alt_codes, agent=self.agent_maint)
+        done.set()
+        for t in readers:
+            t.join()
+        self.assertEqual(failures, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.InstrMapChangeFeed import InstrMapChangeFeed
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.ChangesNoLongerHeld import ChangesNoLongerHeld
+
+
+class TestInstrMapChangeFeed(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+
+    def setUp(self):
+        self.feed = InstrMapChangeFeed(max_events=4)
+        self.instrMap = InstrumentMap(feed=self.feed)
+
+    def test_changes_are_published(self):
+        seen = []
+        self.feed.subscribe(seen.append)
+        base_code = self.instrMap.create_instr(agent=self.agent_maint)
+        sedol = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        self.instrMap.add_instr_codes(base_code, [sedol], self.agent_maint)
+        # Adding codes the instrument already has is not a change.
+        self.instrMap.add_instr_codes(base_code, [sedol], self.agent_maint)
+        isin = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        [loaded_code] = self.instrMap.load_instrs([[isin]], self.agent_maint)
+
+        self.assertEqual([(e.seq, e.op, e.base_code, e.codes) for e in seen],
+                         [(1, InstrMapChangeFeed.CREATE, base_code, ()),
+                          (2, InstrMapChangeFeed.ADD, base_code, (sedol,)),
+                          (3, InstrMapChangeFeed.CREATE, loaded_code, (isin,))])
+        self.assertTrue(all(e.agent_id == self.agent_maint.id() for e in seen))
+        self.assertEqual(self.feed.last_seq, 3)
+        self.assertEqual(self.feed.since(1), seen[1:])
+
+    def test_merge_and_split_are_published(self):
+        sedol = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        isin = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        base_code, retired_code = self.instrMap.load_instrs([[sedol], [isin]], self.agent_maint)
+        self.instrMap.merge_instr(base_code, retired_code, self.agent_maint)
+        new_code = self.instrMap.split_instr(base_code, [isin], self.agent_maint)
+        self.assertEqual([(e.op, e.base_code, e.codes) for e in self.feed.since(2)],
+                         [(InstrMapChangeFeed.MERGE, base_code, (retired_code, isin)),
+                          (InstrMapChangeFeed.SPLIT, base_code, (new_code, isin))])
+
+    def test_resume_and_unsubscribe(self):
+        for _ in range(3):
+            self.instrMap.create_instr(agent=self.agent_maint)
+        seen = []
+        token = self.feed.subscribe(seen.append, after_seq=1)
+        self.instrMap.create_instr(agent=self.agent_maint)
+        self.assertEqual([e.seq for e in seen], [2, 3, 4])
+        self.feed.unsubscribe(token)
+        self.instrMap.create_instr(agent=self.agent_maint)
+        self.assertEqual(len(seen), 3)
+
+        # Only the last max_events changes are held.
+        for _ in range(4):
+            self.instrMap.create_instr(agent=self.agent_maint)
+        with self.assertRaises(ChangesNoLongerHeld):
+            self.feed.since(1)
+        with self.assertRaises(ChangesNoLongerHeld):
+            self.feed.subscribe(seen.append, after_seq=0)
+        self.assertEqual(self.feed.since(self.feed.last_seq), [])
+
+    def test_failing_callback_is_unsubscribed(self):
+        def fail(event):
+            raise RuntimeError("Consumer failed")
+        seen = []
+        token = self.feed.subscribe(fail)
+        self.feed.subscribe(seen.append)
+        self.instrMap.create_instr(agent=self.agent_maint)
+        self.instrMap.create_instr(agent=self.agent_maint)
+        self.assertEqual(len(seen), 2)
+        self.assertIsInstance(self.feed.callback_errors[token], RuntimeError)
+
+    def test_async_iterator(self):
+        self.instrMap.create_instr(agent=self.agent_maint)
+
+        async def consume():
+            changes = self.feed.changes(after_seq=0)
+            seen = [await changes.__anext__()]
+            # The iterator waits for changes made once it has caught up.
+            next_change = asyncio.ensure_future(changes.__anext__())
+            await asyncio.sleep(0)
+            self.assertFalse(next_change.done())
+            base_code = self.instrMap.create_instr(agent=self.agent_maint)
+            seen.append(await asyncio.wait_for(next_change, timeout=5))
+            await changes.aclose()
+            return seen, base_code
+
+        seen, base_code = asyncio.run(consume())
+        self.assertEqual([e.seq for e in seen], [1, 2])
+        self.assertEqual(seen[1].base_code, base_code)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            InstrMapChangeFeed(max_events=0)
+        with self.assertRaises(ValueError):
+            self.feed.subscribe(None)
+        with self.assertRaises(ValueError):
+            self.feed.since("1")
+        with self.assertRaises(ValueError):
+            self.feed.changes(after_seq=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
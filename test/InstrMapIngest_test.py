@@ -0,0 +1,154 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.InstrMapIngest import InstrMapIngest
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class TestInstrMapIngest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.instrMap = InstrumentMap()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_csv_wide(self):
+        records = [(TestUtil.genSEDOL(), TestUtil.genISIN()) for _ in range(50)]
+        path = os.path.join(self.tmp_dir.name, "vendor.csv.gz")
+        with gzip.open(path, "wt", newline="") as f:
+            f.write("SEDOL,ISIN,Price\n")
+            for sedol, isin in records:
+                f.write(f"{sedol},{isin},1.0\n")
+
+        ingest = InstrMapIngest(self.instrMap, self.agent_maint, batch_size=7, chunk_size=5)
+        report = ingest.ingest(path)
+        self.assertEqual((report.rows, report.records, report.created, report.rejected), (50, 50, 50, 0))
+        for sedol, isin in records:
+            self.assertEqual(self.instrMap.get_instr_code_of_type(Code(CodeScheme.SEDOL, sedol), CodeScheme.ISIN,
+                                                                  self.agent_reader), Code(CodeScheme.ISIN, isin))
+
+        # Ingesting again changes nothing.
+        report = ingest.ingest(path)
+        self.assertEqual((report.created, report.updated, report.unchanged), (0, 0, 50))
+
+    def test_jsonl_long_grouped_by_key(self):
+        sedol, isin, ric = TestUtil.genSEDOL(), TestUtil.genISIN(), TestUtil.genRIC()
+        lines = [json.dumps({"key": "v1", "scheme": "sedol", "code": sedol}),
+                 json.dumps({"key": "v1", "scheme": "ISIN", "code": isin}),
+                 "",
+                 json.dumps({"key": "v2", "scheme": "RIC", "code": ric})]
+        report = InstrMapIngest(self.instrMap, self.agent_maint).ingest_lines(lines, "jsonl")
+        self.assertEqual((report.rows, report.records, report.created), (3, 2, 2))
+        base_code = self.instrMap.get_instr_code_of_type(Code(CodeScheme.ISIN, isin), CodeScheme.BASE,
+                                                         self.agent_reader)
+        self.assertEqual(self.instrMap.get_instr_codes(Code(CodeScheme.SEDOL, sedol), self.agent_reader),
+                         [base_code, Code(CodeScheme.SEDOL, sedol), Code(CodeScheme.ISIN, isin)])
+
+    def test_updates_and_rejects(self):
+        base_code = self.instrMap.create_instr(agent=self.agent_maint)
+        sedol = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        other_isin = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        self.instrMap.add_instr_codes(base_code, [sedol], self.agent_maint)
+        self.instrMap.load_instrs([[other_isin]], self.agent_maint)
+        isin, new_isin, new_sedol = TestUtil.genISIN(), TestUtil.genISIN(), TestUtil.genSEDOL()
+        lines = ["BASE,SEDOL,ISIN",
+                 f",{sedol.value},{isin}",  # Adds an ISIN to an existing instrument.
+                 f",{sedol.value},{new_isin}",  # The instrument now has a different ISIN.
+                 f",{sedol.value},{other_isin.value}",  # The codes are of two instruments.
+                 f",{new_sedol},{new_isin}",  # A new instrument, the ISIN rejected above is not in the map.
+                 f"{Code.gen_base_code_value()},,{TestUtil.genISIN()}",  # An unknown base code.
+                 f",{TestUtil.genSEDOL()}"]  # Too few fields.
+        ingest = InstrMapIngest(self.instrMap, self.agent_maint, max_rejects=3)
+        report = ingest.ingest_lines(lines, "csv")
+        self.assertEqual((report.records, report.updated, report.created, report.rejected), (6, 1, 1, 4))
+        self.assertEqual(report.reject_reasons, {"conflicts with a code of its instrument": 1,
+                                                 "codes belong to different instruments": 1,
+                                                 "base code does not exist": 1,
+                                                 "wrong number of fields": 1})
+        # Records rejected as they are read are reported before those rejected as their batch is applied.
+        self.assertEqual([reject["line"] for reject in report.rejects], [7, 3, 4])
+        self.assertEqual(report.rejects[1]["codes"], [("SEDOL", sedol.value), ("ISIN", new_isin)])
+        self.assertEqual(self.instrMap.get_instr_codes(sedol, self.agent_reader),
+                         [base_code, sedol, Code(CodeScheme.ISIN, isin)])
+        self.assertEqual(self.instrMap.get_instr_code_of_type(Code(CodeScheme.ISIN, new_isin), CodeScheme.SEDOL,
+                                                              self.agent_reader), Code(CodeScheme.SEDOL, new_sedol))
+
+    def test_repeated_codes_in_a_batch(self):
+        sedol, isin, ric = TestUtil.genSEDOL(), TestUtil.genISIN(), TestUtil.genRIC()
+        lines = [json.dumps({"SEDOL": sedol}),
+                 json.dumps({"SEDOL": sedol, "ISIN": isin}),
+                 json.dumps({"ISIN": isin, "RIC": ric}),
+                 json.dumps({"ISIN": isin, "Scheme": "RIC"}),
+                 json.dumps({"SEDOL": sedol, "RIC": TestUtil.genRIC()}),
+                 "[1, 2]",
+                 "{not json"]
+        report = InstrMapIngest(self.instrMap, self.agent_maint).ingest_lines(lines, "jsonl")
+        self.assertEqual((report.created, report.updated, report.unchanged, report.rejected), (1, 2, 1, 3))
+        self.assertEqual(report.reject_reasons, {"line is not a JSON object": 1, "invalid JSON": 1,
+                                                 "conflicts with a code of its instrument": 1})
+        self.assertEqual(len(self.instrMap.get_instr_codes(Code(CodeScheme.RIC, ric), self.agent_reader)), 4)
+
+    def test_process_pool(self):
+        records = [(TestUtil.genSEDOL(), TestUtil.genISIN()) for _ in range(40)]
+        lines = ["key,scheme,code"]
+        for i, (sedol, isin) in enumerate(records):
+            lines += [f"k{i},SEDOL,{sedol}", f"k{i},ISIN,{isin}"]
+        # Rows of one instrument span chunks.
+        ingest = InstrMapIngest(self.instrMap, self.agent_maint, batch_size=8, chunk_size=7, processes=2)
+        report = ingest.ingest_lines(iter(lines), "csv")
+        self.assertEqual((report.rows, report.records, report.created, report.rejected), (80, 40, 40, 0))
+        translated = self.instrMap.translate_codes([isin for _, isin in records], CodeScheme.SEDOL,
+                                                   self.agent_reader, source_scheme=CodeScheme.ISIN)
+        self.assertEqual([code.value for code in translated], [sedol for sedol, _ in records])
+
+    def test_validate(self):
+        valid = [("0263494", "GB0002634946"), ("B0YBKJ7", "GB00B0YBKJ77")]
+        lines = ["key,SEDOL,ISIN"] + [f"k{i},{sedol},{isin}" for i, (sedol, isin) in enumerate(valid)] + \
+                ["k2,0263495,US0378331005", "k3,B0YBKJ7,US0378331006"]
+        report = InstrMapIngest(self.instrMap, self.agent_maint, validate=True).ingest_lines(lines, "csv")
+        self.assertEqual((report.created, report.rejected), (2, 2))
+        self.assertEqual(report.reject_reasons, {"invalid code": 2})
+        self.assertEqual(report.rejects[1]["codes"], [("SEDOL", "B0YBKJ7"), ("ISIN", "US0378331006")])
+        with self.assertRaises(CodeDoesNotExist):
+            self.instrMap.get_instr_codes(Code(CodeScheme.ISIN, "US0378331005"), self.agent_reader)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            InstrMapIngest(None, self.agent_maint)
+        with self.assertRaises(ValueError):
+            InstrMapIngest(self.instrMap, None)
+        with self.assertRaises(IncorrectPermissions):
+            InstrMapIngest(self.instrMap, self.agent_reader)
+        with self.assertRaises(ValueError):
+            InstrMapIngest(self.instrMap, self.agent_maint, batch_size=0)
+        ingest = InstrMapIngest(self.instrMap, self.agent_maint)
+        with self.assertRaises(ValueError):
+            ingest.ingest_lines(["SEDOL"], "xml")
+        with self.assertRaises(ValueError):
+            ingest.ingest_lines("SEDOL\n", "csv")
+        with self.assertRaises(ValueError):
+            ingest.ingest(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import tempfile
+import time
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.InstrMapJournal import InstrMapJournal
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class TestInstrMapJournal(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.tmp_dir.name, "instr_map.snap")
+        self.journal_path = os.path.join(self.tmp_dir.name, "instr_map.jrnl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _populate(self, instrMap, n):
+        all_tests = []
+        for _ in range(n):
+            test_code = instrMap.create_instr(agent=self.agent_maint)
+            test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                              Code(CodeScheme.ISIN, TestUtil.genISIN())]
+            instrMap.add_instr_codes(
+                code=test_code, codes=test_alt_codes, agent=self.agent_maint)
+            all_tests.append([test_code] + test_alt_codes)
+        loaded_codes = [[Code(CodeScheme.RIC, TestUtil.genRIC())], []]
+        base_codes = instrMap.load_instrs(records=loaded_codes, agent=self.agent_maint)
+        for base_code, codes in zip(base_codes, loaded_codes):
+            all_tests.append([base_code] + codes)
+        return all_tests
+
+    def _check(self, instrMap, all_tests):
+        for codes_to_check in all_tests:
+            for code_to_test in codes_to_check:
+                codes = instrMap.get_instr_codes(
+                    code=code_to_test, agent=self.agent_reader)
+                self.assertEqual(codes, codes_to_check)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            InstrMapJournal(None)
+        with self.assertRaises(ValueError):
+            InstrMapJournal(self.journal_path, batch_size=0)
+        with open(self.journal_path, "wb") as f:
+            f.write(b"NotAJournal")
+        with self.assertRaises(ValueError):
+            InstrMapJournal(self.journal_path)
+        with self.assertRaises(IncorrectPermissions):
+            InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_reader)
+
+    def test_records(self):
+        with InstrMapJournal(self.journal_path) as journal:
+            instrMap = InstrumentMap(journal=journal)
+            all_tests = self._populate(instrMap, 2)
+        records = list(InstrMapJournal.records(self.journal_path))
+        self.assertEqual(len(records), 6)
+        op, agent_id, base_value, codes = records[1]
+        self.assertEqual(op, InstrMapJournal.ADD)
+        self.assertEqual(agent_id, self.agent_maint.id())
+        self.assertEqual(base_value, all_tests[0][0].value)
+        self.assertEqual(codes, all_tests[0][1:])
+        self.assertEqual(records[4][0], InstrMapJournal.CREATE)
+        self.assertEqual(records[4][3], all_tests[2][1:])
+
+    def test_recover_from_journal(self):
+        instrMap = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        all_tests = self._populate(instrMap, 10)
+        instrMap.journal.close()
+
+        recovered = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        self._check(recovered, all_tests)
+        self.assertEqual(recovered.instr_codes, instrMap.instr_codes)
+        recovered.journal.close()
+
+    def test_checkpoint(self):
+        instrMap = InstrumentMap.recover(self.snapshot_path, self.journal_path,
+                                         agent=self.agent_maint, batch_size=16)
+        all_tests = self._populate(instrMap, 10)
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.checkpoint(self.snapshot_path, agent=self.agent_reader)
+        instrMap.checkpoint(self.snapshot_path, agent=self.agent_maint)
+        self.assertEqual(os.path.getsize(self.journal_path), InstrMapJournal.HEADER.size)
+
+        all_tests += self._populate(instrMap, 5)
+        instrMap.journal.close()
+        self.assertEqual(len(list(InstrMapJournal.records(self.journal_path))), 12)
+
+        recovered = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        self._check(recovered, all_tests)
+        recovered.journal.close()
+
+    def test_recover_merge_and_split(self):
+        instrMap = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        all_tests = self._populate(instrMap, 3)
+        (base_code, sedol_code, isin_code), (ric_base, ric_code), (retired_code,) = all_tests[0], *all_tests[3:]
+        instrMap.merge_instr(ric_code, retired_code, self.agent_maint)
+        new_code = instrMap.split_instr(base_code, [isin_code], self.agent_maint)
+        all_tests = all_tests[1:3] + [[base_code, sedol_code], [new_code, isin_code], [ric_base, ric_code]]
+        instrMap.journal.close()
+
+        recovered = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        self._check(recovered, all_tests)
+        self.assertEqual(recovered.get_instr_codes(retired_code, self.agent_reader), [ric_base, ric_code])
+
+        # The snapshot holds the redirect, so the checkpoint leaves the journal empty.
+        recovered.checkpoint(self.snapshot_path, agent=self.agent_maint)
+        recovered.journal.close()
+        self.assertEqual(list(InstrMapJournal.records(self.journal_path)), [])
+        recovered = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        self._check(recovered, all_tests)
+        self.assertEqual(recovered.get_instr_codes(retired_code, self.agent_reader), [ric_base, ric_code])
+        self.assertEqual(recovered.get_retired_codes(ric_code, self.agent_reader), [retired_code])
+        recovered.journal.close()
+
+    def test_unjournaled_change_is_rejected(self):
+        instrMap = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        all_tests = self._populate(instrMap, 2)
+        instr_codes = {scheme: list(values) for scheme, values in instrMap.instr_codes.items()}
+        long_code = Code(CodeScheme.RIC, "R" * 0x10000)
+        with self.assertRaises(ValueError):
+            instrMap.add_instr_codes(all_tests[0][0], [long_code], agent=self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.load_instrs([[Code(CodeScheme.RIC, TestUtil.genRIC())], [long_code]], agent=self.agent_maint)
+        self.assertEqual(instrMap.instr_codes, instr_codes)
+        self.assertNotIn(long_code.value, instrMap.instr_map[str(CodeScheme.RIC)])
+        instrMap.journal.close()
+
+        recovered = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        self.assertEqual(recovered.instr_codes, instr_codes)
+        recovered.journal.close()
+
+    def test_max_delay(self):
+        record = InstrMapJournal.encode_create(self.agent_maint.id(), Code.gen_base_code_value())
+        with InstrMapJournal(self.journal_path, batch_size=100, max_delay=0.05) as journal:
+            journal.append(record)
+            self.assertEqual(os.path.getsize(self.journal_path), InstrMapJournal.HEADER.size)
+            time.sleep(0.1)
+            journal.append(record)
+            self.assertEqual(os.path.getsize(self.journal_path), InstrMapJournal.HEADER.size + 2 * len(record))
+            journal.append(record)
+        self.assertEqual(len(list(InstrMapJournal.records(self.journal_path))), 3)
+        with self.assertRaises(ValueError):
+            InstrMapJournal(self.journal_path, max_delay=-1)
+
+    def test_torn_record_is_dropped(self):
+        instrMap = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        all_tests = self._populate(instrMap, 3)
+        instrMap.journal.close()
+        with open(self.journal_path, "ab") as f:
+            f.write(InstrMapJournal.FRAME.pack(100, 0) + b"torn")
+
+        recovered = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        self._check(recovered, all_tests)
+        all_tests += self._populate(recovered, 1)
+        recovered.journal.close()
+
+        recovered = InstrumentMap.recover(self.snapshot_path, self.journal_path, agent=self.agent_maint)
+        self._check(recovered, all_tests)
+        recovered.journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
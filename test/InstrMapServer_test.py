@@ -0,0 +1,112 @@
+import asyncio
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.InstrMapServer import InstrMapServer
+from src.InstrMapClient import InstrMapClient
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class TestInstrMapServer(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+        cls.agent_unknown = Agent(agent_id=Agent.gen_agent_id(),
+                                  agent_name="TestAgent",
+                                  agent_role=AgentRole.READER)
+        cls.instrMap = InstrumentMap()
+        cls.all_tests = []
+        for _ in range(20):
+            test_code = cls.instrMap.create_instr(agent=cls.agent_maint)
+            test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                              Code(CodeScheme.ISIN, TestUtil.genISIN())]
+            cls.instrMap.add_instr_codes(
+                code=test_code, codes=test_alt_codes, agent=cls.agent_maint)
+            cls.all_tests.append([test_code] + test_alt_codes)
+
+    async def asyncSetUp(self):
+        self.server = InstrMapServer(self.instrMap, [self.agent_maint, self.agent_reader])
+        await self.server.start()
+        self.client = InstrMapClient("127.0.0.1", self.server.port, pool_size=2, max_batch=8)
+        await self.client.connect()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            InstrMapServer(None, [self.agent_reader])
+        with self.assertRaises(ValueError):
+            InstrMapServer(self.instrMap, [str("BadAgentTypeAsNotTypeAgent")])
+        with self.assertRaises(ValueError):
+            InstrMapClient("127.0.0.1", 0, pool_size=0)
+
+    async def test_lookups(self):
+        for codes_to_check in self.all_tests:
+            for code_to_test in codes_to_check:
+                codes = await self.client.get_instr_codes(code=code_to_test, agent=self.agent_reader)
+                self.assertEqual(codes, codes_to_check)
+                code = await self.client.get_instr_code_of_type(
+                    code=code_to_test, code_scheme=CodeScheme.BASE, agent=self.agent_reader)
+                self.assertEqual(code, codes_to_check[0])
+
+        isin_values = [codes[2].value for codes in self.all_tests] + ["NotAnIsin"]
+        translated = await self.client.translate_codes(
+            codes=isin_values, code_scheme=CodeScheme.SEDOL, agent=self.agent_reader, source_scheme=CodeScheme.ISIN)
+        self.assertEqual(translated, [codes[1] for codes in self.all_tests] + [None])
+        translated = await self.client.translate_codes(
+            codes=[codes[0] for codes in self.all_tests], code_scheme=CodeScheme.ISIN, agent=self.agent_reader)
+        self.assertEqual(translated, [codes[2] for codes in self.all_tests])
+
+    async def test_errors(self):
+        with self.assertRaises(CodeDoesNotExist):
+            await self.client.get_instr_codes(
+                code=Code(CodeScheme.ISIN, TestUtil.genISIN()), agent=self.agent_reader)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            await self.client.get_instr_code_of_type(
+                code=self.all_tests[0][0], code_scheme=CodeScheme.RIC, agent=self.agent_reader)
+        with self.assertRaises(IncorrectPermissions):
+            await self.client.get_instr_codes(code=self.all_tests[0][0], agent=self.agent_unknown)
+        with self.assertRaises(ValueError):
+            await self.client.get_instr_codes(code=None, agent=self.agent_reader)
+
+    async def test_concurrent_calls_are_coalesced(self):
+        calls = []
+        for codes_to_check in self.all_tests:
+            for code_to_test in codes_to_check:
+                calls.append(self.client.get_instr_code_of_type(
+                    code=code_to_test, code_scheme=CodeScheme.ISIN, agent=self.agent_reader))
+        calls.append(self.client.get_instr_codes(
+            code=Code(CodeScheme.ISIN, TestUtil.genISIN()), agent=self.agent_reader))
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        expected = [codes[2] for codes in self.all_tests for _ in codes]
+        self.assertEqual(results[:-1], expected)
+        self.assertIsInstance(results[-1], CodeDoesNotExist)
+
+
+    async def test_lost_connection(self):
+        code = self.all_tests[0][1]
+        self.assertEqual(await self.client.get_instr_code_of_type(code, CodeScheme.BASE, self.agent_reader),
+                         self.all_tests[0][0])
+        await self.server.stop()
+        # Calls on the lost connections fail rather than waiting for a response that never comes.
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                await asyncio.wait_for(
+                    self.client.get_instr_code_of_type(code, CodeScheme.BASE, self.agent_reader), timeout=5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.InstrMapJournal import InstrMapJournal
+from src.InstrMapSession import InstrMapReaderSession, InstrMapMaintainerSession
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+
+
+class TestInstrMapSession(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def test_session_kind(self):
+        instrMap = InstrumentMap()
+        maint_session = instrMap.session(self.agent_maint)
+        reader_session = instrMap.session(self.agent_reader)
+        self.assertIsInstance(maint_session, InstrMapMaintainerSession)
+        self.assertNotIsInstance(reader_session, InstrMapMaintainerSession)
+        self.assertIsInstance(reader_session, InstrMapReaderSession)
+        self.assertFalse(hasattr(reader_session, "create_instr"))
+        self.assertFalse(hasattr(reader_session, "add_instr_codes"))
+        self.assertFalse(hasattr(reader_session, "load_instrs"))
+        with self.assertRaises(ValueError):
+            instrMap.session(None)
+        with self.assertRaises(ValueError):
+            instrMap.session("NotAnAgent")
+
+    def test_session_read_write(self):
+        instrMap = InstrumentMap()
+        maint_session = instrMap.session(self.agent_maint)
+        reader_session = instrMap.session(self.agent_reader)
+
+        test_code = maint_session.create_instr()
+        test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                          Code(CodeScheme.ISIN, TestUtil.genISIN())]
+        maint_session.add_instr_codes(test_code, test_alt_codes)
+        loaded_codes = maint_session.load_instrs([[Code(CodeScheme.ISIN, TestUtil.genISIN())]])
+
+        for code in [test_code] + test_alt_codes:
+            self.assertEqual(reader_session.get_instr_codes(code), [test_code] + test_alt_codes)
+            self.assertEqual(reader_session.get_instr_codes(code),
+                             instrMap.get_instr_codes(code, self.agent_reader))
+        self.assertEqual(reader_session.get_instr_code_of_type(test_alt_codes[1], CodeScheme.SEDOL),
+                         test_alt_codes[0])
+        self.assertEqual(reader_session.translate_codes([test_alt_codes[0], loaded_codes[0]], CodeScheme.ISIN),
+                         [test_alt_codes[1], instrMap.get_instr_code_of_type(loaded_codes[0], CodeScheme.ISIN,
+                                                                             self.agent_reader)])
+        self.assertEqual(reader_session.translate_codes([test_alt_codes[0].value], CodeScheme.BASE,
+                                                        source_scheme=CodeScheme.SEDOL),
+                         [test_code])
+
+    def test_session_errors(self):
+        instrMap = InstrumentMap()
+        maint_session = instrMap.session(self.agent_maint)
+        test_code = maint_session.create_instr()
+        with self.assertRaises(CodeDoesNotExist):
+            maint_session.get_instr_codes(Code(CodeScheme.ISIN, TestUtil.genISIN()))
+        with self.assertRaises(OnlyBaseCodeDefined):
+            maint_session.get_instr_code_of_type(test_code, CodeScheme.ISIN)
+        with self.assertRaises(CodeDoesNotExist):
+            maint_session.add_instr_codes(Code(CodeScheme.ISIN, TestUtil.genISIN()), [])
+        with self.assertRaises(ValueError):
+            maint_session.add_instr_codes(test_code, None)
+        with self.assertRaises(ValueError):
+            maint_session.get_instr_codes(None)
+        with self.assertRaises(ValueError):
+            maint_session.translate_codes(None, CodeScheme.ISIN)
+        with self.assertRaises(ValueError):
+            maint_session.load_instrs(None)
+
+    def test_session_bulk_merge_split(self):
+        instrMap = InstrumentMap()
+        maint_session = instrMap.session(self.agent_maint)
+        reader_session = instrMap.session(self.agent_reader)
+        self.assertFalse(hasattr(reader_session, "create_instrs"))
+        self.assertFalse(hasattr(reader_session, "merge_instr"))
+        self.assertFalse(hasattr(reader_session, "split_instr"))
+
+        test_code, retired_code = maint_session.create_instrs(2)
+        self.assertEqual(maint_session.create_instrs(0), [])
+        test_sedol = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        test_isin = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        maint_session.add_instr_codes(test_code, [test_sedol])
+        maint_session.add_instr_codes(retired_code, [test_isin])
+
+        self.assertEqual(maint_session.merge_instr(test_code, retired_code), test_code)
+        self.assertEqual(reader_session.get_instr_codes(retired_code), [test_code, test_sedol, test_isin])
+        self.assertEqual(reader_session.get_retired_codes(test_code), [retired_code])
+        self.assertEqual(reader_session.get_retired_codes(test_code),
+                         instrMap.get_retired_codes(test_code, self.agent_reader))
+
+        new_code = maint_session.split_instr(test_code, [test_isin])
+        self.assertEqual(reader_session.get_instr_codes(test_isin), [new_code, test_isin])
+        self.assertEqual(reader_session.get_instr_codes(test_code), [test_code, test_sedol])
+
+        with self.assertRaises(ValueError):
+            maint_session.create_instrs(-1)
+        with self.assertRaises(ValueError):
+            maint_session.create_instrs(True)
+        with self.assertRaises(ValueError):
+            maint_session.merge_instr(test_code, test_sedol)
+        with self.assertRaises(ValueError):
+            maint_session.merge_instr(test_code, None)
+        with self.assertRaises(ValueError):
+            maint_session.split_instr(test_code, [])
+        with self.assertRaises(CodeDoesNotExist):
+            maint_session.split_instr(Code(CodeScheme.ISIN, TestUtil.genISIN()), [test_sedol])
+
+    def test_session_find_export(self):
+        instrMap = InstrumentMap()
+        maint_session = instrMap.session(self.agent_maint)
+        reader_session = instrMap.session(self.agent_reader)
+        test_codes = maint_session.load_instrs([[Code(CodeScheme.SEDOL, TestUtil.genSEDOL())] for _ in range(5)])
+
+        for code in test_codes:
+            sedol = reader_session.get_instr_code_of_type(code, CodeScheme.SEDOL)
+            self.assertIn((sedol, code), list(reader_session.find_codes(CodeScheme.SEDOL, prefix=sedol.value)))
+        self.assertEqual(list(reader_session.find_codes(CodeScheme.SEDOL, start="0")),
+                         list(instrMap.find_codes(CodeScheme.SEDOL, self.agent_reader, start="0")))
+        self.assertEqual(list(reader_session.export_instrs([CodeScheme.SEDOL], chunk_size=2)),
+                         list(instrMap.export_instrs(self.agent_reader, [CodeScheme.SEDOL], chunk_size=2)))
+        self.assertEqual(list(reader_session.export_instrs()), list(instrMap.export_instrs(self.agent_reader)))
+
+        with self.assertRaises(ValueError):
+            reader_session.find_codes(None)
+        with self.assertRaises(ValueError):
+            reader_session.export_instrs(chunk_size=0)
+        with self.assertRaises(ValueError):
+            reader_session.get_retired_codes(None)
+
+    def test_session_journaled(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal_path = os.path.join(tmp_dir, "instr_map.jrnl")
+            with InstrMapJournal(journal_path) as journal:
+                maint_session = InstrumentMap(journal=journal).session(self.agent_maint)
+                test_code = maint_session.create_instr()
+                maint_session.add_instr_codes(test_code, [Code(CodeScheme.SEDOL, TestUtil.genSEDOL())])
+            records = list(InstrMapJournal.records(journal_path))
+            self.assertEqual([op for op, _, _, _ in records], [InstrMapJournal.CREATE, InstrMapJournal.ADD])
+            self.assertTrue(all(agent_id == self.agent_maint.id() for _, agent_id, _, _ in records))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.InstrMapSnapshot import SnapshotInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+from exception.MapIsReadOnly import MapIsReadOnly
+
+
+class TestInstrMapSnapshot(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "instr_map.snap")
+        self.instrMap = InstrumentMap()
+        self.all_tests = []
+        for i in range(20):
+            test_code = self.instrMap.create_instr(agent=self.agent_maint)
+            test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                              Code(CodeScheme.ISIN, TestUtil.genISIN())]
+            if i % 2 == 0:
+                test_alt_codes.append(Code(CodeScheme.RIC, TestUtil.genRIC()))
+            self.instrMap.add_instr_codes(
+                code=test_code, codes=test_alt_codes, agent=self.agent_maint)
+            self.all_tests.append([test_code] + test_alt_codes)
+        self.instrMap.save_snapshot(path=self.path, agent=self.agent_reader)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_save_bad_args(self):
+        with self.assertRaises(ValueError):
+            self.instrMap.save_snapshot(path=None, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            self.instrMap.save_snapshot(path=self.path, agent=None)
+        with self.assertRaises(IncorrectPermissions):
+            InstrumentMap.load_snapshot(path=self.path, agent=self.agent_reader)
+
+    def test_load_snapshot(self):
+        loadedMap = InstrumentMap.load_snapshot(path=self.path, agent=self.agent_maint)
+        for codes_to_check in self.all_tests:
+            for code_to_test in codes_to_check:
+                codes = loadedMap.get_instr_codes(
+                    code=code_to_test, agent=self.agent_reader)
+                self.assertEqual(codes, codes_to_check)
+        self.assertEqual(loadedMap.instr_map, self.instrMap.instr_map)
+        self.assertEqual(loadedMap.instr_codes, self.instrMap.instr_codes)
+
+    def test_open_snapshot(self):
+        with SnapshotInstrumentMap(self.path) as snapshot:
+            self.assertEqual(snapshot.num_instr, len(self.all_tests))
+            for codes_to_check in self.all_tests:
+                for code_to_test in codes_to_check:
+                    codes = snapshot.get_instr_codes(
+                        code=code_to_test, agent=self.agent_reader)
+                    self.assertEqual(codes, codes_to_check)
+                    self.assertEqual(snapshot.get_instr_code_of_type(
+                        code=code_to_test, code_scheme=CodeScheme.BASE, agent=self.agent_reader), codes_to_check[0])
+            with self.assertRaises(CodeDoesNotExist):
+                snapshot.get_instr_codes(
+                    code=Code(CodeScheme.ISIN, TestUtil.genISIN()), agent=self.agent_reader)
+            with self.assertRaises(OnlyBaseCodeDefined):
+                snapshot.get_instr_code_of_type(
+                    code=self.all_tests[1][0], code_scheme=CodeScheme.RIC, agent=self.agent_reader)
+            with self.assertRaises(ValueError):
+                snapshot.get_instr_codes(code=self.all_tests[0][0], agent=None)
+            with self.assertRaises(MapIsReadOnly):
+                snapshot.create_instr(agent=self.agent_maint)
+
+            isin_values = [codes[2].value for codes in self.all_tests] + ["NotAnIsin"]
+            translated = snapshot.translate_codes(
+                codes=isin_values, code_scheme=CodeScheme.SEDOL, agent=self.agent_reader, source_scheme=CodeScheme.ISIN)
+            self.assertEqual(translated, [codes[1] for codes in self.all_tests] + [None])
+
+    def test_merged_instr(self):
+        (base_code, sedol_code, isin_code, ric_code), (retired_code, retired_sedol, retired_isin) = self.all_tests[:2]
+        self.instrMap.split_instr(base_code, [sedol_code, isin_code], self.agent_maint)
+        self.instrMap.merge_instr(base_code, retired_code, self.agent_maint)
+        self.instrMap.save_snapshot(path=self.path, agent=self.agent_reader)
+        merged_codes = [base_code, retired_sedol, retired_isin, ric_code]
+
+        with SnapshotInstrumentMap(self.path) as snapshot:
+            self.assertEqual(list(snapshot.redirects()), [(1, 0)])
+            self.assertEqual(snapshot.get_instr_codes(code=retired_code, agent=self.agent_reader), merged_codes)
+            self.assertEqual(snapshot.translate_codes(
+                codes=[retired_code, retired_isin], code_scheme=CodeScheme.BASE, agent=self.agent_reader),
+                [base_code, base_code])
+
+        loadedMap = InstrumentMap.load_snapshot(path=self.path, agent=self.agent_maint)
+        self.assertEqual(loadedMap.get_instr_codes(code=retired_code, agent=self.agent_reader), merged_codes)
+        self.assertEqual(loadedMap.get_retired_codes(code=ric_code, agent=self.agent_reader), [retired_code])
+        self.assertEqual(loadedMap.instr_map, self.instrMap.instr_map)
+        self.assertEqual(sum(map(len, loadedMap.export_instrs(agent=self.agent_reader))), len(self.all_tests))
+
+    def test_open_bad_snapshot(self):
+        bad_path = os.path.join(self.tmp_dir.name, "bad.snap")
+        with open(bad_path, "wb") as f:
+            f.write(b"NotASnapshot" * 10)
+        with self.assertRaises(ValueError):
+            SnapshotInstrumentMap(bad_path)
+        open(bad_path, "wb").close()
+        with self.assertRaises(ValueError):
+            SnapshotInstrumentMap(bad_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
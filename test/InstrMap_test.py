@@ -1,3 +1,6 @@
+import json
+import os
+import tempfile
 import unittest
 from TestUtil import TestUtil
 from src.InstrMap import InstrumentMap
@@ -21,14 +24,20 @@ class TestInstrumentMap(unittest.TestCase):
                                  agent_name="TestAgent",
                                  agent_role=AgentRole.READER)
 
+    def new_map(self):
+        """
+        The map under test, overridden to run these tests against other implementations of the map.
+        """
+        return InstrumentMap()
+
     def test_empty_map(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         test_code = Code(CodeScheme.BASE, Code.gen_base_code_value())
         with self.assertRaises(CodeDoesNotExist):
             instrMap.get_instr_codes(code=test_code, agent=self.agent_reader)
 
     def test_create_instr(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
 
         with self.assertRaises(ValueError):
             _ = instrMap.create_instr(agent=None)
@@ -43,9 +52,27 @@ class TestInstrumentMap(unittest.TestCase):
         with self.assertRaises(IncorrectPermissions):
             _ = instrMap.create_instr(agent=self.agent_reader)
 
+    def test_create_instrs(self):
+        instrMap = self.new_map()
+        base_codes = instrMap.create_instrs(agent=self.agent_maint, n=100)
+        self.assertEqual(len(set(base_codes)), 100)
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        instrMap.add_instr_codes(code=base_codes[42], codes=[isin_code], agent=self.agent_maint)
+        self.assertEqual(instrMap.get_instr_codes(code=isin_code, agent=self.agent_reader),
+                         [base_codes[42], isin_code])
+        self.assertEqual(instrMap.get_instr_codes(code=base_codes[-1], agent=self.agent_reader), [base_codes[-1]])
+        self.assertEqual(instrMap.create_instrs(agent=self.agent_maint, n=0), [])
+
+        with self.assertRaises(ValueError):
+            instrMap.create_instrs(agent=None, n=1)
+        with self.assertRaises(ValueError):
+            instrMap.create_instrs(agent=self.agent_maint, n=-1)
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.create_instrs(agent=self.agent_reader, n=1)
+
     def test_create_and_get_instr(self):
 
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         with self.assertRaises(ValueError):
             _ = instrMap.create_instr(agent=None)
         with self.assertRaises(ValueError):
@@ -69,7 +96,7 @@ class TestInstrumentMap(unittest.TestCase):
             self.assertEqual(expected_codes[0], new_code)
 
     def test_add_instr_codes_for_bad_code(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         with self.assertRaises(ValueError):
             instrMap.add_instr_codes(
                 code=None, codes=[], agent=self.agent_maint)
@@ -78,14 +105,14 @@ class TestInstrumentMap(unittest.TestCase):
                 code=str("BadCodeTypeAsNotTypeCode"), codes=[], agent=self.agent_maint)
 
     def test_add_instr_codes_for_missing_code(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         new_code = instrMap.create_instr(agent=self.agent_maint)
         with self.assertRaises(ValueError):
             instrMap.add_instr_codes(
                 code=new_code, codes=None, agent=self.agent_maint)
 
     def test_add_instr_codes_for_bad_alt_codes(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         test_code = instrMap.create_instr(agent=self.agent_maint)
 
         with self.assertRaises(ValueError):
@@ -99,7 +126,7 @@ class TestInstrumentMap(unittest.TestCase):
                                      good_code, bad_code], agent=self.agent_maint)
 
     def test_add_instr_codes(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         test_code = instrMap.create_instr(agent=self.agent_maint)
         test_alt_codes = [Code(CodeScheme.ISIN, TestUtil.genISIN()),
                           Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
@@ -127,7 +154,7 @@ class TestInstrumentMap(unittest.TestCase):
                 self.assertEqual(code in codes, True)
 
     def test_add_duplicate_insert_instr_codes(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         test_code = instrMap.create_instr(agent=self.agent_maint)
         test_alt_codes = [Code(CodeScheme.ISIN, TestUtil.genISIN()),
                           Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
@@ -146,7 +173,7 @@ class TestInstrumentMap(unittest.TestCase):
                 self.assertEqual(code in codes, True)
 
     def test_add_conflicting_instr_codes(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         test_code = instrMap.create_instr(agent=self.agent_maint)
         test_alt_codes = [Code(CodeScheme.ISIN, TestUtil.genISIN()),
                           Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
@@ -159,7 +186,7 @@ class TestInstrumentMap(unittest.TestCase):
                 code=new_test_code, codes=test_alt_codes, agent=self.agent_maint)
 
     def test_add_many_instr_codes(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         all_tests = []
         for _ in range(20):
             test_code = instrMap.create_instr(agent=self.agent_maint)
@@ -179,7 +206,7 @@ class TestInstrumentMap(unittest.TestCase):
                     self.assertEqual(code in codes, True)
 
     def test_get_instr_code_of_type_for_bad_code(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         dummy_but_valid_code = instrMap.create_instr(agent=self.agent_maint)
 
         with self.assertRaises(ValueError):
@@ -208,7 +235,7 @@ class TestInstrumentMap(unittest.TestCase):
         self.assertEqual(expected_code, test_code)
 
     def test_get_instr_code_of_type(self):
-        instrMap = InstrumentMap()
+        instrMap = self.new_map()
         all_tests = []
         for _ in range(20):
             test_code = instrMap.create_instr(agent=self.agent_maint)
@@ -232,3 +259,277 @@ class TestInstrumentMap(unittest.TestCase):
                         code=base_code, code_scheme=code.scheme, agent=self.agent_reader)
                     self.assertEqual(isinstance(code_test, Code), True)
                     self.assertEqual(code, code_test)
+
+    def test_add_second_code_of_same_scheme(self):
+        instrMap = self.new_map()
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        instrMap.add_instr_codes(
+            code=test_code, codes=[isin_code], agent=self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.add_instr_codes(
+                code=test_code, codes=[Code(CodeScheme.ISIN, TestUtil.genISIN())], agent=self.agent_maint)
+        codes = instrMap.get_instr_codes(code=test_code, agent=self.agent_reader)
+        self.assertEqual(codes, [test_code, isin_code])
+
+    def test_rejected_add_leaves_map_unchanged(self):
+        instrMap = self.new_map()
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        instrMap.add_instr_codes(
+            code=test_code, codes=[ric_code], agent=self.agent_maint)
+
+        new_test_code = instrMap.create_instr(agent=self.agent_maint)
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        with self.assertRaises(ValueError):
+            instrMap.add_instr_codes(
+                code=new_test_code, codes=[isin_code, ric_code], agent=self.agent_maint)
+        with self.assertRaises(CodeDoesNotExist):
+            instrMap.get_instr_codes(code=isin_code, agent=self.agent_reader)
+        self.assertEqual(instrMap.get_instr_codes(
+            code=new_test_code, agent=self.agent_reader), [new_test_code])
+
+    def test_get_instr_code_of_type_between_alt_codes(self):
+        instrMap = self.new_map()
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        instrMap.add_instr_codes(
+            code=test_code, codes=[isin_code, ric_code], agent=self.agent_maint)
+        self.assertEqual(instrMap.get_instr_code_of_type(
+            code=isin_code, code_scheme=CodeScheme.RIC, agent=self.agent_reader), ric_code)
+        self.assertEqual(instrMap.get_instr_code_of_type(
+            code=ric_code, code_scheme=CodeScheme.ISIN, agent=self.agent_reader), isin_code)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            instrMap.get_instr_code_of_type(
+                code=ric_code, code_scheme=CodeScheme.SEDOL, agent=self.agent_reader)
+
+    def test_translate_codes(self):
+        instrMap = self.new_map()
+        all_tests = []
+        for _ in range(20):
+            test_code = instrMap.create_instr(agent=self.agent_maint)
+            test_alt_codes = [Code(CodeScheme.ISIN, TestUtil.genISIN()),
+                              Code(CodeScheme.SEDOL, TestUtil.genSEDOL())]
+            instrMap.add_instr_codes(
+                code=test_code, codes=test_alt_codes, agent=self.agent_maint)
+            all_tests.append([test_code] + test_alt_codes)
+        missing_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+
+        isin_codes = [codes[1] for codes in all_tests] + [missing_code]
+        translated = instrMap.translate_codes(
+            codes=isin_codes, code_scheme=CodeScheme.SEDOL, agent=self.agent_reader)
+        self.assertEqual(translated, [codes[2] for codes in all_tests] + [None])
+
+        # Only base codes are defined for RIC so every translation is a miss.
+        translated = instrMap.translate_codes(
+            codes=isin_codes, code_scheme=CodeScheme.RIC, agent=self.agent_reader)
+        self.assertEqual(translated, [None] * len(isin_codes))
+
+        # Mixed schemes and raw values
+        mixed_codes = [codes[i % 3] for i, codes in enumerate(all_tests)]
+        translated = instrMap.translate_codes(
+            codes=mixed_codes, code_scheme=CodeScheme.BASE, agent=self.agent_reader)
+        self.assertEqual(translated, [codes[0] for codes in all_tests])
+
+        sedol_values = [codes[2].value for codes in all_tests] + ["NotASedol"]
+        translated = instrMap.translate_codes(
+            codes=sedol_values, code_scheme=CodeScheme.ISIN, agent=self.agent_reader, source_scheme=CodeScheme.SEDOL)
+        self.assertEqual(translated, [codes[1] for codes in all_tests] + [None])
+
+    def test_translate_codes_bad_args(self):
+        instrMap = self.new_map()
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.translate_codes(
+                codes=None, code_scheme=CodeScheme.ISIN, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            instrMap.translate_codes(
+                codes=[test_code], code_scheme=None, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            instrMap.translate_codes(
+                codes=[test_code], code_scheme=CodeScheme.ISIN, agent=self.agent_reader, source_scheme="ISIN")
+        with self.assertRaises(ValueError):
+            instrMap.translate_codes(
+                codes=[test_code, str("BadCodeTypeAsNotTypeCode")], code_scheme=CodeScheme.ISIN, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            instrMap.translate_codes(
+                codes=[test_code], code_scheme=CodeScheme.ISIN, agent=None)
+        self.assertEqual(instrMap.translate_codes(
+            codes=[], code_scheme=CodeScheme.ISIN, agent=self.agent_reader), [])
+
+    def test_load_instrs(self):
+        instrMap = self.new_map()
+        records = [[Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                    Code(CodeScheme.ISIN, TestUtil.genISIN())] for _ in range(20)]
+        records.append([])
+        base_codes = instrMap.load_instrs(records=records, agent=self.agent_maint)
+        self.assertEqual(len(base_codes), len(records))
+        for base_code, record in zip(base_codes, records):
+            self.assertEqual(base_code.scheme, CodeScheme.BASE)
+            for code_to_test in [base_code] + record:
+                codes = instrMap.get_instr_codes(
+                    code=code_to_test, agent=self.agent_reader)
+                self.assertEqual(codes, [base_code] + record)
+
+    def test_load_instrs_bad_args(self):
+        instrMap = self.new_map()
+        records = [[Code(CodeScheme.ISIN, TestUtil.genISIN())]]
+        with self.assertRaises(ValueError):
+            instrMap.load_instrs(records=None, agent=self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.load_instrs(records=records, agent=None)
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.load_instrs(records=records, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            instrMap.load_instrs(
+                records=[[str("BadCodeTypeAsNotTypeCode")]], agent=self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.load_instrs(
+                records=[[Code(CodeScheme.BASE, Code.gen_base_code_value())]], agent=self.agent_maint)
+
+    def test_load_instrs_conflicts_are_all_or_nothing(self):
+        instrMap = self.new_map()
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        instrMap.add_instr_codes(
+            code=test_code, codes=[ric_code], agent=self.agent_maint)
+
+        good_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        dup_code = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        for bad_records in [[[good_code], [ric_code]],
+                            [[good_code, dup_code], [dup_code]],
+                            [[good_code, Code(CodeScheme.ISIN, TestUtil.genISIN())]]]:
+            with self.assertRaises(ValueError):
+                instrMap.load_instrs(records=bad_records, agent=self.agent_maint)
+            with self.assertRaises(CodeDoesNotExist):
+                instrMap.get_instr_codes(code=good_code, agent=self.agent_reader)
+        self.assertEqual(len(list(instrMap.find_codes(CodeScheme.BASE, self.agent_reader))), 1)
+
+    def test_find_codes(self):
+        instrMap = self.new_map()
+        isin_codes = {}
+        for country in ["GB", "US", "GB"]:
+            test_code = instrMap.create_instr(agent=self.agent_maint)
+            isin_code = Code(CodeScheme.ISIN, country + TestUtil.genISIN()[2:])
+            instrMap.add_instr_codes(code=test_code, codes=[isin_code], agent=self.agent_maint)
+            isin_codes[isin_code] = test_code
+
+        gb_codes = sorted(((c, b) for c, b in isin_codes.items() if c.value.startswith("GB")),
+                          key=lambda found_code: found_code[0].value)
+        found = instrMap.find_codes(CodeScheme.ISIN, self.agent_reader, prefix="GB")
+        self.assertEqual(list(found), gb_codes)
+        self.assertEqual(len(list(instrMap.find_codes(CodeScheme.ISIN, self.agent_reader, pattern="G?*"))), 2)
+        self.assertEqual(len(list(instrMap.find_codes(CodeScheme.ISIN, self.agent_reader, start="H"))), 1)
+
+        # Codes added after the first search are found too.
+        records = [[Code(CodeScheme.ISIN, "GB" + TestUtil.genISIN()[2:])] for _ in range(3)]
+        instrMap.load_instrs(records=records, agent=self.agent_maint)
+        self.assertEqual(len(list(instrMap.find_codes(CodeScheme.ISIN, self.agent_reader, prefix="GB"))), 5)
+        self.assertEqual(len(list(instrMap.find_codes(CodeScheme.ISIN, self.agent_reader))), 6)
+        self.assertEqual(list(instrMap.find_codes(CodeScheme.RIC, self.agent_reader)), [])
+
+        with self.assertRaises(ValueError):
+            instrMap.find_codes(CodeScheme.ISIN, self.agent_reader, prefix="GB", pattern="GB*")
+        with self.assertRaises(ValueError):
+            instrMap.find_codes(None, self.agent_reader, prefix="GB")
+        with self.assertRaises(ValueError):
+            instrMap.find_codes(CodeScheme.ISIN, None, prefix="GB")
+
+    def test_merge_instr(self):
+        instrMap = self.new_map()
+        sedol_code = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        older_code, base_code, retired_code, other_code = instrMap.load_instrs(
+            records=[[], [sedol_code], [isin_code, ric_code], [Code(CodeScheme.SEDOL, TestUtil.genSEDOL())]],
+            agent=self.agent_maint)
+        self.assertEqual(instrMap.merge_instr(retired_code, older_code, self.agent_maint), retired_code)
+
+        self.assertEqual(instrMap.merge_instr(sedol_code, isin_code, self.agent_maint), base_code)
+        self.assertEqual(instrMap.get_instr_codes(ric_code, self.agent_reader),
+                         [base_code, sedol_code, isin_code, ric_code])
+        # Retired base codes, and those retired in to them, resolve to the survivor.
+        for code in (retired_code, older_code):
+            self.assertEqual(instrMap.get_instr_code_of_type(code, CodeScheme.BASE, self.agent_reader), base_code)
+        self.assertEqual(instrMap.translate_codes([older_code, isin_code], CodeScheme.SEDOL, self.agent_reader),
+                         [sedol_code, sedol_code])
+        self.assertEqual(instrMap.get_retired_codes(base_code, self.agent_reader), [older_code, retired_code])
+        exported = [r for chunk in instrMap.export_instrs(self.agent_reader) for r in chunk]
+        self.assertEqual([base for base, _ in exported], [base_code, other_code])
+
+        # A merge of instruments with different codes of a scheme is rejected and changes nothing.
+        with self.assertRaises(ValueError):
+            instrMap.merge_instr(base_code, other_code, self.agent_maint)
+        self.assertEqual(instrMap.get_instr_codes(other_code, self.agent_reader)[0], other_code)
+        with self.assertRaises(ValueError):
+            instrMap.merge_instr(base_code, retired_code, self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.merge_instr(base_code, None, self.agent_maint)
+        with self.assertRaises(CodeDoesNotExist):
+            instrMap.merge_instr(base_code, Code(CodeScheme.BASE, Code.gen_base_code_value()), self.agent_maint)
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.merge_instr(base_code, other_code, self.agent_reader)
+
+    def test_split_instr(self):
+        instrMap = self.new_map()
+        sedol_code = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        [base_code] = instrMap.load_instrs(records=[[sedol_code, isin_code, ric_code]], agent=self.agent_maint)
+
+        new_code = instrMap.split_instr(sedol_code, [isin_code, ric_code], self.agent_maint)
+        self.assertNotEqual(new_code, base_code)
+        self.assertEqual(instrMap.get_instr_codes(sedol_code, self.agent_reader), [base_code, sedol_code])
+        self.assertEqual(instrMap.get_instr_codes(ric_code, self.agent_reader), [new_code, isin_code, ric_code])
+
+        with self.assertRaises(ValueError):
+            instrMap.split_instr(base_code, [isin_code], self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.split_instr(base_code, [base_code], self.agent_maint)
+        with self.assertRaises(ValueError):
+            instrMap.split_instr(base_code, [], self.agent_maint)
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.split_instr(base_code, [sedol_code], self.agent_reader)
+        self.assertEqual(instrMap.get_instr_codes(sedol_code, self.agent_reader), [base_code, sedol_code])
+
+    def test_export_instrs(self):
+        instrMap = self.new_map()
+        records = [[Code(CodeScheme.SEDOL, TestUtil.genSEDOL()), Code(CodeScheme.ISIN, TestUtil.genISIN())]
+                   for _ in range(5)] + [[Code(CodeScheme.SEDOL, TestUtil.genSEDOL())]]
+        base_codes = instrMap.load_instrs(records=records, agent=self.agent_maint)
+        empty_code = instrMap.create_instr(agent=self.agent_maint)
+
+        chunks = list(instrMap.export_instrs(self.agent_reader, chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        expected = [(base_code, {c.scheme: c for c in record}) for base_code, record in zip(base_codes, records)]
+        self.assertEqual([r for chunk in chunks for r in chunk], expected + [(empty_code, {})])
+
+        # Only the instruments with an ISIN when filtered by ISIN.
+        exported = [r for chunk in instrMap.export_instrs(self.agent_reader, [CodeScheme.ISIN]) for r in chunk]
+        self.assertEqual(exported, [(base_code, {CodeScheme.ISIN: record[1]})
+                                    for base_code, record in zip(base_codes[:5], records)])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "export.csv")
+            self.assertEqual(instrMap.save_export(path, self.agent_reader, [CodeScheme.SEDOL, CodeScheme.ISIN]), 6)
+            with open(path) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[0], "BASE,SEDOL,ISIN")
+            self.assertEqual(lines[6], f"{base_codes[5].value},{records[5][0].value},")
+            path = os.path.join(tmp_dir, "export.jsonl")
+            self.assertEqual(instrMap.save_export(path, self.agent_reader, chunk_size=2), 7)
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(lines[0], {"BASE": base_codes[0].value, "SEDOL": records[0][0].value,
+                                        "ISIN": records[0][1].value})
+            self.assertEqual(lines[6], {"BASE": empty_code.value})
+
+        with self.assertRaises(ValueError):
+            instrMap.export_instrs(None)
+        with self.assertRaises(ValueError):
+            instrMap.export_instrs(self.agent_reader, chunk_size=0)
+        with self.assertRaises(ValueError):
+            instrMap.export_instrs(self.agent_reader, CodeScheme.ISIN)
+        with self.assertRaises(ValueError):
+            instrMap.save_export("export.xml", self.agent_reader)
@@ -0,0 +1,87 @@
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.InstrMapMetrics import InstrMapMetrics
+from src.InstrumentedInstrMap import InstrumentedInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class TestInstrumentedInstrumentMap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def test_counts_and_errors(self):
+        instrMap = InstrumentedInstrumentMap(InstrumentMap())
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        test_alt_codes = [Code(CodeScheme.ISIN, TestUtil.genISIN())]
+        instrMap.add_instr_codes(code=test_code, codes=test_alt_codes, agent=self.agent_maint)
+        for _ in range(10):
+            self.assertEqual(instrMap.get_instr_codes(code=test_code, agent=self.agent_reader),
+                             [test_code] + test_alt_codes)
+        with self.assertRaises(CodeDoesNotExist):
+            instrMap.get_instr_codes(code=Code(CodeScheme.ISIN, TestUtil.genISIN()), agent=self.agent_reader)
+        with self.assertRaises(IncorrectPermissions):
+            instrMap.create_instr(agent=self.agent_reader)
+        self.assertEqual(instrMap.translate_codes([test_code, test_alt_codes[0]], CodeScheme.ISIN, self.agent_reader),
+                         [test_alt_codes[0], test_alt_codes[0]])
+
+        operations = instrMap.metrics.snapshot()["operations"]
+        self.assertEqual(operations["get_instr_codes"]["count"], 11)
+        self.assertEqual(operations["get_instr_codes"]["errors"], {"CodeDoesNotExist": 1})
+        self.assertEqual(operations["create_instr"]["count"], 2)
+        self.assertEqual(operations["create_instr"]["errors"], {"IncorrectPermissions": 1})
+        self.assertEqual(operations["add_instr_codes"]["count"], 1)
+        self.assertEqual(operations["translate_codes"]["items"], 2)
+        self.assertNotIn("get_instr_code_of_type", operations)
+        stats = operations["get_instr_codes"]
+        self.assertTrue(0 < stats["min_ns"] <= stats["p50_ns"] <= stats["p99_ns"] <= stats["max_ns"])
+
+    def test_disabled(self):
+        metrics = InstrMapMetrics(enabled=False)
+        instrMap = InstrumentedInstrumentMap(InstrumentMap(), metrics)
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        instrMap.get_instr_codes(code=test_code, agent=self.agent_reader)
+        self.assertEqual(metrics.snapshot()["operations"], {})
+        metrics.enabled = True
+        instrMap.get_instr_codes(code=test_code, agent=self.agent_reader)
+        self.assertEqual(metrics.snapshot()["operations"]["get_instr_codes"]["count"], 1)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()["operations"], {})
+
+    def test_passthrough(self):
+        instrMap = InstrumentedInstrumentMap(InstrumentMap())
+        base_codes = instrMap.load_instrs([[Code(CodeScheme.SEDOL, TestUtil.genSEDOL())]], self.agent_maint)
+        session = instrMap.session(self.agent_reader)
+        self.assertEqual(len(session.get_instr_codes(base_codes[0])), 2)
+        self.assertEqual(instrMap.metrics.snapshot()["operations"]["load_instrs"]["items"], 1)
+        with self.assertRaises(ValueError):
+            InstrumentedInstrumentMap(None)
+
+    def test_prometheus(self):
+        instrMap = InstrumentedInstrumentMap(InstrumentMap())
+        test_code = instrMap.create_instr(agent=self.agent_maint)
+        with self.assertRaises(CodeDoesNotExist):
+            instrMap.get_instr_code_of_type(Code(CodeScheme.ISIN, TestUtil.genISIN()), CodeScheme.BASE,
+                                            self.agent_reader)
+        text = instrMap.metrics.to_prometheus()
+        self.assertIn('instr_map_latency_seconds{op="create_instr",quantile="0.99"} ', text)
+        self.assertIn('instr_map_latency_seconds_count{op="get_instr_code_of_type"} 1', text)
+        self.assertIn('instr_map_errors_total{op="get_instr_code_of_type",error="CodeDoesNotExist"} 1', text)
+        self.assertTrue(text.endswith("\n"))
+        self.assertIsNotNone(test_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
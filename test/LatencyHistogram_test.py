@@ -0,0 +1,64 @@
+import random
+import unittest
+from src.LatencyHistogram import LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.count, 0)
+        self.assertIsNone(histogram.percentile(50))
+        self.assertIsNone(histogram.mean())
+        with self.assertRaises(ValueError):
+            histogram.percentile(101)
+
+    def test_exact_small_values(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 101):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(50), 50)
+        self.assertEqual(histogram.percentile(99), 99)
+        self.assertEqual(histogram.percentile(100), 100)
+        self.assertEqual(histogram.min, 1)
+        self.assertEqual(histogram.max, 100)
+        self.assertEqual(histogram.mean(), 50.5)
+
+    def test_precision(self):
+        rng = random.Random(3)
+        values = sorted(rng.randrange(1000, 10 ** 10) for _ in range(20000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        for p in (50, 90, 99, 99.9):
+            expected = values[int(len(values) * p / 100) - 1]
+            self.assertLessEqual(abs(histogram.percentile(p) - expected) / expected, 0.02)
+        self.assertEqual(histogram.percentile(100), values[-1])
+
+    def test_fixed_size(self):
+        histogram = LatencyHistogram()
+        size = len(histogram.counts)
+        histogram.record(0)
+        histogram.record(2 ** LatencyHistogram.MAX_BITS + 12345)
+        self.assertEqual(len(histogram.counts), size)
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.percentile(100), 2 ** LatencyHistogram.MAX_BITS + 12345)
+
+    def test_merge_reset(self):
+        histogram = LatencyHistogram()
+        other = LatencyHistogram()
+        for value in range(1000):
+            histogram.record(value)
+            other.record(value + 1000)
+        histogram.merge(other)
+        self.assertEqual(histogram.count, 2000)
+        self.assertEqual(histogram.min, 0)
+        self.assertEqual(histogram.max, 1999)
+        self.assertLessEqual(abs(histogram.percentile(50) - 999), 999 * 0.02)
+        histogram.reset()
+        self.assertEqual(histogram.count, 0)
+        self.assertIsNone(histogram.max)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import random
+import unittest
+from src.PersistentDict import PersistentDict
+
+
+class TestPersistentDict(unittest.TestCase):
+
+    def test_dict_operations(self):
+        rng = random.Random(0)
+        items = {}
+        persistent = PersistentDict()
+        for i in range(20000):
+            key = f"K{rng.randrange(15000)}"
+            items[key] = persistent[key] = i
+        self.assertEqual(len(persistent), len(items))
+        self.assertEqual(persistent, items)
+        self.assertEqual(set(persistent), set(items))
+        self.assertEqual(dict(persistent.items()), items)
+        for key, value in items.items():
+            self.assertEqual(persistent.get(key), value)
+            self.assertEqual(persistent[key], value)
+            self.assertIn(key, persistent)
+        self.assertNotIn("missing", persistent)
+        self.assertIsNone(persistent.get("missing"))
+        self.assertEqual(persistent.get("missing", -1), -1)
+        with self.assertRaises(KeyError):
+            persistent["missing"]
+        self.assertEqual(PersistentDict(items), items)
+        self.assertEqual(PersistentDict(items.items()), items)
+        self.assertTrue(all(len(leaf) <= PersistentDict.LEAF_SIZE for leaf in persistent._leaves(persistent._root)))
+
+    def test_fork(self):
+        persistent = PersistentDict((f"K{i}", i) for i in range(10000))
+        forked = persistent.fork()
+        forked["K1"] = "forked"
+        forked["new"] = "added"
+        persistent["K2"] = "changed"
+        self.assertEqual(persistent["K1"], 1)
+        self.assertNotIn("new", persistent)
+        self.assertEqual(len(persistent), 10000)
+        self.assertEqual(len(forked), 10001)
+        self.assertEqual(forked["K2"], 2)
+        self.assertEqual(forked["K1"], "forked")
+
+        # A change copies only the nodes on the path to the key, the rest are shared with the fork.
+        forked = persistent.fork()
+        forked["K3"] = "forked"
+        self.assertEqual(len(forked._owned), 2)
+        self.assertEqual(sum(a is b for a, b in zip(forked._root, persistent._root)), PersistentDict.WIDTH - 1)
+        self.assertEqual(persistent["K3"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
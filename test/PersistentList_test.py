@@ -0,0 +1,60 @@
+import random
+import unittest
+from src.PersistentList import PersistentList
+
+
+class TestPersistentList(unittest.TestCase):
+
+    def test_list_operations(self):
+        rng = random.Random(0)
+        values = []
+        persistent = PersistentList()
+        for i in range(5000):
+            if values and rng.random() < 0.3:
+                j = rng.randrange(len(values))
+                values[j] = persistent[j] = None
+            elif rng.random() < 0.01:
+                added = list(range(i, i + rng.randrange(200)))
+                values.extend(added)
+                persistent.extend(added)
+            else:
+                values.append(i)
+                persistent.append(i)
+        self.assertEqual(len(persistent), len(values))
+        self.assertEqual(list(persistent), values)
+        self.assertEqual(persistent, values)
+        self.assertEqual([persistent[i] for i in range(len(values))], values)
+        self.assertEqual(persistent[-1], values[-1])
+        self.assertEqual(persistent[100:1000], values[100:1000])
+        self.assertEqual(persistent[255:257], values[255:257])
+        self.assertEqual(persistent[::7], values[::7])
+        self.assertEqual(persistent[len(values):], [])
+        self.assertEqual(persistent.count(None), values.count(None))
+        self.assertEqual(PersistentList(values), values)
+        with self.assertRaises(IndexError):
+            persistent[len(values)]
+        with self.assertRaises(IndexError):
+            persistent[len(values)] = 1
+
+    def test_fork(self):
+        persistent = PersistentList(range(10000))
+        forked = persistent.fork()
+        forked[5000] = "forked"
+        forked.append("appended")
+        persistent[0] = "changed"
+        self.assertEqual(persistent[5000], 5000)
+        self.assertEqual(len(persistent), 10000)
+        self.assertEqual(forked[0], 0)
+        self.assertEqual(forked[5000], "forked")
+        self.assertEqual(forked[-1], "appended")
+
+        # A change copies only the nodes on the path to the value, the rest are shared with the fork.
+        forked = persistent.fork()
+        forked[9999] = "forked"
+        self.assertEqual(len(forked._owned), 2)
+        self.assertIs(forked._root[0], persistent._root[0])
+        self.assertEqual(persistent[9999], 9999)
+
+
+if __name__ == '__main__':
+    unittest.main()
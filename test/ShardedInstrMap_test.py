@@ -0,0 +1,170 @@
+import multiprocessing
+import unittest
+from TestUtil import TestUtil
+from src.ShardedInstrMap import ShardedInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+from exception.MapIsReadOnly import MapIsReadOnly
+
+
+def _reader_process(addresses, authkey, agent, codes_to_check, result_queue):
+    with ShardedInstrumentMap.attach(addresses, authkey) as replica:
+        result_queue.put(replica.translate_codes(codes_to_check, CodeScheme.BASE, agent))
+
+
+class _FailingLoadMap(ShardedInstrumentMap):
+    """
+    Makes the last record sent to the first shard of the next load fail part way through the shard's load.
+    """
+    fail_next_load = False
+
+    def _fan_out(self, op, requests):
+        if op == "load" and self.fail_next_load:
+            self.fail_next_load = False
+            requests = dict(requests)
+            shard = next(iter(requests))
+            shard_records = requests[shard][0]
+            requests[shard] = (shard_records[:-1] + [(shard_records[-1][0], [("NotAScheme", "X")])],)
+        return super()._fan_out(op, requests)
+
+
+class TestShardedInstrumentMap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+        cls.instrMap = ShardedInstrumentMap(num_shards=3)
+        cls.all_tests = []
+        for _ in range(30):
+            test_code = cls.instrMap.create_instr(agent=cls.agent_maint)
+            test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                              Code(CodeScheme.ISIN, TestUtil.genISIN())]
+            cls.instrMap.add_instr_codes(
+                code=test_code, codes=test_alt_codes, agent=cls.agent_maint)
+            cls.all_tests.append([test_code] + test_alt_codes)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.instrMap.close()
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            ShardedInstrumentMap(num_shards=0)
+        with self.assertRaises(ValueError):
+            self.instrMap.create_instr(agent=None)
+        with self.assertRaises(IncorrectPermissions):
+            self.instrMap.create_instr(agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            self.instrMap.get_instr_codes(code=None, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            self.instrMap.translate_codes(codes=["NotACode"], code_scheme=CodeScheme.ISIN, agent=self.agent_reader)
+
+    def test_lookups(self):
+        for codes_to_check in self.all_tests:
+            for code_to_test in codes_to_check:
+                self.assertEqual(self.instrMap.get_instr_codes(code=code_to_test, agent=self.agent_reader),
+                                 codes_to_check)
+                for code_expected in codes_to_check:
+                    self.assertEqual(self.instrMap.get_instr_code_of_type(
+                        code=code_to_test, code_scheme=code_expected.scheme, agent=self.agent_reader), code_expected)
+        # The instruments and their aliases are spread over every shard.
+        self.assertTrue(all(instruments > 0 and aliases > 0 for instruments, aliases in self.instrMap.shard_sizes()))
+
+    def test_errors(self):
+        with self.assertRaises(CodeDoesNotExist):
+            self.instrMap.get_instr_codes(code=Code(CodeScheme.ISIN, TestUtil.genISIN()), agent=self.agent_reader)
+        with self.assertRaises(CodeDoesNotExist):
+            self.instrMap.get_instr_codes(code=Code(CodeScheme.BASE, Code.gen_base_code_value()),
+                                          agent=self.agent_reader)
+        with self.assertRaises(OnlyBaseCodeDefined):
+            self.instrMap.get_instr_code_of_type(code=self.all_tests[0][1], code_scheme=CodeScheme.RIC,
+                                                 agent=self.agent_reader)
+
+    def test_add_conflicts(self):
+        test_code = self.instrMap.create_instr(agent=self.agent_maint)
+        # A code of another instrument, which is likely held by another shard.
+        with self.assertRaises(ValueError):
+            self.instrMap.add_instr_codes(code=test_code, codes=[self.all_tests[0][1]], agent=self.agent_maint)
+        ric_code = Code(CodeScheme.RIC, TestUtil.genRIC())
+        with self.assertRaises(ValueError):
+            self.instrMap.add_instr_codes(code=test_code,
+                                          codes=[ric_code, Code(CodeScheme.RIC, TestUtil.genRIC())],
+                                          agent=self.agent_maint)
+        with self.assertRaises(CodeDoesNotExist):
+            self.instrMap.get_instr_codes(code=ric_code, agent=self.agent_reader)
+
+        self.instrMap.add_instr_codes(code=test_code, codes=[ric_code], agent=self.agent_maint)
+        self.instrMap.add_instr_codes(code=ric_code, codes=[ric_code], agent=self.agent_maint)
+        self.assertEqual(self.instrMap.get_instr_codes(code=ric_code, agent=self.agent_reader), [test_code, ric_code])
+
+    def test_translate_codes(self):
+        missing_code = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        mixed_codes = [codes[i % 3] for i, codes in enumerate(self.all_tests)] + [missing_code]
+        translated = self.instrMap.translate_codes(codes=mixed_codes, code_scheme=CodeScheme.ISIN,
+                                                   agent=self.agent_reader)
+        self.assertEqual(translated, [codes[2] for codes in self.all_tests] + [None])
+        translated = self.instrMap.translate_codes(codes=mixed_codes, code_scheme=CodeScheme.BASE,
+                                                   agent=self.agent_reader)
+        self.assertEqual(translated, [codes[0] for codes in self.all_tests] + [None])
+
+        isin_values = [codes[2].value for codes in self.all_tests] + ["NotAnIsin"]
+        translated = self.instrMap.translate_codes(codes=isin_values, code_scheme=CodeScheme.SEDOL,
+                                                   agent=self.agent_reader, source_scheme=CodeScheme.ISIN)
+        self.assertEqual(translated, [codes[1] for codes in self.all_tests] + [None])
+        self.assertEqual(self.instrMap.translate_codes(codes=[], code_scheme=CodeScheme.SEDOL,
+                                                       agent=self.agent_reader), [])
+
+    def test_load_instrs(self):
+        records = [[Code(CodeScheme.SEDOL, TestUtil.genSEDOL()), Code(CodeScheme.ISIN, TestUtil.genISIN())]
+                   for _ in range(20)]
+        with self.assertRaises(ValueError):
+            self.instrMap.load_instrs(records + [[self.all_tests[0][2]]], self.agent_maint)
+        with self.assertRaises(CodeDoesNotExist):
+            self.instrMap.get_instr_codes(code=records[0][0], agent=self.agent_reader)
+
+        base_codes = self.instrMap.load_instrs(iter(records), self.agent_maint)
+        for base_code, record in zip(base_codes, records):
+            self.assertEqual(self.instrMap.get_instr_codes(code=record[1], agent=self.agent_reader),
+                             [base_code] + record)
+
+    def test_failed_load_is_undone(self):
+        records = [[Code(CodeScheme.SEDOL, TestUtil.genSEDOL()), Code(CodeScheme.ISIN, TestUtil.genISIN())]
+                   for _ in range(20)]
+        with _FailingLoadMap(num_shards=2) as instrMap:
+            base_codes = instrMap.load_instrs(records[10:], self.agent_maint)
+            shard_sizes = instrMap.shard_sizes()
+            instrMap.fail_next_load = True
+            with self.assertRaises(KeyError):
+                instrMap.load_instrs(records[:10], self.agent_maint)
+            self.assertEqual(instrMap.shard_sizes(), shard_sizes)
+            self.assertEqual(instrMap.translate_codes([record[1] for record in records], CodeScheme.BASE,
+                                                      self.agent_reader), [None] * 10 + base_codes)
+
+    def test_attach(self):
+        with ShardedInstrumentMap.attach(self.instrMap.addresses, self.instrMap.authkey) as replica:
+            self.assertEqual(replica.get_instr_codes(code=self.all_tests[0][1], agent=self.agent_reader),
+                             self.all_tests[0])
+            with self.assertRaises(MapIsReadOnly):
+                replica.create_instr(agent=self.agent_maint)
+
+        result_queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_reader_process,
+                                          args=(self.instrMap.addresses, self.instrMap.authkey, self.agent_reader,
+                                                [codes[2] for codes in self.all_tests], result_queue))
+        process.start()
+        self.assertEqual(result_queue.get(timeout=30), [codes[0] for codes in self.all_tests])
+        process.join(timeout=30)
+
+
+if __name__ == '__main__':
+    unittest.main()
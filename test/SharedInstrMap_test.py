@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import unittest
+from TestUtil import TestUtil
+from src.InstrMap import InstrumentMap
+from src.SharedInstrMap import SharedInstrMapPublisher, SharedInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.MapIsReadOnly import MapIsReadOnly
+
+
+def _reader_process(name, agent, codes_to_check, result_queue):
+    with SharedInstrumentMap(name) as replica:
+        results = [replica.get_instr_codes(code=c, agent=agent) for c in codes_to_check]
+    result_queue.put(results)
+
+
+class TestSharedInstrMap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def setUp(self):
+        self.name = f"imap{os.getpid()}"
+        self.publisher = SharedInstrMapPublisher(self.name)
+        self.instrMap = InstrumentMap()
+        self.all_tests = self._populate(10)
+
+    def tearDown(self):
+        self.publisher.close()
+
+    def _populate(self, n):
+        all_tests = []
+        for _ in range(n):
+            test_code = self.instrMap.create_instr(agent=self.agent_maint)
+            test_alt_codes = [Code(CodeScheme.SEDOL, TestUtil.genSEDOL()),
+                              Code(CodeScheme.ISIN, TestUtil.genISIN())]
+            self.instrMap.add_instr_codes(
+                code=test_code, codes=test_alt_codes, agent=self.agent_maint)
+            all_tests.append([test_code] + test_alt_codes)
+        return all_tests
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            SharedInstrMapPublisher(None)
+        with self.assertRaises(ValueError):
+            self.publisher.publish(None, agent=self.agent_reader)
+        with self.assertRaises(ValueError):
+            SharedInstrumentMap(self.name)
+        with self.assertRaises(FileNotFoundError):
+            SharedInstrumentMap(f"{self.name}missing")
+
+    def test_replica_picks_up_new_generations(self):
+        self.assertEqual(self.publisher.publish(self.instrMap, agent=self.agent_reader), 1)
+        with SharedInstrumentMap(self.name) as replica:
+            for codes_to_check in self.all_tests:
+                for code_to_test in codes_to_check:
+                    self.assertEqual(replica.get_instr_codes(
+                        code=code_to_test, agent=self.agent_reader), codes_to_check)
+            with self.assertRaises(MapIsReadOnly):
+                replica.create_instr(agent=self.agent_maint)
+
+            new_tests = self._populate(5)
+            with self.assertRaises(CodeDoesNotExist):
+                replica.get_instr_codes(code=new_tests[0][0], agent=self.agent_reader)
+            for _ in range(3):
+                self.publisher.publish(self.instrMap, agent=self.agent_reader)
+            for codes_to_check in self.all_tests + new_tests:
+                self.assertEqual(replica.get_instr_code_of_type(
+                    code=codes_to_check[1], code_scheme=CodeScheme.ISIN, agent=self.agent_reader), codes_to_check[2])
+            self.assertEqual(replica.generation, 4)
+
+    def test_replica_of_merged_instr(self):
+        (base_code, sedol_code, isin_code), (retired_code, retired_sedol, retired_isin) = self.all_tests[:2]
+        new_code = self.instrMap.split_instr(base_code, [sedol_code, isin_code], self.agent_maint)
+        self.instrMap.merge_instr(base_code, retired_sedol, self.agent_maint)
+        self.publisher.publish(self.instrMap, agent=self.agent_reader)
+        with SharedInstrumentMap(self.name) as replica:
+            self.assertEqual(replica.get_instr_codes(
+                code=retired_code, agent=self.agent_reader), [base_code, retired_sedol, retired_isin])
+            self.assertEqual(replica.get_instr_code_of_type(
+                code=retired_code, code_scheme=CodeScheme.BASE, agent=self.agent_reader), base_code)
+            self.assertEqual(replica.get_instr_codes(
+                code=isin_code, agent=self.agent_reader), [new_code, sedol_code, isin_code])
+
+    def test_reader_processes(self):
+        self.publisher.publish(self.instrMap, agent=self.agent_reader)
+        codes_to_check = [codes[2] for codes in self.all_tests]
+        result_queue = multiprocessing.Queue()
+        readers = [multiprocessing.Process(target=_reader_process,
+                                           args=(self.name, self.agent_reader, codes_to_check, result_queue))
+                   for _ in range(2)]
+        for reader in readers:
+            reader.start()
+        results = [result_queue.get(timeout=30) for _ in readers]
+        for reader in readers:
+            reader.join(timeout=30)
+        for result in results:
+            self.assertEqual(result, self.all_tests)
+
+
+if __name__ == '__main__':
+    unittest.main()
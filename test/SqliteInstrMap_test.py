@@ -0,0 +1,62 @@
+import os
+import tempfile
+import threading
+import unittest
+import InstrMap_test
+from TestUtil import TestUtil
+from src.SqliteInstrMap import SqliteInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+
+
+class TestSqliteInstrumentMap(InstrMap_test.TestInstrumentMap):
+    """
+    Runs the InstrumentMap tests against a map held in SQLite.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.maps = 0
+
+    def new_map(self):
+        self.maps += 1
+        instr_map = SqliteInstrumentMap(os.path.join(self.tmp_dir.name, f"instr_map_{self.maps}.db"))
+        self.addCleanup(instr_map.close)
+        return instr_map
+
+    def test_export_instrs(self):
+        self.skipTest("export_instrs is only implemented by InstrumentMap")
+
+    def test_merge_instr(self):
+        self.skipTest("merge_instr is only implemented by InstrumentMap")
+
+    def test_split_instr(self):
+        self.skipTest("split_instr is only implemented by InstrumentMap")
+
+    def test_reopen_and_threads(self):
+        path = os.path.join(self.tmp_dir.name, "reopen.db")
+        with SqliteInstrumentMap(path) as instr_map:
+            base_code = instr_map.create_instr(agent=self.agent_maint)
+            isin_code = Code(CodeScheme.ISIN, TestUtil.genISIN())
+            instr_map.add_instr_codes(base_code, [isin_code], self.agent_maint)
+
+        with SqliteInstrumentMap(path) as instr_map:
+            self.assertEqual(instr_map.get_instr_codes(isin_code, self.agent_reader), [base_code, isin_code])
+            # Each thread reads through a connection of its own.
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(
+                instr_map.get_instr_code_of_type(isin_code, CodeScheme.BASE, self.agent_reader)))
+                for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, [base_code] * 4)
+
+        with self.assertRaises(ValueError):
+            SqliteInstrumentMap(":memory:")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from src.InstrMap import InstrumentMap
+from src.SyntheticUniverse import SyntheticUniverse
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+
+
+class TestSyntheticUniverse(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.universe = SyntheticUniverse(20000, seed=7)
+        cls.records = list(cls.universe.records())
+
+    def test_check_digits(self):
+        # Real codes, Apple Inc, BAE Systems and an Australian government bond.
+        self.assertEqual(SyntheticUniverse.isin_check_digit("US037833100"), "5")
+        self.assertEqual(SyntheticUniverse.isin_check_digit("AU0000XVGZA"), "3")
+        self.assertEqual(SyntheticUniverse.sedol_check_digit("026349"), "4")
+        self.assertEqual(SyntheticUniverse.sedol_check_digit("B0YBKJ"), "7")
+
+    def test_unique(self):
+        values = [c.value for record in self.records for c in record]
+        self.assertEqual(len(values), len(set(values)))
+
+    def test_seeded(self):
+        self.assertEqual(list(SyntheticUniverse(100, seed=7).records()), self.records[:100])
+        self.assertEqual(self.universe.record(12345), self.records[12345])
+        self.assertNotEqual(list(SyntheticUniverse(100, seed=8).records()), self.records[:100])
+        with self.assertRaises(IndexError):
+            self.universe.record(len(self.universe))
+
+    def test_formats(self):
+        for record in self.records:
+            self.assertEqual(len({c.scheme for c in record}), len(record))
+            for c in record:
+                if c.scheme == CodeScheme.ISIN:
+                    self.assertEqual(len(c.value), 12)
+                    self.assertEqual(c.value[-1], SyntheticUniverse.isin_check_digit(c.value[:-1]))
+                elif c.scheme == CodeScheme.SEDOL:
+                    self.assertEqual(len(c.value), 7)
+                    self.assertEqual(c.value[-1], SyntheticUniverse.sedol_check_digit(c.value[:-1]))
+                else:
+                    self.assertEqual(c.scheme, CodeScheme.RIC)
+                    ticker, suffix = c.value.split(".")
+                    self.assertTrue(ticker.isalpha() and suffix.isalpha())
+
+    def test_coverage(self):
+        for scheme, fraction in SyntheticUniverse.COVERAGE.items():
+            count = sum(1 for record in self.records for c in record if c.scheme == scheme)
+            self.assertAlmostEqual(count / len(self.records), fraction, delta=0.02)
+
+        universe = SyntheticUniverse(1000, coverage={CodeScheme.RIC: 0.0, CodeScheme.SEDOL: 1.0})
+        for record in universe.records():
+            self.assertNotIn(CodeScheme.RIC, [c.scheme for c in record])
+            self.assertIn(CodeScheme.SEDOL, [c.scheme for c in record])
+        with self.assertRaises(ValueError):
+            SyntheticUniverse(1000, coverage={CodeScheme.BASE: 0.5})
+        with self.assertRaises(ValueError):
+            SyntheticUniverse(-1)
+
+    def test_load(self):
+        instrMap = InstrumentMap()
+        base_codes = instrMap.load_instrs(self.records, self.agent_maint)
+        self.assertEqual(len(base_codes), len(self.records))
+        for base_code, record in list(zip(base_codes, self.records))[:1000]:
+            self.assertEqual(instrMap.get_instr_codes(base_code, self.agent_maint),
+                             sorted([base_code] + record, key=lambda c: c.scheme.num))
+
+
+if __name__ == '__main__':
+    unittest.main()
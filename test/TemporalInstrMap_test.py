@@ -0,0 +1,127 @@
+import unittest
+from datetime import date
+from TestUtil import TestUtil
+from src.TemporalInstrMap import TemporalInstrumentMap
+from src.Code import Code
+from src.CodeScheme import CodeScheme
+from src.Agent import Agent
+from src.AgentRole import AgentRole
+from exception.CodeDoesNotExist import CodeDoesNotExist
+from exception.OnlyBaseCodeDefined import OnlyBaseCodeDefined
+from exception.IncorrectPermissions import IncorrectPermissions
+
+
+class TestTemporalInstrumentMap(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.agent_maint = Agent(agent_id=Agent.gen_agent_id(),
+                                agent_name="TestAgent",
+                                agent_role=AgentRole.MAINTAINER)
+        cls.agent_reader = Agent(agent_id=Agent.gen_agent_id(),
+                                 agent_name="TestAgent",
+                                 agent_role=AgentRole.READER)
+
+    def setUp(self):
+        # Two instruments with static codes, the RIC of the first moves to the second on 2020-06-01.
+        self.instrMap = TemporalInstrumentMap()
+        self.base_1 = self.instrMap.create_instr(agent=self.agent_maint)
+        self.base_2 = self.instrMap.create_instr(agent=self.agent_maint)
+        self.isin_1 = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        self.isin_2 = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        self.ric = Code(CodeScheme.RIC, TestUtil.genRIC())
+        self.instrMap.add_instr_codes(self.base_1, [self.isin_1, self.ric], self.agent_maint)
+        self.instrMap.add_instr_codes(self.base_2, [self.isin_2], self.agent_maint)
+        self.version = self.instrMap.link_instr_codes(self.base_2, [self.ric], self.agent_maint,
+                                                      valid_from=date(2020, 6, 1))
+
+    def test_as_of(self):
+        before, after = date(2019, 1, 1), date(2021, 1, 1)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.ric, CodeScheme.BASE, self.agent_reader,
+                                                              as_of=before), self.base_1)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.ric, CodeScheme.BASE, self.agent_reader,
+                                                              as_of=after), self.base_2)
+        self.assertEqual(self.instrMap.get_instr_codes(self.isin_1, self.agent_reader, as_of=before),
+                         [self.base_1, self.isin_1, self.ric])
+        self.assertEqual(self.instrMap.get_instr_codes(self.isin_1, self.agent_reader, as_of=after),
+                         [self.base_1, self.isin_1])
+        with self.assertRaises(OnlyBaseCodeDefined):
+            self.instrMap.get_instr_code_of_type(self.isin_1, CodeScheme.RIC, self.agent_reader, as_of=after)
+
+        # The latest links are those InstrumentMap answers with.
+        self.assertEqual(self.instrMap.get_instr_codes(self.ric, self.agent_reader),
+                         [self.base_2, self.isin_2, self.ric])
+        self.assertEqual(self.instrMap.get_instr_codes(self.isin_1, self.agent_reader), [self.base_1, self.isin_1])
+
+    def test_end_dated_links(self):
+        isin_3 = Code(CodeScheme.ISIN, TestUtil.genISIN())
+        self.instrMap.link_instr_codes(self.base_2, [isin_3], self.agent_maint,
+                                       valid_from=date(2021, 1, 1), valid_to=date(2022, 1, 1))
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.base_2, CodeScheme.ISIN, self.agent_reader,
+                                                              as_of=date(2020, 1, 1)), self.isin_2)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.base_2, CodeScheme.ISIN, self.agent_reader,
+                                                              as_of=date(2021, 12, 31)), isin_3)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.base_2, CodeScheme.ISIN, self.agent_reader,
+                                                              as_of=date(2022, 1, 1)), self.isin_2)
+        with self.assertRaises(CodeDoesNotExist):
+            self.instrMap.get_instr_codes(isin_3, self.agent_reader, as_of=date(2020, 1, 1))
+        with self.assertRaises(CodeDoesNotExist):
+            self.instrMap.get_instr_codes(isin_3, self.agent_reader)
+        self.assertEqual(self.instrMap.get_code_history(isin_3, self.agent_reader),
+                         [(date(2021, 1, 1), date(2022, 1, 1), self.base_2)])
+
+    def test_known_at(self):
+        self.assertEqual(self.instrMap.get_code_history(self.ric, self.agent_reader),
+                         [(None, date(2020, 6, 1), self.base_1), (date(2020, 6, 1), None, self.base_2)])
+        # A correction, the RIC actually moved a month later.
+        self.instrMap.link_instr_codes(self.base_1, [self.ric], self.agent_maint,
+                                       valid_from=date(2020, 6, 1), valid_to=date(2020, 7, 1))
+        as_of = date(2020, 6, 15)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.ric, CodeScheme.BASE, self.agent_reader,
+                                                              as_of=as_of), self.base_1)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.ric, CodeScheme.BASE, self.agent_reader,
+                                                              as_of=as_of, known_at=self.version), self.base_2)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(self.ric, CodeScheme.BASE, self.agent_reader,
+                                                              as_of=as_of, known_at=0), self.base_1)
+        self.assertEqual(self.instrMap.get_code_history(self.ric, self.agent_reader, known_at=0),
+                         [(None, None, self.base_1)])
+
+    def test_translate_codes(self):
+        trade_dates = [date(2019, 1, 1), date(2021, 1, 1), date(2021, 1, 1)]
+        translated = self.instrMap.translate_codes([self.ric, self.ric, self.isin_1], CodeScheme.ISIN,
+                                                   self.agent_reader, as_of=trade_dates)
+        self.assertEqual(translated, [self.isin_1, self.isin_2, self.isin_1])
+        translated = self.instrMap.translate_codes([self.ric.value, "NotARic"], CodeScheme.BASE, self.agent_reader,
+                                                   source_scheme=CodeScheme.RIC, as_of=date(2019, 1, 1))
+        self.assertEqual(translated, [self.base_1, None])
+        with self.assertRaises(ValueError):
+            self.instrMap.translate_codes([self.ric], CodeScheme.ISIN, self.agent_reader, as_of=trade_dates)
+
+    def test_static_changes_with_history(self):
+        with self.assertRaises(ValueError):
+            self.instrMap.add_instr_codes(self.base_1, [self.ric], self.agent_maint)
+        with self.assertRaises(ValueError):
+            self.instrMap.load_instrs([[self.ric]], self.agent_maint)
+        sedol = Code(CodeScheme.SEDOL, TestUtil.genSEDOL())
+        self.instrMap.add_instr_codes(self.base_1, [sedol], self.agent_maint)
+        self.assertEqual(self.instrMap.get_instr_code_of_type(sedol, CodeScheme.BASE, self.agent_reader,
+                                                              as_of=date(1990, 1, 1)), self.base_1)
+
+    def test_bad_args(self):
+        with self.assertRaises(IncorrectPermissions):
+            self.instrMap.link_instr_codes(self.base_1, [self.ric], self.agent_reader, valid_from=date(2020, 1, 1))
+        with self.assertRaises(ValueError):
+            self.instrMap.link_instr_codes(self.base_1, [self.ric], self.agent_maint,
+                                           valid_from=date(2020, 1, 1), valid_to=date(2020, 1, 1))
+        with self.assertRaises(ValueError):
+            self.instrMap.link_instr_codes(self.base_1, [self.base_2], self.agent_maint, valid_from=None)
+        with self.assertRaises(ValueError):
+            self.instrMap.link_instr_codes(self.base_1, [self.ric], self.agent_maint, valid_from="2020-01-01")
+        with self.assertRaises(ValueError):
+            self.instrMap.get_instr_codes(self.ric, self.agent_reader, as_of="2020-01-01")
+        with self.assertRaises(ValueError):
+            self.instrMap.get_instr_codes(self.ric, None, as_of=date(2020, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
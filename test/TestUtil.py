@@ -7,7 +7,9 @@ class TestUtil:
                    "GB", "HK", "IN", "JP", "KR", "NL", "SG", "TW"]
     ricCodes = ["AAPL.O", "MSFT.O", "GOOGL.O", "AMZN.O", "FB.O", "TSLA.O", "BRKb.O", "JPM.N", "JNJ.N", "V.N", "WMT.N", "PG.N", "MA.N", "UNH.N", "INTC.O", "VZ.N", "HD.N", "DIS.N", "KO.N", "MRK.N", "PFE.N", "PEP.O", "CSCO.O", "CMCSA.O", "NFLX.O", "T.N", "NVDA.O", "ADBE.O", "XOM.N", "BAC.N", "ABT.N", "CVX.N", "WFC.N", "C.N", "ORCL.N", "BA.N", "ABBV.N", "TMO.N", "ACN.N", "AMGN.O", "MCD.N", "IBM.N", "HON.N", "NKE.N", "TXN.O", "MDT.N", "QCOM.O", "LLY.N", "DHR.N", "PYPL.O", "PM.N", "NEE.N", "UNP.N", "LIN.N", "SBUX.O", "AMT.N", "UPS.N",
                 "LOW.N", "CAT.N", "COST.O", "GS.N", "MS.N", "CHTR.O", "BLK.N", "TGT.N", "NOW.N", "AMD.O", "INTU.O", "MMM.N", "ADP.O", "ISRG.O", "CVS.N", "LMT.N", "AXP.N", "MO.N", "SPGI.N", "CME.O", "BK.N", "TJX.N", "ZTS.N", "ANTM.N", "COP.N", "CSX.O", "PLD.N", "CCI.N", "BDX.N", "CL.N", "FIS.N", "SYK.N", "GILD.O", "FISV.O", "SO.N", "DUK.N", "TFC.N", "BMY.N", "ADI.O", "ADSK.O", "KMB.N", "AON.N", "VRTX.O", "REGN.O", "ILMN.O", "SRE.N", "NOC.N", "ITW.N", "EMR.N", "GD.N", "ETN.N", "PNC.N", "SHW.N", "APD.N", "ECL.N", "WM.N", "NSC.N", "ROP.N", "AEP.N"]
-    alredyGeneratedCodes = []
+    # Exchange suffixes the ric codes are also listed under, so the suite does not run out of unique RICs.
+    ricExchanges = [".O", ".N", ".L", ".PA", ".DE", ".T", ".HK", ".TO", ".AX"]
+    alredyGeneratedCodes = set()
 
     @staticmethod
     def _genRandomInt() -> str:
@@ -24,8 +26,12 @@ class TestUtil:
 
     @staticmethod
     def _genRIC() -> str:
-        return TestUtil.ricCodes[random.randint(
+        ric = TestUtil.ricCodes[random.randint(
             0, len(TestUtil.ricCodes)-1)]
+        if random.randint(0, 1):
+            return ric
+        return ric.split(".")[0] + TestUtil.ricExchanges[random.randint(
+            0, len(TestUtil.ricExchanges)-1)]
 
     @staticmethod
     def genISIN() -> str:
@@ -37,7 +43,7 @@ class TestUtil:
         if cycle >= 100:
             raise RuntimeError("Failed to generate unique ISIN code")
 
-        TestUtil.alredyGeneratedCodes.append(code)
+        TestUtil.alredyGeneratedCodes.add(code)
         return code
 
     @staticmethod
@@ -49,7 +55,7 @@ class TestUtil:
             cycle += 1
         if cycle >= 100:
             raise RuntimeError("Failed to generate unique SEDOL code")
-        TestUtil.alredyGeneratedCodes.append(code)
+        TestUtil.alredyGeneratedCodes.add(code)
         return code
 
     @staticmethod
@@ -61,5 +67,5 @@ class TestUtil:
             cycle += 1
         if cycle >= 100:
             raise RuntimeError("Failed to generate unique RIC code")
-        TestUtil.alredyGeneratedCodes.append(code)
+        TestUtil.alredyGeneratedCodes.add(code)
         return code